@@ -0,0 +1,185 @@
+"""
+本地模拟镜像：在独立进程中启动若干 HTTP 服务，按配置模拟延迟、抖动、带宽、失败率、重定向和挂起，
+供 probe_bench.py 在没有外网的环境（如 CI）中测量 cnpip 测速引擎的耗时与排序正确性。
+
+每个镜像的配置为 dict，可用的键（均可省略）：
+    latency_ms    每个请求在响应前的固定延迟
+    jitter_ms     在 [-jitter_ms, +jitter_ms] 内均匀分布的额外延迟（按 seed 确定）
+    bandwidth     整个镜像共享的链路带宽 (bytes/s)，不设则不限速
+    failure_rate  返回 503 的请求比例（按 seed 确定）
+    redirects     访问镜像地址前需要经过的 302 跳转次数
+    hang          为 True 时接受连接但不响应
+    modern        为 True 时支持 PEP 691 JSON 与 gzip 协商
+    page_bytes    项目页 /simple/pip/ 的大小
+    file_bytes    包文件 /files/ 下文件的大小
+    seed          抖动与失败的随机种子
+"""
+import gzip
+import json
+import multiprocessing
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SIMPLE_JSON_TYPE = 'application/vnd.pypi.simple.v1+json'
+HANG_SECONDS = 60
+CHUNK_SIZE = 16 * 1024
+
+
+class _Link:
+    """镜像共享的链路：按带宽为每个数据块排队，并发连接平分带宽。"""
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+        self.free_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait_for(self, size):
+        if not self.bandwidth:
+            return
+        with self.lock:
+            start = max(time.monotonic(), self.free_at)
+            self.free_at = start + size / self.bandwidth
+            done = self.free_at
+        delay = done - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _project_page(config, modern_request):
+    """生成 boto3 风格的项目页，modern_request 时返回 JSON，否则返回 HTML；大小约为 page_bytes。"""
+    count = max(1, config.get('page_bytes', 8 * 1024) // 120)
+    files = [f'pip-{i}.0-py3-none-any.whl' for i in range(count)]
+    if modern_request:
+        body = json.dumps({'meta': {'api-version': '1.1'}, 'name': 'pip',
+                           'files': [{'filename': f, 'url': f'../../files/{f}', 'hashes': {}} for f in files]})
+        return SIMPLE_JSON_TYPE, body.encode()
+    html = ''.join(f'<a href="../../files/{f}#sha256={"0" * 64}">{f}</a><br/>\n' for f in files)
+    return 'text/html', html.encode()
+
+
+def _make_handler(config):
+    rng = random.Random(config.get('seed', 0))
+    rng_lock = threading.Lock()
+    link = _Link(config.get('bandwidth'))
+    redirects = config.get('redirects', 0)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _delay_and_decide(self):
+            with rng_lock:
+                jitter = rng.uniform(-1, 1) * config.get('jitter_ms', 0)
+                fail = rng.random() < config.get('failure_rate', 0)
+            time.sleep(max(0.0, config.get('latency_ms', 0) + jitter) / 1000)
+            return fail
+
+        def _respond(self, send_body):
+            if config.get('hang'):
+                time.sleep(HANG_SECONDS)
+                return
+            fail = self._delay_and_decide()
+            path = self.path.split('?', 1)[0]
+            if path.startswith('/r/'):
+                # /r/<n>/<rest>：还需 n 次跳转
+                _, _, hops, rest = path.split('/', 3)
+                target = f'/r/{int(hops) - 1}/{rest}' if int(hops) > 1 else f'/{rest}'
+                self.send_response(302)
+                self.send_header('Location', target)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if fail:
+                self.send_response(503)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            headers = {}
+            if path.startswith('/files/'):
+                body = b'\0' * config.get('file_bytes', 64 * 1024)
+                content_type = 'application/octet-stream'
+            elif path.startswith('/simple'):
+                modern = config.get('modern', False)
+                content_type, body = _project_page(config, modern and SIMPLE_JSON_TYPE in self.headers.get('Accept', ''))
+                if modern and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers['Content-Encoding'] = 'gzip'
+            else:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            if not send_body:
+                return
+            for offset in range(0, len(body), CHUNK_SIZE):
+                chunk = body[offset:offset + CHUNK_SIZE]
+                link.wait_for(len(chunk))
+                try:
+                    self.wfile.write(chunk)
+                except OSError:
+                    return
+
+        def do_GET(self):
+            self._respond(True)
+
+        def do_HEAD(self):
+            self._respond(False)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def _serve(configs, conn):
+    servers = {}
+    for name, config in configs.items():
+        server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(config))
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[name] = server.server_address[1]
+    conn.send(servers)
+    conn.recv()     # 等待父进程通知退出
+
+
+class EmulatedMirrors:
+    """
+    在子进程中启动模拟镜像，使服务端线程不计入被测进程的线程 / 套接字统计。
+    用作上下文管理器，urls 为 {name: 镜像索引地址}。
+    """
+
+    def __init__(self, configs):
+        self.configs = configs
+        self.urls = {}
+        self._conn = None
+        self._process = None
+
+    def __enter__(self):
+        parent, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(target=_serve, args=(self.configs, child), daemon=True)
+        self._process.start()
+        ports = parent.recv()
+        self._conn = parent
+        for name, port in ports.items():
+            hops = self.configs[name].get('redirects', 0)
+            prefix = f'/r/{hops}' if hops else ''
+            self.urls[name] = f'http://127.0.0.1:{port}{prefix}/simple'
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            self._conn.send('stop')
+        except OSError:
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -0,0 +1,272 @@
+"""
+cnpip 测速引擎基准：对本地模拟镜像运行各测速引擎，报告总耗时、排序正确性以及线程 / 套接字用量。
+不访问外网，结果确定（抖动与失败由固定种子生成），可在 CI 中用于发现回归：
+
+    python benchmarks/probe_bench.py                 # 打印报告，排序错误或超出耗时预算时以非零状态退出
+    python benchmarks/probe_bench.py --json out.json # 同时写出 JSON 报告
+    python benchmarks/probe_bench.py --advisory-budget  # 超出耗时预算只警告（CI 共享机器上墙钟时间不稳定）
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from emulated_mirrors import EmulatedMirrors
+
+# 直接从源码目录运行时也能导入 cnpip
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import cnpip.cnpip as cnpip_module  # noqa: E402
+
+# 每个场景：镜像配置、要运行的引擎、期望的排序（可用镜像，从好到差）与应被判为失败的镜像
+SCENARIOS = {
+    'latency': {
+        'mirrors': {
+            'fast': {'latency_ms': 20, 'seed': 1},
+            'jittery': {'latency_ms': 50, 'jitter_ms': 10, 'seed': 2},
+            'redirected': {'latency_ms': 40, 'redirects': 2, 'seed': 3},     # 3 次往返，约 120 ms
+            'slow': {'latency_ms': 250, 'seed': 4},
+            'broken': {'latency_ms': 10, 'failure_rate': 1.0, 'seed': 5},
+            'hung': {'hang': True},
+        },
+        'engines': ['latency', 'warm'],
+        'expected': ['fast', 'jittery', 'redirected', 'slow'],
+        'failing': ['broken', 'hung'],
+        'budget_ms': 8000,      # 受 measure_mirror_speed 的 5 秒超时约束
+    },
+    'throughput': {
+        'mirrors': {
+            'wide': {'latency_ms': 20, 'bandwidth': 8 * 1024 * 1024, 'page_bytes': 64 * 1024,
+                     'file_bytes': 256 * 1024},
+            'medium': {'latency_ms': 20, 'bandwidth': 2 * 1024 * 1024, 'page_bytes': 64 * 1024,
+                       'file_bytes': 256 * 1024},
+            'narrow': {'latency_ms': 5, 'bandwidth': 512 * 1024, 'page_bytes': 64 * 1024,
+                       'file_bytes': 256 * 1024},
+        },
+        'engines': ['file_host', 'scaling'],
+        'expected': ['wide', 'medium', 'narrow'],
+        'failing': [],
+        'budget_ms': 10000,
+    },
+    'formats': {
+        'mirrors': {
+            'modern': {'latency_ms': 20, 'bandwidth': 1024 * 1024, 'page_bytes': 256 * 1024, 'modern': True},
+            'legacy': {'latency_ms': 20, 'bandwidth': 1024 * 1024, 'page_bytes': 256 * 1024},
+        },
+        'engines': ['page'],
+        'expected': ['modern', 'legacy'],
+        'failing': [],
+        'budget_ms': 10000,
+    },
+}
+
+SCALING_BENCH_LEVELS = (1, 4)
+
+
+def _rank_latency(mirrors):
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = cnpip_module.list_mirrors(mirrors)
+    return results
+
+
+def _rank_warm(mirrors):
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = cnpip_module.probe_warm_latency(mirrors)
+    return cnpip_module.rank_by_warm(results)
+
+
+def _rank_file_host(mirrors):
+    results = [cnpip_module.measure_file_host(name, url) for name, url in mirrors.items()]
+    ranked = [(r['name'], -(r['throughput'] or 0), r['url'], r['error']) for r in results]
+    ranked.sort(key=lambda x: (x[3] is not None, x[1]))
+    return ranked
+
+
+def _rank_scaling(mirrors):
+    concurrency = max(SCALING_BENCH_LEVELS)
+    scalings = [cnpip_module.measure_concurrency_scaling(name, url, SCALING_BENCH_LEVELS)
+                for name, url in mirrors.items()]
+    return cnpip_module.rank_by_throughput(scalings, concurrency)
+
+
+def _rank_page(mirrors):
+    formats = [cnpip_module.measure_page_formats(name, url, project='pip/') for name, url in mirrors.items()]
+    return cnpip_module.rank_by_page_cost(formats)
+
+
+ENGINES = {
+    'latency': _rank_latency,
+    'warm': _rank_warm,
+    'file_host': _rank_file_host,
+    'scaling': _rank_scaling,
+    'page': _rank_page,
+}
+
+
+class ResourceMonitor:
+    """统计引擎运行期间的峰值线程数、创建的套接字数与同时打开的套接字峰值。"""
+
+    def __init__(self, interval=0.002):
+        self.interval = interval
+        self.peak_threads = 0
+        self.sockets_created = 0
+        self.open_sockets = 0
+        self.peak_sockets = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._original_socket = socket.socket
+
+    def _counting_socket_class(self):
+        monitor = self
+
+        class CountingSocket(self._original_socket):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                with monitor._lock:
+                    monitor.sockets_created += 1
+                    monitor.open_sockets += 1
+                    monitor.peak_sockets = max(monitor.peak_sockets, monitor.open_sockets)
+                self._counted = True
+
+            def close(self):
+                if getattr(self, '_counted', False):
+                    self._counted = False
+                    with monitor._lock:
+                        monitor.open_sockets -= 1
+                super().close()
+
+        return CountingSocket
+
+    def _sample(self):
+        baseline = threading.active_count() - 1     # 不计采样线程自身
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count() - 1 - baseline)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        socket.socket = self._counting_socket_class()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        socket.socket = self._original_socket
+
+
+def kendall_tau(expected, actual):
+    """两个排序的 Kendall tau（只比较两者共有的元素），完全一致为 1，完全相反为 -1。"""
+    common = [name for name in actual if name in expected]
+    if len(common) < 2:
+        return 1.0
+    position = {name: i for i, name in enumerate(expected)}
+    concordant = discordant = 0
+    for i in range(len(common)):
+        for j in range(i + 1, len(common)):
+            if position[common[i]] < position[common[j]]:
+                concordant += 1
+            else:
+                discordant += 1
+    return (concordant - discordant) / (concordant + discordant)
+
+
+def run_engine(engine, scenario, mirrors):
+    with ResourceMonitor() as monitor:
+        start_time = time.monotonic()
+        ranked = ENGINES[engine](mirrors)
+        wall_ms = round((time.monotonic() - start_time) * 1000, 1)
+
+    available = [name for name, _, _, error in ranked if error is None]
+    failed = {name for name, _, _, error in ranked if error is not None}
+    report = {
+        'engine': engine,
+        'wall_ms': wall_ms,
+        'ranking': available,
+        'top1_correct': bool(available) and available[0] == scenario['expected'][0],
+        'kendall_tau': round(kendall_tau(scenario['expected'], available), 3),
+        'failures_detected': failed == set(scenario['failing']),
+        'within_budget': wall_ms <= scenario['budget_ms'],
+        'peak_threads': monitor.peak_threads,
+        'sockets_created': monitor.sockets_created,
+        'peak_open_sockets': monitor.peak_sockets,
+    }
+    # passed 只反映结果正确性（确定性的），耗时预算由 main 根据 --advisory-budget 单独处理
+    report['passed'] = (report['top1_correct'] and report['kendall_tau'] == 1.0
+                        and report['failures_detected'])
+    return report
+
+
+@contextlib.contextmanager
+def isolated_state():
+    """将 cnpip 写入 ~/.cnpip 的缓存与历史重定向到临时目录，基准不影响本机状态。"""
+    names = ['PROBE_LOCK_FILE', 'PROBE_CACHE_FILE', 'REDIRECT_CACHE_FILE', 'FILE_HOST_CACHE_FILE',
+             'HISTORY_FILE', 'HISTORY_LOCK_FILE', 'SCHEDULE_FILE']
+    saved = {name: getattr(cnpip_module, name) for name in names if hasattr(cnpip_module, name)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, value in saved.items():
+            setattr(cnpip_module, name, Path(tmp) / Path(value).name)
+        try:
+            yield
+        finally:
+            for name, value in saved.items():
+                setattr(cnpip_module, name, value)
+
+
+def run_benchmarks(scenario_names=None):
+    reports = []
+    with isolated_state():
+        for scenario_name in scenario_names or SCENARIOS:
+            scenario = SCENARIOS[scenario_name]
+            with EmulatedMirrors(scenario['mirrors']) as emulated:
+                for engine in scenario['engines']:
+                    report = run_engine(engine, scenario, emulated.urls)
+                    report['scenario'] = scenario_name
+                    reports.append(report)
+    return reports
+
+
+def print_reports(reports):
+    header = (f"{'场景':<12}{'引擎':<12}{'耗时':<12}{'预算内':<8}{'首选':<6}{'tau':<8}{'失败识别':<10}"
+              f"{'线程峰值':<10}{'套接字':<8}{'并发套接字':<12}{'结果':<6}")
+    print(header)
+    print("-" * 108)
+    for r in reports:
+        print(f"{r['scenario']:<12}{r['engine']:<12}{r['wall_ms']:<12.0f}{'是' if r['within_budget'] else '否':<8}"
+              f"{'是' if r['top1_correct'] else '否':<6}"
+              f"{r['kendall_tau']:<8}{'是' if r['failures_detected'] else '否':<10}{r['peak_threads']:<10}"
+              f"{r['sockets_created']:<8}{r['peak_open_sockets']:<12}{'通过' if r['passed'] else '失败':<6}")
+        if not r['passed']:
+            print(f"    实际排序: {', '.join(r['ranking'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对本地模拟镜像运行 cnpip 测速引擎的基准测试")
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS),
+                        help="只运行指定场景（可重复），默认全部")
+    parser.add_argument("--json", metavar="FILE", help="将报告写出为 JSON 文件")
+    parser.add_argument("--advisory-budget", action="store_true",
+                        help="超出耗时预算时只打印警告，不影响退出状态（排序与失败识别错误仍以非零状态退出）")
+    args = parser.parse_args()
+
+    reports = run_benchmarks(args.scenario)
+    print_reports(reports)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=4, ensure_ascii=False)
+    over_budget = [r for r in reports if not r['within_budget']]
+    for r in over_budget:
+        print(f"{'警告' if args.advisory_budget else '错误'}: {r['scenario']}/{r['engine']} 超出耗时预算 "
+              f"({r['wall_ms']:.0f} ms > {SCENARIOS[r['scenario']]['budget_ms']} ms)")
+    correct = all(r['passed'] for r in reports)
+    sys.exit(0 if correct and (args.advisory_budget or not over_budget) else 1)
+
+
+if __name__ == "__main__":
+    main()
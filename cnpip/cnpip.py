@@ -1,19 +1,36 @@
 import subprocess
 import sys
 import os
+import io
 import re
+import json
+import html
+import hashlib
+import math
 import argparse
+import contextlib
 import time
 import socket
+import threading
 import platform
+import random
+import shlex
 import shutil
+import tempfile
+import http.client
+import ssl
+import urllib.parse
 import urllib.request
 import urllib.error
 from pathlib import Path
-from urllib.parse import urlparse
+from urllib.parse import urlparse, urljoin
 from concurrent.futures import ThreadPoolExecutor
 
-from .mirrors import MIRRORS, update_mirrors_from_remote
+from . import tracing
+from . import mirrors as mirrors_module
+from .mirrors import (MIRRORS, MIRROR_REGISTRY, CONDA_MIRRORS, VENDOR_INDEX_MIRRORS, PYTHON_INSTALL_MIRRORS,
+                      LOCAL_MIRROR_TAG, USER_CONFIG_DIR, atomic_write_text, filter_mirrors, register_local_mirror,
+                      update_mirrors_from_remote, refresh_mirrors_in_background)
 from . import __version__
 
 MIN_PYTHON_VERSION = (3, 7)
@@ -22,8 +39,21 @@ if sys.version_info < MIN_PYTHON_VERSION:
     sys.exit(1)
 
 
+def _describe_probe_error(e):
+    """将测速过程中的异常转换为简短的错误描述。"""
+    if isinstance(e, urllib.error.URLError):
+        if isinstance(e.reason, socket.timeout):
+            return "Timeout"
+        return str(e.reason) or "Error"
+    if isinstance(e, socket.timeout):
+        return "Timeout"
+    return str(e) or "Error"
+
+
 def measure_mirror_speed(name, url):
     """测速函数"""
+    if urlparse(url).scheme == 'file':
+        return measure_local_mirror(name, url)
     try:
         start_time = time.monotonic()
         # Use a short timeout to fail fast
@@ -35,38 +65,99 @@ def measure_mirror_speed(name, url):
                 return name, duration, url, None
             else:
                 return name, float('inf'), url, f"Status {response.status}"
-    except urllib.error.URLError as e:
-        reason = str(e.reason)
-        if isinstance(e.reason, socket.timeout):
-             reason = "Timeout"
-        return name, float('inf'), url, reason or "Error"
-    except socket.timeout:
-        return name, float('inf'), url, "Timeout"
     except Exception as e:
-        return name, float('inf'), url, str(e) or "Error"
+        return name, float('inf'), url, _describe_probe_error(e)
 
 
-def list_mirrors():
-    """展示镜像源列表并测速"""
+def measure_local_mirror(name, url):
+    """本地（file://）镜像不经过网络，只检查 cnpip sync 生成的索引页是否存在。"""
     start_time = time.monotonic()
-    print("正在测速，请稍候...")
+    index_path = os.path.join(urllib.request.url2pathname(urlparse(url).path), 'index.html')
+    if not os.path.isfile(index_path):
+        return name, float('inf'), url, "索引不存在"
+    return name, round((time.monotonic() - start_time) * 1000, 2), url, None
+
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+def download_timed(url, timeout=10, max_bytes=None, headers=None):
+    """
+    GET 下载 url 的响应体（最多 max_bytes 字节），返回 (耗时 ms, 字节数)。
+    失败时抛出 urllib / socket 异常，由调用方转换为错误描述。
+    """
+    req = urllib.request.Request(url, headers=headers or {})
+    start_time = time.monotonic()
+    received = 0
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        while max_bytes is None or received < max_bytes:
+            chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+    return round((time.monotonic() - start_time) * 1000, 2), received
+
+
+def get_automatic_mirrors():
+    """
+    未指定镜像与筛选条件时参与测速和自动选择的镜像 {name: url}。
+    cnpip sync 注册的本地镜像只包含同步过的包，不在其中（可 cnpip set <name> 或 --tag local 显式选用）。
+    """
+    return {name: url for name, url in MIRRORS.items()
+            if LOCAL_MIRROR_TAG not in MIRROR_REGISTRY.get(name, {}).get('tags', [])}
+
+
+PROBE_TIE_TOLERANCE = 0.1               # 耗时相差不超过 10% 或 PROBE_TIE_MIN_MS（取较大者）时视为相同
+PROBE_TIE_MIN_MS = 20
+
 
-    with ThreadPoolExecutor(max_workers=len(MIRRORS)) as executor:
-        futures = [executor.submit(measure_mirror_speed, name, url) for name, url in MIRRORS.items()]
+def probe_mirrors(mirrors, probe=None):
+    """
+    并发测速 mirrors ({name: url})，返回按耗时排序的 (name, speed, url, error) 列表。
+    耗时在误差范围内（PROBE_TIE_TOLERANCE）的镜像视为相同，其中按镜像列表中的 priority 排序。
+    probe 默认为 measure_mirror_speed，签名为 probe(name, url)。
+    """
+    probe = probe or measure_mirror_speed
+    if not mirrors:
+        return []
+    with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+        futures = [executor.submit(probe, name, url) for name, url in mirrors.items()]
         results = [f.result() for f in futures]
+    results.sort(key=lambda x: x[1])
+
+    # 从最快的镜像开始分组：与组内第一个镜像耗时相近的归为一组（失败的镜像为一组），组内按 priority 排序
+    def by_priority(group):
+        return sorted(group, key=lambda x: MIRROR_REGISTRY.get(x[0], {}).get('priority', 100))
+
+    ordered = []
+    group = []
+    for entry in results:
+        if group and (math.isfinite(entry[1]) != math.isfinite(group[0][1]) or
+                      entry[1] - group[0][1] > max(PROBE_TIE_MIN_MS, group[0][1] * PROBE_TIE_TOLERANCE)):
+            ordered += by_priority(group)
+            group = []
+        group.append(entry)
+    return ordered + by_priority(group)
+
+
+def list_mirrors(mirrors=None):
+    """展示镜像源列表并测速，mirrors 默认为参与自动选择的全部镜像"""
+    start_time = time.monotonic()
+    print("正在测速，请稍候...")
+
+    results = probe_mirrors(get_automatic_mirrors() if mirrors is None else mirrors)
+    record_probe_history(results)
 
     total_time = round((time.monotonic() - start_time) * 1000, 2)
-    # sort by speed (None last)
-    results.sort(key=lambda x: x[1])
     print_mirror_results(results)
     print(f"\n测速总耗时: {total_time} ms")
     return results
 
 
 def print_mirror_results(results):
-    name_width = max(len(name) for name in MIRRORS.keys()) + 2
+    name_width = max((len(name) for name, _, _, _ in results), default=8) + 2
     time_width = 20
-    url_width = max(len(url) for url in MIRRORS.values()) + 2
+    url_width = max((len(url) for _, _, url, _ in results), default=8) + 2
 
     header = f"{'镜像名称':<{name_width}}\t{'耗时/状态':<{time_width}}\t{'地址':<{url_width}}"
     print(header)
@@ -82,317 +173,2884 @@ def print_mirror_results(results):
             print(f"{name:<{name_width}}\t{error_msg:<{time_width}}\t{url:<{url_width}}")
 
 
-def is_pip_installed():
-    """检查 pip 是否安装"""
+# === 重定向检测（写入最终地址，省去每次请求的额外往返） ===
+
+REDIRECT_CACHE_FILE = USER_CONFIG_DIR / "redirects.json"
+REDIRECT_CACHE_TTL = 7 * 24 * 3600   # 秒，重定向结果很少变化，缓存一周
+REDIRECT_MAX_HOPS = 10
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class _NoRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """不自动跟随重定向，使 3xx 以 HTTPError 抛出，便于逐跳计时。"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+def trace_redirects(url, timeout=5, max_hops=REDIRECT_MAX_HOPS):
+    """
+    逐跳跟随 url 的重定向并计时。
+    返回 dict: {'url', 'chain': [{'url', 'status', 'ms'}], 'final_url', 'hops', 'redirect_ms', 'error'}
+    redirect_ms 为最终地址之前所有跳转耗费的时间。
+    """
+    opener = urllib.request.build_opener(_NoRedirectHandler)
+    chain = []
+    current = url
+    error = None
+    for _ in range(max_hops + 1):
+        start_time = time.monotonic()
+        try:
+            with opener.open(urllib.request.Request(current, method='HEAD'), timeout=timeout) as response:
+                status = response.status
+            location = None
+        except urllib.error.HTTPError as e:
+            status = e.code
+            location = e.headers.get('Location') if e.code in REDIRECT_STATUSES else None
+            if location is None and e.code >= 400:
+                error = _describe_probe_error(e)
+        except Exception as e:
+            chain.append({'url': current, 'status': None, 'ms': round((time.monotonic() - start_time) * 1000, 2)})
+            error = _describe_probe_error(e)
+            break
+        chain.append({'url': current, 'status': status, 'ms': round((time.monotonic() - start_time) * 1000, 2)})
+        if location is None:
+            break
+        current = urljoin(current, location)
+    else:
+        error = "重定向次数过多"
+
+    hops = len(chain) - 1
+    return {
+        'url': url,
+        'chain': chain,
+        'final_url': chain[-1]['url'],
+        'hops': hops,
+        'redirect_ms': round(sum(hop['ms'] for hop in chain[:-1]), 2),
+        'error': error,
+    }
+
+
+def _load_json_cache(path, ttl):
+    """读取 {key: entry} 形式的 JSON 缓存，丢弃 entry['checked'] 超过 ttl 秒的条目。"""
     try:
-        subprocess.run([sys.executable, '-m', 'pip', '--version'],
-                       check=True,
-                       stdout=subprocess.PIPE,
-                       stderr=subprocess.PIPE)
-        return True
-    except subprocess.CalledProcessError:
-        return False
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    now = time.time()
+    return {key: entry for key, entry in data.items()
+            if isinstance(entry, dict) and now - entry.get('checked', 0) <= ttl}
 
 
-def detect_windows_python_source():
+def _save_json_cache(path, cache):
+    """写入 JSON 缓存，~/.cnpip 不可写时静默忽略。"""
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(path, json.dumps(cache, indent=4, ensure_ascii=False))
+    except OSError:
+        pass
+
+
+def load_redirect_cache():
+    """读取重定向缓存 {url: trace}，丢弃超过 REDIRECT_CACHE_TTL 的条目。"""
+    return _load_json_cache(REDIRECT_CACHE_FILE, REDIRECT_CACHE_TTL)
+
+
+def save_redirect_cache(cache):
+    _save_json_cache(REDIRECT_CACHE_FILE, cache)
+
+
+def get_redirect_traces(urls, refresh=False):
     """
-    Windows 专用：根据 sys.executable 路径特征检测 Python 安装方式。
-    返回: 'store' | 'uv' | 'conda' | 'pyenv' | 'scoop' | 'official' | 'unknown'
+    返回 {url: trace}：优先使用缓存，缺失或过期的地址并发检测后写回缓存。
+    检测出错的结果不写入缓存。
     """
-    exe = sys.executable.replace('\\', '/').lower()
-    if 'microsoft/windowsapps' in exe or '/windowsapps/' in exe:
-        return 'store'
-    if '/uv/python/' in exe:
-        return 'uv'
-    if 'conda' in exe or 'miniconda' in exe or 'anaconda' in exe:
-        return 'conda'
-    if '.pyenv' in exe or 'pyenv-win' in exe:
-        return 'pyenv'
-    if '/scoop/' in exe:
-        return 'scoop'
-    if 'appdata/local/programs/python' in exe:
-        return 'official'
-    return 'unknown'
+    cache = {} if refresh else load_redirect_cache()
+    missing = [url for url in urls if url not in cache]
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            traces = list(executor.map(trace_redirects, missing))
+        stored = load_redirect_cache()
+        for trace in traces:
+            cache[trace['url']] = trace
+            if trace['error'] is None:
+                trace['checked'] = time.time()
+                stored[trace['url']] = trace
+        save_redirect_cache(stored)
+    return {url: cache[url] for url in urls}
+
+
+def report_redirects(results):
+    """为 list 命令标记需要额外跳转的镜像（只检查测速成功的镜像）。"""
+    urls = [url for _, _, url, error in results if error is None]
+    if not urls:
+        return
+    traces = get_redirect_traces(urls)
+    redirected = [(name, traces[url]) for name, _, url, error in results
+                  if error is None and traces[url]['error'] is None and traces[url]['hops'] > 0]
+    if not redirected:
+        return
+    print("\n以下镜像地址存在重定向，每次请求多付出额外往返（可用 cnpip set --resolve-redirects 写入最终地址）:")
+    for name, trace in redirected:
+        print(f"  {name}: {trace['hops']} 跳, {trace['redirect_ms']:.2f} ms -> {trace['final_url']}")
+
+
+# === 文件主机测速（索引页与包文件可能来自不同主机 / CDN） ===
+
+FILE_HOST_CACHE_FILE = USER_CONFIG_DIR / "file_hosts.json"
+FILE_HOST_CACHE_TTL = 7 * 24 * 3600
+FILE_PROBE_PROJECT = 'pip/'             # 用于提取文件地址的项目页
+FILE_PROBE_BYTES = 1024 * 1024          # 文件传输测速最多读取的字节数
+FILE_PROBE_MAX_PAGE_BYTES = 4 * 1024 * 1024
+_HREF_RE = re.compile(r'href=["\']([^"\']+)["\']', re.IGNORECASE)
+
+
+def fetch_file_links(index_url, timeout=5):
+    """下载 FILE_PROBE_PROJECT 的项目页，返回其中的文件地址（绝对地址，去掉 #sha256=... 片段，按页面顺序）。"""
+    page_url = index_url.rstrip('/') + '/' + FILE_PROBE_PROJECT
+    req = urllib.request.Request(page_url, headers={'Accept': 'text/html'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        page = response.read(FILE_PROBE_MAX_PAGE_BYTES).decode('utf-8', errors='replace')
+        base = response.geturl()
+    return [urljoin(base, href).split('#', 1)[0] for href in _HREF_RE.findall(page)]
+
+
+def discover_file_url(index_url, timeout=5):
+    """
+    下载项目页并从中提取一个包文件地址（优先最后一个 .whl，即通常最新的版本）。
+    返回去掉 #sha256=... 片段的绝对地址；页面中没有文件链接时返回 None。
+    """
+    links = fetch_file_links(index_url, timeout)
+    if not links:
+        return None
+    wheels = [link for link in links if link.endswith('.whl')]
+    return (wheels or links)[-1]
+
+
+def timed_get(url, timeout=10, max_bytes=FILE_PROBE_BYTES, max_hops=REDIRECT_MAX_HOPS):
+    """
+    用 http.client 下载 url（跟随重定向），分别计时最终主机的连接、首字节与传输阶段。
+    返回 dict: {'final_url', 'connect_ms', 'ttfb_ms', 'transfer_ms', 'bytes', 'headers'}；失败时抛出异常。
+    """
+    current = url
+    for _ in range(max_hops + 1):
+        parsed = urlparse(current)
+        if parsed.scheme == 'https':
+            conn = http.client.HTTPSConnection(parsed.hostname, parsed.port, timeout=timeout,
+                                               context=ssl.create_default_context())
+        else:
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=timeout)
+        try:
+            start_time = time.monotonic()
+            conn.connect()
+            connected = time.monotonic()
+            path = parsed.path or '/'
+            if parsed.query:
+                path += '?' + parsed.query
+            conn.request('GET', path, headers={'User-Agent': f'cnpip/{__version__}'})
+            response = conn.getresponse()
+            first_byte = time.monotonic()
+            if response.status in REDIRECT_STATUSES and response.getheader('Location'):
+                current = urljoin(current, response.getheader('Location'))
+                continue
+            if response.status >= 400:
+                raise urllib.error.HTTPError(current, response.status, response.reason, response.headers, None)
+            received = 0
+            while received < max_bytes:
+                chunk = response.read(min(DOWNLOAD_CHUNK_SIZE, max_bytes - received))
+                if not chunk:
+                    break
+                received += len(chunk)
+            finished = time.monotonic()
+        finally:
+            conn.close()
+        return {
+            'final_url': current,
+            'connect_ms': round((connected - start_time) * 1000, 2),
+            'ttfb_ms': round((first_byte - connected) * 1000, 2),
+            'transfer_ms': round((finished - first_byte) * 1000, 2),
+            'bytes': received,
+            'headers': dict(response.getheaders()),
+        }
+    raise urllib.error.URLError("重定向次数过多")
+
+
+def measure_file_host(name, url):
+    """
+    测速镜像的文件主机：从项目页提取文件地址，跟随重定向到实际提供字节的主机，
+    分别记录其连接、首字节与传输耗时及吞吐。
+    返回 dict: {'name', 'url', 'index_host', 'file_url', 'file_host', 'connect_ms', 'ttfb_ms',
+                'transfer_ms', 'bytes', 'throughput', 'error'}
+    """
+    result = {'name': name, 'url': url, 'index_host': urlparse(url).netloc, 'file_url': None,
+              'file_host': None, 'connect_ms': None, 'ttfb_ms': None, 'transfer_ms': None,
+              'bytes': 0, 'throughput': None, 'error': None}
+    try:
+        file_url = discover_file_url(url)
+        if file_url is None:
+            result['error'] = "项目页中没有文件链接"
+            return result
+        timing = timed_get(file_url)
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    result.update({
+        'file_url': timing['final_url'],
+        'file_host': urlparse(timing['final_url']).netloc,
+        'connect_ms': timing['connect_ms'],
+        'ttfb_ms': timing['ttfb_ms'],
+        'transfer_ms': timing['transfer_ms'],
+        'bytes': timing['bytes'],
+    })
+    if timing['transfer_ms'] > 0:
+        result['throughput'] = round(timing['bytes'] / (timing['transfer_ms'] / 1000))
+    return result
+
+
+def print_file_host_results(results):
+    name_width = max((len(r['name']) for r in results), default=8) + 2
+    host_width = max((len(r['index_host']) for r in results), default=8) + 2
+    file_width = max((len(r['file_host'] or '') for r in results), default=8) + 2
+
+    header = (f"{'镜像名称':<{name_width}}{'索引主机':<{host_width}}{'文件主机':<{file_width}}"
+              f"{'连接':<12}{'首字节':<12}{'吞吐':<12}")
+    print(header)
+    print("-" * (name_width + host_width + file_width + 36))
+    for r in results:
+        if r['error'] is not None:
+            error_msg = (r['error'][:17] + '..') if len(r['error']) > 19 else r['error']
+            print(f"{r['name']:<{name_width}}{r['index_host']:<{host_width}}{error_msg}")
+            continue
+        file_host = r['file_host'] if r['file_host'] != r['index_host'] else '(同索引主机)'
+        throughput = format_throughput(r['throughput']) if r['throughput'] else '-'
+        print(f"{r['name']:<{name_width}}{r['index_host']:<{host_width}}{file_host:<{file_width}}"
+              f"{r['connect_ms']:.0f} ms{'':<5}{r['ttfb_ms']:.0f} ms{'':<5}{throughput}")
+
+
+def list_file_hosts(mirrors):
+    """
+    对 mirrors 测速文件主机并打印结果，同时记录各镜像的文件主机（用于 trusted-host）。
+    镜像之间串行测量，避免争抢本机带宽。
+    """
+    print("正在测速各镜像的文件主机（提取项目页中的文件并下载），请稍候...")
+    results = [measure_file_host(name, url) for name, url in mirrors.items()]
+    cache = load_file_host_cache()
+    for r in results:
+        if r['error'] is None:
+            cache[r['url']] = {'file_host': r['file_host'], 'checked': time.time()}
+    _save_json_cache(FILE_HOST_CACHE_FILE, cache)
+    print_file_host_results(results)
+    return results
+
+
+def load_file_host_cache():
+    """读取 {index_url: {'file_host', 'checked'}} 缓存。"""
+    return _load_json_cache(FILE_HOST_CACHE_FILE, FILE_HOST_CACHE_TTL)
+
+
+def discover_file_hosts(urls):
+    """
+    确定 urls 各自的文件主机（不下载文件本身，只跟随文件地址的重定向），结果写入缓存。
+    检测失败的镜像被忽略。返回 {index_url: file_host}。
+    """
+    cache = load_file_host_cache()
+    missing = [url for url in urls if url not in cache]
+
+    def _discover(url):
+        try:
+            file_url = discover_file_url(url)
+            if file_url is None:
+                return url, None
+            trace = trace_redirects(file_url)
+            return url, (None if trace['error'] else urlparse(trace['final_url']).netloc)
+        except Exception:
+            return url, None
+
+    if missing:
+        with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+            for url, file_host in executor.map(_discover, missing):
+                if file_host:
+                    cache[url] = {'file_host': file_host, 'checked': time.time()}
+        _save_json_cache(FILE_HOST_CACHE_FILE, cache)
+    return {url: cache[url]['file_host'] for url in urls if url in cache}
+
+
+# === CDN 缓存命中 / 未命中测速 ===
+
+CACHE_PROBE_TIMEOUT = 30
+# CDN 常用的缓存状态响应头，值中含 HIT / MISS（多级缓存时以最后一级为准）
+CACHE_STATUS_HEADERS = ('x-cache', 'x-cache-status', 'cf-cache-status', 'x-cache-lookup', 'x-proxy-cache',
+                        'cdn-cache')
+CACHE_MISS_MARKERS = ('MISS', 'EXPIRED', 'BYPASS', 'DYNAMIC')
+
+
+def parse_cache_status(headers):
+    """
+    根据 X-Cache、CF-Cache-Status 等响应头判断缓存是否命中，返回 'hit' / 'miss'；无法判断时返回 None。
+    没有这类头时，Age 大于 0 视为命中（响应来自缓存）。
+    """
+    lowered = {key.lower(): value for key, value in headers.items()}
+    for name in CACHE_STATUS_HEADERS:
+        value = lowered.get(name)
+        if not value:
+            continue
+        last_hop = value.split(',')[-1].upper()
+        if any(marker in last_hop for marker in CACHE_MISS_MARKERS):
+            return 'miss'
+        if 'HIT' in last_hop:
+            return 'hit'
+    age = (lowered.get('age') or '').strip()
+    if age.isdigit():
+        return 'hit' if int(age) > 0 else 'miss'
+    return None
+
+
+def select_cache_probe_files(links, rng=random):
+    """
+    从项目页链接中选出 (热门文件, 冷门文件)：热门文件为最新的 wheel，
+    冷门文件随机取自较旧的一半文件（优先 wheel，多次测速不会总是把同一个文件预热）。
+    """
+    wheels = [link for link in links if link.endswith('.whl')]
+    pool = wheels if len(wheels) >= 2 else links
+    popular = (wheels or links)[-1]
+    older = [link for link in pool[:max(1, len(pool) // 2)] if link != popular]
+    return popular, rng.choice(older) if older else None
+
+
+def _cache_sample(file_url):
+    timing = timed_get(file_url, timeout=CACHE_PROBE_TIMEOUT)
+    throughput = round(timing['bytes'] / (timing['transfer_ms'] / 1000)) if timing['transfer_ms'] > 0 else None
+    return {'ttfb_ms': timing['ttfb_ms'], 'ms': round(timing['ttfb_ms'] + timing['transfer_ms'], 2),
+            'throughput': throughput, 'cache': parse_cache_status(timing['headers'])}
+
+
+def measure_cache_behaviour(name, url, rng=random):
+    """
+    连续两次请求同一个热门文件（第二次应命中缓存），再请求一个冷门的旧文件（大概率未命中），
+    分别记录首字节耗时、总耗时、吞吐及响应头中的缓存状态。
+    返回 dict: {'name', 'url', 'first', 'hit', 'miss', 'error'}，后三项为单次请求的测量结果。
+    """
+    result = {'name': name, 'url': url, 'first': None, 'hit': None, 'miss': None, 'error': None}
+    try:
+        popular, rare = select_cache_probe_files(fetch_file_links(url), rng)
+        if rare is None:
+            result['error'] = "项目页中的文件不足"
+            return result
+        result['first'] = _cache_sample(popular)
+        result['hit'] = _cache_sample(popular)
+        result['miss'] = _cache_sample(rare)
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+    return result
+
+
+def print_cache_results(results):
+    name_width = max((len(r['name']) for r in results), default=8) + 2
+    print(f"{'镜像名称':<{name_width}}{'命中首字节':<14}{'命中吞吐':<14}{'未命中首字节':<14}{'未命中吞吐':<14}"
+          f"{'缓存头 (首次/再次/冷门)'}")
+    print("-" * (name_width + 80))
+    for r in results:
+        if r['error'] is not None:
+            error_msg = (r['error'][:27] + '..') if len(r['error']) > 29 else r['error']
+            print(f"{r['name']:<{name_width}}{error_msg}")
+            continue
+        statuses = '/'.join((sample['cache'] or '-').upper() for sample in (r['first'], r['hit'], r['miss']))
+        hit_throughput = format_throughput(r['hit']['throughput']) if r['hit']['throughput'] else '-'
+        miss_throughput = format_throughput(r['miss']['throughput']) if r['miss']['throughput'] else '-'
+        print(f"{r['name']:<{name_width}}{r['hit']['ttfb_ms']:.0f} ms{'':<9}{hit_throughput:<14}"
+              f"{r['miss']['ttfb_ms']:.0f} ms{'':<9}{miss_throughput:<14}{statuses}")
+    print("\n缓存头: HIT 命中 / MISS 未命中 / - 镜像未返回缓存状态；冷门文件显示 HIT 时，未命中的数据可能偏乐观")
+
+
+def probe_cache_behaviour(mirrors):
+    """
+    对 mirrors 测量缓存命中与未命中时的文件下载表现并打印，返回按未命中耗时排序的结果。
+    镜像之间串行测量，避免争抢本机带宽。
+    """
+    print("正在测量各镜像文件的缓存命中 / 未命中表现（热门文件两次 + 冷门文件一次），请稍候...")
+    results = [measure_cache_behaviour(name, url) for name, url in mirrors.items()]
+    results.sort(key=lambda r: (r['error'] is not None, r['miss']['ms'] if r['error'] is None else 0))
+    print_cache_results(results)
+    return results
+
+
+def rank_by_cache_miss(results):
+    """将 measure_cache_behaviour 的结果转换为按冷门文件（缓存未命中）耗时排序的 (name, ms, url, error) 列表。"""
+    ranked = [(r['name'], float('inf') if r['error'] else r['miss']['ms'], r['url'], r['error']) for r in results]
+    ranked.sort(key=lambda x: x[1])
+    return ranked
+
+
+# === 连接复用测速（冷连接 / 热连接） ===
+
+WARM_SAMPLES = 5        # 每个镜像的请求数：第 1 次为冷连接，其余复用连接
+
+
+class _PooledHTTPSConnection(http.client.HTTPSConnection):
+    """握手时携带同一主机上次的 TLS 会话，以便服务端恢复会话、省去完整握手。"""
+
+    def __init__(self, *args, tls_session=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.tls_session = tls_session
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(self.sock, server_hostname=self.host, session=self.tls_session)
+
+
+class ProbeConnectionPool:
+    """
+    按 (scheme, host, port) 复用 keep-alive 连接的 HTTP 客户端，并缓存每个主机的 TLS 会话，
+    与 pip/uv 使用连接池的行为一致。线程安全；用完后调用 close()。
+    """
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        self.context = ssl.create_default_context()
+        self._idle = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _new_connection(self, key):
+        scheme, host, port = key
+        if scheme == 'https':
+            with self._lock:
+                session = self._sessions.get(key)
+            return _PooledHTTPSConnection(host, port, timeout=self.timeout, context=self.context,
+                                          tls_session=session)
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def request(self, method, url, headers=None):
+        """
+        发送请求并读完响应体（不跟随重定向），返回 dict: {'status', 'ms', 'reused', 'tls_resumed', 'bytes', 'location'}。
+        reused 表示复用了已有连接；tls_resumed 表示新建的 TLS 连接是否恢复了会话（复用连接或 http 地址为 None）。
+        复用的连接已被服务端关闭时自动新建连接重试一次。失败时抛出异常。
+        """
+        parsed = urlparse(url)
+        key = (parsed.scheme, parsed.hostname, parsed.port)
+        path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        headers = dict(headers or {}, **{'User-Agent': f'cnpip/{__version__}'})
+
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+        if conn is None:
+            conn = self._new_connection(key)
+
+        start_time = time.monotonic()
+        try:
+            if conn.sock is None:
+                conn.connect()
+            conn.request(method, path, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+            # 空闲连接已被服务端关闭：按新连接重新请求
+            return self.request(method, url, headers)
+        elapsed = round((time.monotonic() - start_time) * 1000, 2)
+
+        tls_resumed = None
+        if isinstance(conn.sock, ssl.SSLSocket):
+            if not reused:
+                tls_resumed = conn.sock.session_reused
+            with self._lock:
+                self._sessions[key] = conn.sock.session
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append(conn)
+        return {'status': response.status, 'ms': elapsed, 'reused': reused,
+                'tls_resumed': tls_resumed, 'bytes': len(body), 'location': response.getheader('Location')}
+
+    def close(self):
+        with self._lock:
+            connections = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+        for conn in connections:
+            conn.close()
+
+
+def _pooled_head(pool, url, max_hops=REDIRECT_MAX_HOPS):
+    """经连接池发送 HEAD 并跟随重定向，ms 为各跳耗时之和，reused / tls_resumed 取最后一跳。"""
+    total = 0.0
+    for _ in range(max_hops + 1):
+        response = pool.request('HEAD', url)
+        total += response['ms']
+        if response['status'] not in REDIRECT_STATUSES or not response['location']:
+            return dict(response, ms=round(total, 2))
+        url = urljoin(url, response['location'])
+    raise urllib.error.URLError("重定向次数过多")
+
+
+def measure_warm_latency(name, url, samples=WARM_SAMPLES, pool=None):
+    """
+    通过连接池对镜像发送 samples 个 HEAD 请求：第一个请求包含 TCP/TLS 建连（冷连接），
+    之后的请求复用连接（热连接），与 pip/uv 安装时的实际情况一致。每次请求都跟随重定向，耗时计入各跳之和。
+    最后关闭空闲连接再请求一次（重连），新连接携带缓存的 TLS 会话，用于检测服务端是否支持会话恢复。
+    返回 dict: {'name', 'url', 'cold_ms', 'warm_ms', 'reconnect_ms', 'reused', 'tls_resumed', 'error'}，
+    warm_ms 为复用连接的请求延迟中位数；服务端不支持 keep-alive 时 reused 为 False，warm_ms 为后续请求的中位数。
+    tls_resumed 为重连时是否恢复了 TLS 会话，http 地址为 None。
+    """
+    result = {'name': name, 'url': url, 'cold_ms': None, 'warm_ms': None, 'reconnect_ms': None,
+              'reused': False, 'tls_resumed': None, 'error': None}
+    own_pool = pool is None
+    pool = ProbeConnectionPool() if own_pool else pool
+    try:
+        responses = []
+        for _ in range(samples):
+            response = _pooled_head(pool, url)
+            if response['status'] >= 400:
+                result['error'] = f"Status {response['status']}"
+                return result
+            responses.append(response)
+        # 丢弃已建立的连接，迫使下一个请求重新握手（会话缓存保留在连接池中）
+        pool.close()
+        reconnect = _pooled_head(pool, url)
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    finally:
+        if own_pool:
+            pool.close()
+
+    result['cold_ms'] = responses[0]['ms']
+    following = responses[1:]
+    warm = [r['ms'] for r in following if r['reused']]
+    result['reused'] = bool(warm)
+    result['warm_ms'] = percentile(warm or [r['ms'] for r in following], 50) if following else responses[0]['ms']
+    result['reconnect_ms'] = reconnect['ms']
+    result['tls_resumed'] = reconnect['tls_resumed']
+    return result
+
+
+def print_warm_results(results):
+    name_width = max((len(r['name']) for r in results), default=8) + 2
+    print(f"{'镜像名称':<{name_width}}{'冷连接':<12}{'热连接':<12}{'重连':<12}{'连接复用':<10}{'TLS 会话恢复':<12}")
+    print("-" * (name_width + 62))
+    for r in results:
+        if r['error'] is not None:
+            error_msg = (r['error'][:27] + '..') if len(r['error']) > 29 else r['error']
+            print(f"{r['name']:<{name_width}}{error_msg}")
+            continue
+        resumed = '-' if r['tls_resumed'] is None else ('是' if r['tls_resumed'] else '否')
+        print(f"{r['name']:<{name_width}}{r['cold_ms']:.0f} ms{'':<7}{r['warm_ms']:.0f} ms{'':<7}"
+              f"{r['reconnect_ms']:.0f} ms{'':<7}{'是' if r['reused'] else '否':<10}{resumed:<12}")
+
+
+def probe_warm_latency(mirrors):
+    """并发测量各镜像的冷 / 热连接延迟并打印，返回按热连接延迟排序的结果。"""
+    print(f"正在测量冷连接与复用连接的延迟（每个镜像 {WARM_SAMPLES} 个请求），请稍候...")
+    if not mirrors:
+        return []
+    with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+        results = list(executor.map(lambda item: measure_warm_latency(*item), mirrors.items()))
+    results.sort(key=lambda r: (r['error'] is not None, r['warm_ms'] if r['warm_ms'] is not None else 0))
+    print_warm_results(results)
+    return results
+
+
+def rank_by_warm(results):
+    """将 measure_warm_latency 的结果转换为按热连接延迟排序的 (name, warm_ms, url, error) 列表。"""
+    ranked = [(r['name'], float('inf') if r['error'] else r['warm_ms'], r['url'], r['error']) for r in results]
+    ranked.sort(key=lambda x: x[1])
+    return ranked
+
+
+# === 索引页表示形式（PEP 691 JSON / gzip）检测 ===
+
+SIMPLE_JSON_TYPE = 'application/vnd.pypi.simple.v1+json'
+# 与 pip 协商时发送的 Accept：优先 JSON，其次 HTML
+SIMPLE_NEGOTIATE_ACCEPT = (f'{SIMPLE_JSON_TYPE}, application/vnd.pypi.simple.v1+html;q=0.1, '
+                           'text/html;q=0.01')
+HEAVY_PROJECT = 'boto3/'                # 版本与文件极多的项目页，放大表示形式的差异
+HEAVY_PAGE_MAX_BYTES = 64 * 1024 * 1024
+PAGE_TIE_TOLERANCE = 0.1                # 协商后耗时相差不超过 10% 或 PAGE_TIE_MIN_MS（取较大者）时视为相同
+PAGE_TIE_MIN_MS = 20
+
+
+def fetch_simple_page(url, accept, accept_encoding, timeout=30):
+    """
+    以指定的 Accept / Accept-Encoding 下载索引页，不解压，统计线上实际传输的字节。
+    返回 dict: {'ms', 'bytes', 'content_type', 'content_encoding'}；失败时抛出异常。
+    """
+    req = urllib.request.Request(url, headers={'Accept': accept, 'Accept-Encoding': accept_encoding})
+    start_time = time.monotonic()
+    received = 0
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        content_type = response.headers.get('Content-Type', '').split(';', 1)[0].strip().lower()
+        content_encoding = response.headers.get('Content-Encoding', '').strip().lower() or 'identity'
+        while received < HEAVY_PAGE_MAX_BYTES:
+            chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            received += len(chunk)
+    return {'ms': round((time.monotonic() - start_time) * 1000, 2), 'bytes': received,
+            'content_type': content_type, 'content_encoding': content_encoding}
+
+
+def measure_page_formats(name, url, project=HEAVY_PROJECT):
+    """
+    以四种形式下载大项目页，分别衡量 JSON 与 gzip 各自的效果：
+    - legacy: 旧式 HTML、不压缩
+    - json_page: 协商 PEP 691 JSON、不压缩（只看 JSON 的效果）
+    - gzip_page: HTML、接受 gzip（只看压缩的效果）
+    - negotiated: 现代 pip/uv 的协商方式（优先 JSON、接受 gzip）
+    返回 dict: {'name', 'url', 'json', 'gzip', 'legacy', 'json_page', 'gzip_page', 'negotiated', 'error'}，
+    四种形式为 fetch_simple_page 的结果，json / gzip 表示镜像是否支持。
+    """
+    page_url = url.rstrip('/') + '/' + project
+    result = {'name': name, 'url': url, 'json': False, 'gzip': False, 'legacy': None,
+              'json_page': None, 'gzip_page': None, 'negotiated': None, 'error': None}
+    try:
+        result['legacy'] = fetch_simple_page(page_url, 'text/html', 'identity')
+        result['json_page'] = fetch_simple_page(page_url, SIMPLE_NEGOTIATE_ACCEPT, 'identity')
+        result['gzip_page'] = fetch_simple_page(page_url, 'text/html', 'gzip')
+        result['negotiated'] = fetch_simple_page(page_url, SIMPLE_NEGOTIATE_ACCEPT, 'gzip')
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    result['json'] = result['json_page']['content_type'] == SIMPLE_JSON_TYPE
+    result['gzip'] = result['gzip_page']['content_encoding'] == 'gzip'
+    return result
+
+
+def format_size(value):
+    if value >= 1024 * 1024:
+        return f"{value / 1024 / 1024:.1f} MB"
+    return f"{value / 1024:.0f} KB"
+
+
+def print_page_format_results(formats):
+    name_width = max((len(f['name']) for f in formats), default=8) + 2
+    header = (f"{'镜像名称':<{name_width}}{'JSON':<6}{'gzip':<6}"
+              f"{'HTML':<20}{'仅 JSON':<20}{'仅 gzip':<20}{'协商后':<20}")
+    print(header)
+    print("-" * (name_width + 92))
+    for f in formats:
+        if f['error'] is not None:
+            error_msg = (f['error'][:27] + '..') if len(f['error']) > 29 else f['error']
+            print(f"{f['name']:<{name_width}}{error_msg}")
+            continue
+        cells = [f"{format_size(page['bytes'])} / {page['ms']:.0f} ms"
+                 for page in (f['legacy'], f['json_page'], f['gzip_page'], f['negotiated'])]
+        print(f"{f['name']:<{name_width}}{'是' if f['json'] else '否':<6}{'是' if f['gzip'] else '否':<6}"
+              + ''.join(f"{cell:<20}" for cell in cells))
+
+
+def probe_page_formats(mirrors):
+    """逐个镜像检测索引页表示形式并打印结果（串行测量，避免争抢本机带宽）。"""
+    print(f"正在以 HTML、JSON、gzip 及协商后的形式下载大项目页 ({HEAVY_PROJECT.rstrip('/')})，请稍候...")
+    formats = [measure_page_formats(name, url) for name, url in mirrors.items()]
+    print_page_format_results(formats)
+    return formats
+
+
+def rank_by_page_cost(formats):
+    """
+    按以 pip/uv 的协商方式下载大项目页的耗时排序，支持 JSON / gzip 的镜像传输更少，自然排在前面；
+    耗时在误差范围内（PAGE_TIE_TOLERANCE）的镜像视为相同，其中优先支持更省的表示形式的镜像。
+    返回 (name, ms, url, error) 列表。
+    """
+    ranked = []
+    for f in formats:
+        if f['error'] is not None:
+            ranked.append((f['name'], float('inf'), f['url'], f['error'], 0))
+        else:
+            ranked.append((f['name'], f['negotiated']['ms'], f['url'], None, f['json'] + f['gzip']))
+    ranked.sort(key=lambda x: (x[3] is not None, x[1]))
+
+    # 从最快的镜像开始分组：与组内第一个镜像耗时相近的归为一组，组内按支持的表示形式排序
+    ordered = []
+    group = []
+    for entry in ranked:
+        if group and (entry[3] is not None or group[0][3] is not None or
+                      entry[1] - group[0][1] > max(PAGE_TIE_MIN_MS, group[0][1] * PAGE_TIE_TOLERANCE)):
+            ordered += sorted(group, key=lambda x: -x[4])
+            group = []
+        group.append(entry)
+    ordered += sorted(group, key=lambda x: -x[4])
+    return [entry[:4] for entry in ordered]
+
+
+# === 网络参数调优（--tune） ===
+
+PROFILE_SAMPLES = 5            # 延迟采样次数
+PROFILE_BURST = 8              # 并发突发请求数，用于判断镜像能容忍的并发
+PROFILE_PAGE = 'pip/'          # 用于测量吞吐的项目页（相对镜像 simple 地址）
+PROFILE_MAX_BYTES = 1024 * 1024
+THROTTLE_STATUSES = (429, 503)
+
+
+def percentile(values, pct):
+    """最近秩法百分位数，values 为空时返回 None。"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def measure_mirror_profile(name, url, samples=PROFILE_SAMPLES, burst=PROFILE_BURST):
+    """
+    对单个镜像做多次测量，用于推导网络参数：
+    - latencies: samples 次 HEAD 请求的延迟 (ms)，失败的请求计入 failures
+    - throughput: 下载项目页的速率 (bytes/s)
+    - tolerated_concurrency: burst 个并发请求中未被限流 (429/503) 或失败的数量
+    返回 dict。
+    """
+    latencies = []
+    failures = 0
+    for _ in range(samples):
+        _, speed, _, error = measure_mirror_speed(name, url)
+        if error is None:
+            latencies.append(speed)
+        else:
+            failures += 1
+
+    page_url = url.rstrip('/') + '/' + PROFILE_PAGE
+    throughput = None
+    try:
+        duration, received = download_timed(page_url, max_bytes=PROFILE_MAX_BYTES)
+        if duration > 0 and received:
+            throughput = round(received / (duration / 1000))
+    except Exception:
+        failures += 1
+
+    def _burst_request(_):
+        """返回 None（成功）、'throttled'（429/503）或 'error'"""
+        try:
+            download_timed(page_url, max_bytes=PROFILE_MAX_BYTES)
+            return None
+        except urllib.error.HTTPError as e:
+            return 'throttled' if e.code in THROTTLE_STATUSES else 'error'
+        except Exception:
+            return 'error'
+
+    with ThreadPoolExecutor(max_workers=burst) as executor:
+        burst_errors = [e for e in executor.map(_burst_request, range(burst)) if e is not None]
+
+    return {
+        'name': name,
+        'url': url,
+        'latencies': latencies,
+        'failures': failures,
+        'samples': samples + 1,
+        'throughput': throughput,
+        'tolerated_concurrency': burst - len(burst_errors),
+        'throttled': 'throttled' in burst_errors,
+    }
+
+
+def derive_network_settings(profile):
+    """
+    根据测量数据推导网络参数：
+    - pip timeout: p95 延迟的 10 倍（向上取整到秒），限制在 5~60 秒
+    - pip retries: 使所有重试均失败的概率低于 0.1%，限制在 3~10 次
+    - uv concurrent-downloads: 高延迟链路需要更多并发填满带宽（每 20 ms 中位延迟一个连接），
+      单连接吞吐低于 1 MB/s 时翻倍；受镜像能容忍的并发限制，范围 4~50
+    - UV_HTTP_TIMEOUT: pip timeout 的 2 倍，不低于 uv 默认的 30 秒
+    返回 {'pip': {...}, 'uv': {...}, 'env': {...}}
+    """
+    latencies = profile['latencies']
+    p50 = percentile(latencies, 50) or 1000.0
+    p95 = percentile(latencies, 95) or 5000.0
+
+    timeout = min(60, max(5, math.ceil(p95 * 10 / 1000)))
+
+    failure_rate = profile['failures'] / max(profile['samples'], 1)
+    if failure_rate <= 0:
+        retries = 3
+    elif failure_rate >= 1:
+        retries = 10
+    else:
+        retries = min(10, max(3, math.ceil(math.log(0.001) / math.log(failure_rate))))
+
+    concurrency = max(4, math.ceil(p50 / 20))
+    throughput = profile.get('throughput')
+    if throughput is not None and throughput < 1024 * 1024 and not profile.get('throttled'):
+        concurrency *= 2
+    tolerated = profile.get('tolerated_concurrency')
+    if profile.get('throttled') and tolerated:
+        concurrency = min(concurrency, tolerated)
+    concurrency = min(50, max(1 if profile.get('throttled') else 4, concurrency))
+
+    return {
+        'pip': {'timeout': timeout, 'retries': retries},
+        'uv': {'concurrent-downloads': concurrency},
+        'env': {'UV_HTTP_TIMEOUT': max(30, timeout * 2)},
+    }
+
+
+# set --tune 写入的配置键，unset --tune 时移除（与 derive_network_settings 的输出对应）
+TUNED_PIP_KEYS = ('timeout', 'retries')
+TUNED_UV_KEYS = ('concurrent-downloads',)
+
+
+def tune_network_settings(mirror_name, mirror_url, tools, scope_args=None):
+    """
+    测量所选镜像并写入推导出的网络参数。
+    tools: 需要写入的工具集合，取值 'pip' / 'uv'
+    返回是否全部写入成功。
+    """
+    print(f"\n正在测量镜像 {mirror_name} 的延迟分布与吞吐，用于调优网络参数...")
+    profile = measure_mirror_profile(mirror_name, mirror_url)
+    p50 = percentile(profile['latencies'], 50)
+    p95 = percentile(profile['latencies'], 95)
+    throughput = profile['throughput']
+    print(f"延迟 p50/p95: {p50 if p50 is not None else '-'} / {p95 if p95 is not None else '-'} ms, "
+          f"吞吐: {f'{throughput / 1024:.0f} KB/s' if throughput else '-'}, "
+          f"并发容忍: {profile['tolerated_concurrency']}/{PROFILE_BURST}"
+          + ("（检测到限流）" if profile['throttled'] else ""))
+
+    settings = derive_network_settings(profile)
+    ok = True
+    if 'pip' in tools:
+        success, msg = update_pip_settings(settings['pip'], scope_args or [])
+        print(msg)
+        ok = ok and success
+    if 'uv' in tools:
+        success, msg = update_uv_settings(settings['uv'])
+        print(msg)
+        ok = ok and success
+        # uv 的 HTTP 超时只能通过环境变量设置
+        for key, value in settings['env'].items():
+            print(f"建议在 shell 配置中加入: export {key}={value}")
+    return ok
+
+
+# === 直连 / 代理路由对比 ===
+
+DIRECT_ROUTE = 'direct'
+ROUTE_SAMPLES = 3       # 每条路由的请求数，取中位数
+
+
+def get_configured_proxies():
+    """
+    返回已配置的代理地址（去重，保持顺序）：环境变量 HTTPS_PROXY / HTTP_PROXY / ALL_PROXY，
+    以及 pip 配置中的 proxy。没有协议前缀的地址按 http:// 处理。
+    """
+    env = urllib.request.getproxies_environment()
+    proxies = []
+    for proxy in (env.get('https'), env.get('http'), env.get('all'), read_pip_config_values().get('proxy')):
+        if not proxy:
+            continue
+        if '://' not in proxy:
+            proxy = 'http://' + proxy
+        if proxy not in proxies:
+            proxies.append(proxy)
+    return proxies
+
+
+def describe_route(route):
+    """路由的显示名称：直连，或去掉账号密码的代理地址。"""
+    if route == DIRECT_ROUTE:
+        return '直连'
+    parsed = urlparse(route)
+    return parsed.hostname + (f':{parsed.port}' if parsed.port else '') if parsed.hostname else route
+
+
+def measure_route(name, url, route, samples=ROUTE_SAMPLES, timeout=5):
+    """
+    经指定路由（直连或某个代理）对镜像发送 samples 次 HEAD 请求，取耗时中位数。
+    与 pip 一样，NO_PROXY 中的主机不经过代理。
+    返回 dict: {'name', 'url', 'route', 'ms', 'error'}
+    """
+    proxies = {} if route == DIRECT_ROUTE else {'http': route, 'https': route}
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler(proxies))
+    result = {'name': name, 'url': url, 'route': route, 'ms': None, 'error': None}
+    latencies = []
+    try:
+        for _ in range(samples):
+            start_time = time.monotonic()
+            with opener.open(urllib.request.Request(url, method='HEAD'), timeout=timeout):
+                latencies.append((time.monotonic() - start_time) * 1000)
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    result['ms'] = round(percentile(latencies, 50), 2)
+    return result
+
+
+def best_route(route_results, mirror_name):
+    """返回 mirror_name 耗时最短的路由结果，所有路由都失败时返回 None。"""
+    candidates = [r for r in route_results if r['name'] == mirror_name and r['error'] is None]
+    return min(candidates, key=lambda r: r['ms']) if candidates else None
+
+
+def print_route_matrix(route_results, routes):
+    names = list(dict.fromkeys(r['name'] for r in route_results))
+    cells = {(r['name'], r['route']): r for r in route_results}
+    name_width = max((len(name) for name in names), default=8) + 2
+    route_width = max([len(describe_route(route)) for route in routes] + [10]) + 2
+    print(f"{'镜像名称':<{name_width}}" + ''.join(f"{describe_route(route):<{route_width}}" for route in routes)
+          + '最佳路由')
+    print("-" * (name_width + route_width * (len(routes) + 1)))
+    for name in names:
+        row = f"{name:<{name_width}}"
+        for route in routes:
+            r = cells[(name, route)]
+            cell = f"{r['ms']:.0f} ms" if r['error'] is None else ((r['error'][:7] + '..') if len(r['error']) > 9 else r['error'])
+            row += f"{cell:<{route_width}}"
+        best = best_route(route_results, name)
+        print(row + (describe_route(best['route']) if best else '-'))
+
+
+def probe_routes(mirrors, routes=None):
+    """
+    对每个镜像分别经直连和各个已配置的代理测速并打印矩阵，返回全部 (镜像, 路由) 的测量结果。
+    routes 默认为直连加 get_configured_proxies()。
+    """
+    routes = routes or [DIRECT_ROUTE] + get_configured_proxies()
+    if len(routes) == 1:
+        print("未检测到代理（HTTPS_PROXY / HTTP_PROXY / ALL_PROXY 或 pip 的 proxy 配置），只测速直连")
+    print(f"正在经 {len(routes)} 条路由测速 {len(mirrors)} 个镜像（每条路由 {ROUTE_SAMPLES} 次），请稍候...")
+    pairs = [(name, url, route) for name, url in mirrors.items() for route in routes]
+    if not pairs:
+        return []
+    with ThreadPoolExecutor(max_workers=len(pairs)) as executor:
+        route_results = list(executor.map(lambda pair: measure_route(*pair), pairs))
+    print_route_matrix(route_results, routes)
+    return route_results
+
+
+def rank_by_route(route_results):
+    """将 probe_routes 的结果转换为按各镜像最佳路由耗时排序的 (name, ms, url, error) 列表。"""
+    ranked = []
+    for name in dict.fromkeys(r['name'] for r in route_results):
+        best = best_route(route_results, name)
+        if best is not None:
+            ranked.append((name, best['ms'], best['url'], None))
+        else:
+            failed = next(r for r in route_results if r['name'] == name)
+            ranked.append((name, float('inf'), failed['url'], failed['error']))
+    ranked.sort(key=lambda x: x[1])
+    return ranked
+
+
+def apply_route(mirror_name, mirror_url, route, tools, scope_args=None):
+    """
+    按所选镜像的最佳路由写入代理设置，返回是否成功。
+    - 经代理更快：写入 pip 的 proxy；uv 只能通过环境变量配置代理，给出 export 提示
+    - 直连更快：已配置代理时提示将镜像主机加入 NO_PROXY
+    """
+    host = urlparse(mirror_url).hostname
+    if route == DIRECT_ROUTE:
+        print(f"镜像 {mirror_name} 直连更快")
+        if len(get_configured_proxies()) > 0:
+            no_proxy = os.environ.get('NO_PROXY') or os.environ.get('no_proxy')
+            print(f"检测到已配置代理，建议在 shell 配置中加入: export NO_PROXY={no_proxy + ',' if no_proxy else ''}{host}")
+            if 'pip' in tools and read_pip_config_values().get('proxy'):
+                print("pip 配置了 proxy，可运行 pip config unset global.proxy 改为直连")
+        return True
+    print(f"镜像 {mirror_name} 经代理 {describe_route(route)} 更快")
+    ok = True
+    if 'pip' in tools:
+        success, msg = update_pip_settings({'proxy': route}, scope_args or [])
+        print(msg)
+        ok = ok and success
+    if 'uv' in tools:
+        # uv 不支持在配置文件中设置代理
+        print(f"uv 通过环境变量使用代理，建议在 shell 配置中加入: export HTTPS_PROXY={route} HTTP_PROXY={route}")
+    return ok
+
+
+# === 并发扩展测速（检测按客户端限流，按真实并发下的吞吐排序） ===
+
+SCALING_LEVELS = (1, 4, 16)     # 逐级提升的并发下载数
+SCALING_GAIN = 1.2              # 吞吐提升不足 20% 视为不再随并发扩展
+SCALING_ABORT_ERROR_RATE = 0.5  # 错误率达到该值时停止继续加压
+
+
+def _download_burst(url, concurrency, max_bytes=PROFILE_MAX_BYTES):
+    """
+    并发发起 concurrency 个下载，返回 (聚合吞吐 bytes/s, 错误率, 是否被限流)。
+    聚合吞吐只统计成功下载的字节数，按整批请求的墙钟时间计算。
+    """
+    def _one(_):
+        try:
+            _, received = download_timed(url, max_bytes=max_bytes)
+            return received, None
+        except urllib.error.HTTPError as e:
+            return 0, 'throttled' if e.code in THROTTLE_STATUSES else 'error'
+        except Exception:
+            return 0, 'error'
+
+    start_time = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(_one, range(concurrency)))
+    elapsed = max(time.monotonic() - start_time, 1e-6)
+
+    received = sum(size for size, _ in outcomes)
+    errors = [error for _, error in outcomes if error is not None]
+    return round(received / elapsed), len(errors) / concurrency, 'throttled' in errors
+
+
+def measure_concurrency_scaling(name, url, levels=SCALING_LEVELS):
+    """
+    对镜像逐级提升并发下载数（默认 1、4、16），记录每一级的聚合吞吐与错误率，
+    并给出吞吐停止扩展的并发数（saturation）。错误率过高时不再继续加压。
+    返回 dict: {'name', 'url', 'levels': [{'concurrency', 'throughput', 'error_rate', 'throttled'}], 'saturation'}
+    """
+    page_url = url.rstrip('/') + '/' + PROFILE_PAGE
+    measured = []
+    for concurrency in levels:
+        throughput, error_rate, throttled = _download_burst(page_url, concurrency)
+        measured.append({
+            'concurrency': concurrency,
+            'throughput': throughput,
+            'error_rate': round(error_rate, 3),
+            'throttled': throttled,
+        })
+        if error_rate >= SCALING_ABORT_ERROR_RATE:
+            break
+
+    saturation = None
+    for current, following in zip(measured, measured[1:]):
+        if current['throughput'] == 0:
+            break
+        if following['error_rate'] > 0 or following['throughput'] < current['throughput'] * SCALING_GAIN:
+            saturation = current['concurrency']
+            break
+    if saturation is None and measured and measured[-1]['throughput'] > 0:
+        saturation = measured[-1]['concurrency']
+
+    return {'name': name, 'url': url, 'levels': measured, 'saturation': saturation}
+
+
+def throughput_at(scaling, concurrency):
+    """返回不超过 concurrency 的最高测量级别的聚合吞吐，没有任何成功下载时返回 0。"""
+    candidates = [level for level in scaling['levels'] if level['concurrency'] <= concurrency]
+    if not candidates:
+        candidates = scaling['levels'][:1]
+    return candidates[-1]['throughput'] if candidates else 0
+
+
+def format_throughput(value):
+    if value >= 1024 * 1024:
+        return f"{value / 1024 / 1024:.1f} MB/s"
+    return f"{value / 1024:.0f} KB/s"
+
+
+def print_scaling_results(scalings):
+    levels = sorted({level['concurrency'] for scaling in scalings for level in scaling['levels']})
+    name_width = max((len(scaling['name']) for scaling in scalings), default=8) + 2
+    cell_width = 18
+
+    header = f"{'镜像名称':<{name_width}}" + ''.join(f"{'并发 ' + str(n):<{cell_width}}" for n in levels) + "饱和点"
+    print(header)
+    print("-" * (name_width + cell_width * len(levels) + 6))
+    for scaling in scalings:
+        by_level = {level['concurrency']: level for level in scaling['levels']}
+        cells = []
+        for n in levels:
+            level = by_level.get(n)
+            if level is None:
+                cells.append('-')
+            elif level['error_rate'] > 0:
+                mark = '限流' if level['throttled'] else '错误'
+                cells.append(f"{format_throughput(level['throughput'])} {mark}{level['error_rate']:.0%}")
+            else:
+                cells.append(format_throughput(level['throughput']))
+        saturation = scaling['saturation'] if scaling['saturation'] is not None else '-'
+        print(f"{scaling['name']:<{name_width}}" + ''.join(f"{cell:<{cell_width}}" for cell in cells) + str(saturation))
+
+
+def probe_concurrency_scaling(mirrors, concurrency=max(SCALING_LEVELS)):
+    """
+    对 mirrors 逐个做并发扩展测速并打印结果。
+    镜像之间串行测量，避免彼此争抢本机带宽而影响吞吐结果。
+    返回 scaling 结果列表（与 mirrors 顺序一致）。
+    """
+    levels = tuple(sorted(set(SCALING_LEVELS) | {concurrency}))
+    print(f"正在逐级测试并发下载吞吐（并发 {', '.join(map(str, levels))}），请稍候...")
+    scalings = [measure_concurrency_scaling(name, url, levels) for name, url in mirrors.items()]
+    print_scaling_results(scalings)
+    return scalings
+
+
+def rank_by_throughput(scalings, concurrency):
+    """
+    按指定并发下的聚合吞吐从高到低排序，返回 (name, throughput, url, error) 列表，
+    可直接交给 select_fastest_mirror / select_fallback_mirrors 使用。
+    """
+    ranked = []
+    for scaling in scalings:
+        throughput = throughput_at(scaling, concurrency)
+        error = None if throughput > 0 else "无成功下载"
+        ranked.append((scaling['name'], throughput, scaling['url'], error))
+    ranked.sort(key=lambda x: (x[3] is not None, -x[1]))
+    return ranked
+
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def select_fastest_mirror(results):
+    """从已排序的测速结果中返回第一个可用的镜像名，全部失败返回 None。"""
+    return next((name for name, speed, url, error in results if error is None), None)
+
+
+def export_probe_results(results, path, kind='pypi'):
+    """
+    将测速结果导出为 JSON 文件，供同一出口下的其他机器直接复用。
+    kind 记录结果对应的镜像种类（'pypi' 或 'conda'），读取时据此拒绝不匹配的结果。
+    返回 (success: bool, message: str)
+    """
+    data = {
+        'version': RESULTS_FORMAT_VERSION,
+        'kind': kind,
+        'timestamp': time.time(),
+        'host': platform.node(),
+        'results': [
+            {
+                'name': name,
+                'url': url,
+                'latency_ms': speed if error is None else None,
+                'error': error,
+            }
+            for name, speed, url, error in results
+        ],
+    }
+    path = Path(path)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(path, json.dumps(data, indent=4, ensure_ascii=False))
+        return True, f"测速结果已导出到 {path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {path}"
+    except Exception as e:
+        return False, f"导出测速结果失败: {e}"
+
+
+def load_probe_results(source, max_age=None):
+    """
+    从本地文件或 http(s) URL 读取导出的测速结果，并与本地镜像列表 (MIRRORS) 校验。
+    - 只接受 PyPI 镜像的结果（kind 为 'pypi'，旧版本导出的文件没有 kind，视为 PyPI）
+    - 名称不在本地列表中、或地址与本地不一致的条目会被丢弃
+    - max_age（秒）不为 None 时，超过该时长的结果视为过期
+    返回 (results, error)：results 为按耗时排序的 (name, speed, url, error) 列表，
+    出错时 results 为 None，error 为错误描述。
+    """
+    try:
+        if urlparse(source).scheme in ('http', 'https'):
+            with urllib.request.urlopen(source, timeout=5) as response:
+                data = json.loads(response.read().decode('utf-8'))
+        else:
+            with open(source, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+    except FileNotFoundError:
+        return None, f"测速结果文件不存在: {source}"
+    except urllib.error.URLError as e:
+        return None, f"网络错误: {e.reason}"
+    except ValueError:
+        return None, "测速结果不是有效的 JSON"
+    except Exception as e:
+        return None, f"读取测速结果失败: {e}"
+
+    if not isinstance(data, dict) or not isinstance(data.get('results'), list):
+        return None, "测速结果格式无效"
+    if data.get('version') != RESULTS_FORMAT_VERSION:
+        return None, f"不支持的测速结果版本: {data.get('version')}"
+    kind = data.get('kind', 'pypi')
+    if kind != 'pypi':
+        return None, f"测速结果是 {kind} 镜像的结果，不能用于选择 PyPI 镜像源"
+
+    if max_age is not None:
+        timestamp = data.get('timestamp')
+        if not isinstance(timestamp, (int, float)):
+            return None, "测速结果缺少时间戳，无法判断是否过期"
+        age = time.time() - timestamp
+        if age > max_age:
+            return None, f"测速结果已过期（{int(age)} 秒前生成，允许 {max_age} 秒）"
+
+    results = []
+    for entry in data['results']:
+        if not isinstance(entry, dict):
+            continue
+        name = entry.get('name')
+        url = entry.get('url')
+        if name not in MIRRORS or MIRRORS[name] != url:
+            continue
+        latency = entry.get('latency_ms')
+        error = entry.get('error')
+        if error is None and isinstance(latency, (int, float)):
+            results.append((name, float(latency), url, None))
+        else:
+            results.append((name, float('inf'), url, error or "Error"))
+
+    if not results:
+        return None, "测速结果中没有与本地镜像列表匹配的条目"
+    results.sort(key=lambda x: x[1])
+    return results, None
+
+
+# === 单飞测速（同一台机器上的多个 cnpip 进程共享一次测速） ===
+
+PROBE_LOCK_FILE = USER_CONFIG_DIR / "probe.lock"
+PROBE_CACHE_FILE = USER_CONFIG_DIR / "probe_results.json"
+PROBE_LOCK_STALE = 30      # 秒，锁文件超过此时间未刷新视为持有者已崩溃
+PROBE_LOCK_HEARTBEAT = 5   # 秒，测速期间刷新锁文件修改时间的间隔（须远小于 PROBE_LOCK_STALE）
+PROBE_LOCK_POLL = 0.2      # 秒，等待其他进程测速时的轮询间隔
+
+
+def _acquire_lock_file(lock_file):
+    """
+    尝试以 O_EXCL 方式创建锁文件（跨平台，无需 fcntl）。
+    返回 True 表示获得锁，False 表示已被其他进程持有；目录不可写时抛出 OSError。
+    """
+    lock_file.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(str(lock_file), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        return False
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump({'pid': os.getpid(), 'host': platform.node(), 'timestamp': time.time()}, f)
+    return True
+
+
+def _acquire_probe_lock():
+    return _acquire_lock_file(PROBE_LOCK_FILE)
+
+
+def _release_probe_lock():
+    try:
+        os.remove(str(PROBE_LOCK_FILE))
+    except OSError:
+        pass
+
+
+def _keep_probe_lock_alive(stop):
+    """测速期间每 PROBE_LOCK_HEARTBEAT 秒刷新锁文件的修改时间，直到 stop 被设置，使较慢的测速不被判定为崩溃。"""
+    while not stop.wait(PROBE_LOCK_HEARTBEAT):
+        try:
+            os.utime(str(PROBE_LOCK_FILE))
+        except OSError:
+            pass
+
+
+def _lock_identity(stat_result):
+    return stat_result.st_ino, stat_result.st_mtime_ns
+
+
+def _break_stale_lock_file(lock_file, stale):
+    """
+    锁文件超过 stale 秒未刷新时将其移除，返回是否移除。
+    多个等待者可能同时判定过期：移除前先以 O_EXCL 创建 .break 文件，同一时间只有一个进程能移除锁，
+    并在移除前确认锁文件仍是判定过期的那一个（inode 与修改时间不变），不会误删其他进程刚获得的新锁。
+    """
+    try:
+        seen = lock_file.stat()
+    except OSError:
+        return False
+    if time.time() - seen.st_mtime <= stale:
+        return False
+    guard = lock_file.with_name(f"{lock_file.name}.break")
+    try:
+        os.close(os.open(str(guard), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+    except FileExistsError:
+        # 其他进程正在移除；.break 文件本身过期说明该进程在移除途中崩溃
+        try:
+            if time.time() - guard.stat().st_mtime > stale:
+                os.remove(str(guard))
+        except OSError:
+            pass
+        return False
+    except OSError:
+        return False
+    try:
+        if _lock_identity(lock_file.stat()) != _lock_identity(seen):
+            return False
+        os.remove(str(lock_file))
+        return True
+    except OSError:
+        return False
+    finally:
+        try:
+            os.remove(str(guard))
+        except OSError:
+            pass
+
+
+def _break_stale_probe_lock():
+    return _break_stale_lock_file(PROBE_LOCK_FILE, PROBE_LOCK_STALE)
+
+
+def probe_mirrors_single_flight(mirrors=None):
+    """
+    测速并返回结果，同一台机器（共享 ~/.cnpip）上的并发进程只会测速一次：
+    - 第一个获得锁的进程负责测速并写入缓存，测速期间定期刷新锁文件
+    - 遇到锁被占用的进程等待，并复用持有者在其等待开始后写入的结果；依次运行的进程不会复用旧结果
+    - 锁持有者崩溃导致锁过期时，由等待者接管测速
+    ~/.cnpip 不可写时退化为直接测速。
+    mirrors 为按 --region / --tag 筛选出的子集时直接测速该子集（不参与共享）。
+    """
+    if mirrors is not None and mirrors != get_automatic_mirrors():
+        return list_mirrors(mirrors)
+
+    wait_started = None
+    while True:
+        if wait_started is not None and not PROBE_LOCK_FILE.exists():
+            # 只复用等待开始之后写入的结果，即刚刚释放锁的进程的测速结果
+            cached, _ = load_probe_results(str(PROBE_CACHE_FILE), max_age=time.time() - wait_started)
+            if cached is not None:
+                print("复用其他 cnpip 进程的测速结果")
+                print_mirror_results(cached)
+                return cached
+
+        attempted = time.time()
+        try:
+            acquired = _acquire_probe_lock()
+        except OSError:
+            return list_mirrors()
+
+        if acquired:
+            stop = threading.Event()
+            heartbeat = threading.Thread(target=_keep_probe_lock_alive, args=(stop,), daemon=True)
+            heartbeat.start()
+            try:
+                results = list_mirrors()
+                export_probe_results(results, PROBE_CACHE_FILE)
+                return results
+            finally:
+                stop.set()
+                heartbeat.join()
+                _release_probe_lock()
+
+        if _break_stale_probe_lock():
+            continue
+        if wait_started is None:
+            print("检测到其他 cnpip 进程正在测速，等待其结果...", flush=True)
+            wait_started = attempted
+        time.sleep(PROBE_LOCK_POLL)
+
+
+# === 测速历史与可靠性评分 ===
+
+HISTORY_FILE = USER_CONFIG_DIR / "history.jsonl"
+HISTORY_WINDOW = 7 * 24 * 3600          # 评分与失败率统计的时间窗口
+HISTORY_RETENTION = 30 * 24 * 3600      # 压缩时保留的最长历史
+HISTORY_MAX_BYTES = 1024 * 1024         # 文件超过该大小时压缩
+HISTORY_EWMA_ALPHA = 0.3                # 延迟 EWMA 中最新样本的权重
+HISTORY_FAILURE_PENALTY_MS = 5000       # 一次失败的代价，按测速超时计
+HISTORY_LOCK_FILE = USER_CONFIG_DIR / "history.lock"
+HISTORY_LOCK_STALE = 10                 # 秒，追加与压缩都很快，锁文件超过此时间视为持有者已崩溃
+HISTORY_LOCK_POLL = 0.02                # 秒，等待其他进程追加或压缩时的轮询间隔
+
+
+@contextlib.contextmanager
+def _history_lock():
+    """
+    持有历史文件锁（与测速锁相同的 O_EXCL 机制，但使用独立的锁文件：
+    测速锁在整个测速期间被持有，而测速结束时同一进程就要追加历史）。
+    追加与压缩都在此锁下进行，压缩读取到替换之间不会有其他进程追加。目录不可写时抛出 OSError。
+    """
+    while not _acquire_lock_file(HISTORY_LOCK_FILE):
+        if not _break_stale_lock_file(HISTORY_LOCK_FILE, HISTORY_LOCK_STALE):
+            time.sleep(HISTORY_LOCK_POLL)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(str(HISTORY_LOCK_FILE))
+        except OSError:
+            pass
+
+
+def record_probe_history(results, timestamp=None):
+    """
+    将 (name, speed, url, error) 测速结果追加到 HISTORY_FILE（每行一条 JSON 记录）。
+    在历史文件锁下以 O_APPEND 单次写入；文件超过 HISTORY_MAX_BYTES 时在同一把锁下压缩。
+    ~/.cnpip 不可写时静默忽略。
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    lines = ''.join(json.dumps({
+        't': round(timestamp, 3),
+        'name': name,
+        'url': url,
+        'ms': speed if error is None and math.isfinite(speed) else None,
+        'error': error,
+    }, ensure_ascii=False) + '\n' for name, speed, url, error in results)
+    if not lines:
+        return
+    try:
+        with _history_lock():
+            fd = os.open(str(HISTORY_FILE), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+            try:
+                os.write(fd, lines.encode('utf-8'))
+            finally:
+                os.close(fd)
+            if HISTORY_FILE.stat().st_size > HISTORY_MAX_BYTES:
+                _compact_probe_history_locked(time.time())
+    except OSError:
+        pass
+
+
+def load_probe_history(since=None):
+    """读取历史记录（按时间排序），跳过损坏的行；since 为时间戳下限。"""
+    records = []
+    try:
+        with open(HISTORY_FILE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or not isinstance(record.get('t'), (int, float)):
+                    continue
+                if since is None or record['t'] >= since:
+                    records.append(record)
+    except OSError:
+        return []
+    records.sort(key=lambda r: r['t'])
+    return records
+
+
+def compact_probe_history(now=None):
+    """
+    只保留 HISTORY_RETENTION 内的记录；仍超过 HISTORY_MAX_BYTES 时丢弃最旧的一半。
+    在历史文件锁下读取并替换，其他进程的追加会等待压缩完成后写入新文件，不会丢失。
+    """
+    with _history_lock():
+        _compact_probe_history_locked(time.time() if now is None else now)
+
+
+def _compact_probe_history_locked(now):
+    records = load_probe_history(since=now - HISTORY_RETENTION)
+    lines = [json.dumps(r, ensure_ascii=False) + '\n' for r in records]
+    while lines and sum(len(line.encode('utf-8')) for line in lines) > HISTORY_MAX_BYTES:
+        lines = lines[len(lines) // 2:]
+    atomic_write_text(HISTORY_FILE, ''.join(lines))
+
+
+def score_mirror_history(records):
+    """
+    根据某个镜像按时间排序的记录计算可靠性评分：
+    - ewma_ms: 成功测速延迟的指数加权移动平均（越新的样本权重越大）
+    - failure_rate: 失败次数 / 总次数
+    - score: 单次请求的期望代价 (ms) = ewma_ms * (1 - failure_rate) + 失败代价 * failure_rate，越小越好
+    没有记录时返回 None。
+    """
+    if not records:
+        return None
+    ewma = None
+    failures = 0
+    for record in records:
+        if record.get('ms') is None:
+            failures += 1
+            continue
+        ewma = record['ms'] if ewma is None else HISTORY_EWMA_ALPHA * record['ms'] + (1 - HISTORY_EWMA_ALPHA) * ewma
+    failure_rate = failures / len(records)
+    score = HISTORY_FAILURE_PENALTY_MS if ewma is None else \
+        ewma * (1 - failure_rate) + HISTORY_FAILURE_PENALTY_MS * failure_rate
+    return {
+        'samples': len(records),
+        'failures': failures,
+        'failure_rate': failure_rate,
+        'ewma_ms': None if ewma is None else round(ewma, 2),
+        'score': round(score, 2),
+    }
+
+
+def mirror_history_stats(now=None, window=HISTORY_WINDOW):
+    """按镜像名汇总时间窗口内的记录并评分，返回 {name: score_mirror_history 结果}。"""
+    now = time.time() if now is None else now
+    by_name = {}
+    for record in load_probe_history(since=now - window):
+        by_name.setdefault(record.get('name'), []).append(record)
+    return {name: score_mirror_history(records) for name, records in by_name.items() if name}
+
+
+def rank_by_history(results):
+    """
+    按历史评分（含本次测速）重新排序 (name, speed, url, error) 列表，speed 仍为本次测得的延迟。
+    本次测速失败的镜像始终排在最后；没有历史的镜像以本次延迟作为评分。
+    """
+    stats = mirror_history_stats()
+
+    def _key(result):
+        name, speed, url, error = result
+        if error is not None:
+            return (1, speed)
+        history = stats.get(name)
+        return (0, history['score'] if history else speed)
+
+    ranked = sorted(results, key=_key)
+    fastest_now = select_fastest_mirror(results)
+    best = select_fastest_mirror(ranked)
+    if best is not None and best != fastest_now:
+        history = stats.get(best)
+        if history is None:
+            print(f"{best} 没有测速历史，按本次延迟选择；本次最快的 {fastest_now} 的历史评分较差")
+        else:
+            print(f"根据历史记录选择 {best}（近 7 天失败率 {history['failure_rate']:.0%}，"
+                  f"EWMA 延迟 {history['ewma_ms']} ms），而非本次最快的 {fastest_now}")
+    return ranked
+
+
+def _history_trend(records):
+    """比较最近一天与整个窗口的延迟中位数，返回 变快 / 变慢 / 平稳 / -。"""
+    latencies = [r['ms'] for r in records if r.get('ms') is not None]
+    recent = [r['ms'] for r in records if r.get('ms') is not None and r['t'] >= records[-1]['t'] - 24 * 3600]
+    if len(latencies) < 2 or not recent:
+        return '-'
+    overall, latest = percentile(latencies, 50), percentile(recent, 50)
+    if latest < overall * 0.8:
+        return '变快'
+    if latest > overall * 1.25:
+        return '变慢'
+    return '平稳'
+
+
+def show_history(mirror_name=None):
+    """
+    展示近 7 天的测速历史：默认每个镜像一行（样本数、失败率、EWMA 延迟、评分、趋势），
+    指定镜像时按天列出其样本数、失败数与延迟中位数。
+    """
+    records = load_probe_history(since=time.time() - HISTORY_WINDOW)
+    if not records:
+        print("暂无测速历史，执行 cnpip list 或 cnpip set 后会自动记录")
+        return
+    if mirror_name is not None:
+        days = {}
+        for record in records:
+            if record.get('name') == mirror_name:
+                day = time.strftime('%Y-%m-%d', time.localtime(record['t']))
+                days.setdefault(day, []).append(record)
+        if not days:
+            print(f"镜像源 '{mirror_name}' 近 7 天没有测速记录")
+            return
+        print(f"{'日期':<14}{'样本':<8}{'失败':<8}{'延迟中位数':<12}")
+        print("-" * 44)
+        for day, day_records in sorted(days.items()):
+            latencies = [r['ms'] for r in day_records if r.get('ms') is not None]
+            median = f"{percentile(latencies, 50):.0f} ms" if latencies else '-'
+            failures = len(day_records) - len(latencies)
+            print(f"{day:<14}{len(day_records):<8}{failures:<8}{median:<12}")
+        return
+
+    by_name = {}
+    for record in records:
+        if record.get('name'):
+            by_name.setdefault(record['name'], []).append(record)
+    stats = {name: score_mirror_history(rs) for name, rs in by_name.items()}
+    name_width = max(len(name) for name in by_name) + 2
+    print(f"{'镜像名称':<{name_width}}{'样本':<8}{'失败率':<10}{'EWMA 延迟':<14}{'评分':<12}{'趋势':<6}")
+    print("-" * (name_width + 56))
+    for name in sorted(stats, key=lambda n: stats[n]['score']):
+        stat = stats[name]
+        ewma = f"{stat['ewma_ms']:.0f} ms" if stat['ewma_ms'] is not None else '-'
+        print(f"{name:<{name_width}}{stat['samples']:<8}{stat['failure_rate']:<10.0%}{ewma:<14}"
+              f"{stat['score']:<12.0f}{_history_trend(by_name[name]):<6}")
+    print(f"\n评分为单次请求的期望代价 (ms)：EWMA 延迟按成功率加权，每次失败按 {HISTORY_FAILURE_PENALTY_MS} ms 计")
+
+
+# === 按时段的镜像画像（--schedule） ===
+
+SCHEDULE_FILE = USER_CONFIG_DIR / "schedule.json"
+HOURLY_MIN_SAMPLES = 5      # 某时段内镜像至少有这么多条记录，才用历史代替实时测速
+HOURLY_MAX_AGE = 24 * 3600  # 最新一条记录超过此时间时仍实时测速，使历史持续更新
+
+
+def hourly_history_stats(mirrors=None, now=None):
+    """
+    按本地时间的小时（0-23）汇总 HISTORY_RETENTION 内的记录并评分。
+    返回 {hour: {name: score_mirror_history 结果}}，mirrors 指定时只统计其中的镜像（按名称与地址匹配）。
+    """
+    now = time.time() if now is None else now
+    mirrors = get_automatic_mirrors() if mirrors is None else mirrors
+    by_hour = {}
+    for record in load_probe_history(since=now - HISTORY_RETENTION):
+        name = record.get('name')
+        if name not in mirrors or mirrors[name] != record.get('url'):
+            continue
+        hour = time.localtime(record['t']).tm_hour
+        by_hour.setdefault(hour, {}).setdefault(name, []).append(record)
+    return {hour: {name: score_mirror_history(records) for name, records in names.items()}
+            for hour, names in by_hour.items()}
+
+
+def rank_from_hourly_history(hour, mirrors=None, stats=None):
+    """
+    用 hour 时段的历史评分代替实时测速，返回按评分排序的 (name, score, url, None) 列表。
+    只考虑该时段记录数不少于 HOURLY_MIN_SAMPLES 的镜像，没有这样的镜像时返回 None。
+    """
+    mirrors = get_automatic_mirrors() if mirrors is None else mirrors
+    stats = hourly_history_stats(mirrors) if stats is None else stats
+    ranked = [(name, stat['score'], mirrors[name], None)
+              for name, stat in stats.get(hour, {}).items()
+              if stat['samples'] >= HOURLY_MIN_SAMPLES and stat['ewma_ms'] is not None]
+    if not ranked:
+        return None
+    ranked.sort(key=lambda x: x[1])
+    return ranked
+
+
+def history_is_recent(mirrors=None, now=None, max_age=None):
+    """mirrors（默认参与自动选择的镜像）在 max_age（默认 HOURLY_MAX_AGE）内是否有测速记录；没有时应实时测速以刷新历史。"""
+    now = time.time() if now is None else now
+    max_age = HOURLY_MAX_AGE if max_age is None else max_age
+    mirrors = get_automatic_mirrors() if mirrors is None else mirrors
+    return any(mirrors.get(record.get('name')) == record.get('url')
+               for record in load_probe_history(since=now - max_age))
+
+
+def build_schedule_plan(mirrors=None):
+    """为 24 个时段选出历史上最好的镜像，返回 {hour: name 或 None}（None 表示历史不足，届时实时测速）。"""
+    stats = hourly_history_stats(mirrors)
+    plan = {}
+    for hour in range(24):
+        ranked = rank_from_hourly_history(hour, mirrors, stats)
+        plan[hour] = ranked[0][0] if ranked else None
+    return plan
+
+
+def get_schedule_command(args, system=None):
+    """
+    返回每小时执行的重新应用命令，保留目标、筛选、排序与写入方式等参数，使定时任务写入相同的配置。
+    命令带有 --scheduled，表示由定时任务执行。cron 经 /bin/sh 执行，按 POSIX shell 规则转义（shlex.quote）；
+    Windows 按 CreateProcess 的规则拼接（subprocess.list2cmdline）。system 默认为当前系统。
+    """
+    command = [sys.executable, '-m', 'cnpip.cnpip', 'set', '--schedule', '--scheduled']
+    # 不保留 --poetry：定时任务的工作目录不同，不应修改其中的 pyproject.toml
+    for flag, enabled in (('--global', args.global_), ('--user', args.user), ('--venv', args.venv),
+                          ('--uv', args.uv), ('--all-tools', args.all_tools), ('--tune', args.tune),
+                          ('--resolve-redirects', args.resolve_redirects), ('--routes', args.routes)):
+        if enabled:
+            command.append(flag)
+    for flag, value in (('--region', args.region), ('--tag', args.tag), ('--heavy', args.heavy)):
+        if value:
+            command += [flag, value]
+    if args.all_venvs:
+        command += ['--all-venvs', os.path.abspath(args.all_venvs)]
+    if args.rank_by != 'latency':
+        command += ['--rank-by', args.rank_by]
+    if args.rank_by == 'throughput' or args.heavy:
+        command += ['--concurrency', str(args.concurrency)]
+    if args.fallbacks:
+        command += ['--fallbacks', str(args.fallbacks)]
+    if (system or platform.system()) == 'Windows':
+        return subprocess.list2cmdline(command)
+    return ' '.join(shlex.quote(part) for part in command)
+
+
+def save_schedule_plan(plan, command):
+    """将时段计划与重新应用命令写入 SCHEDULE_FILE，返回 (success, message)。"""
+    data = {
+        'version': RESULTS_FORMAT_VERSION,
+        'created': time.time(),
+        'command': command,
+        'plan': {str(hour): name for hour, name in plan.items()},
+    }
+    try:
+        SCHEDULE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(SCHEDULE_FILE, json.dumps(data, indent=4, ensure_ascii=False))
+        return True, f"时段计划已保存到 {SCHEDULE_FILE}"
+    except OSError as e:
+        return False, f"保存时段计划失败: {e}"
+
+
+def load_schedule_plan():
+    """读取 SCHEDULE_FILE 中的 {'plan', 'command', ...}，不存在或损坏时返回 None。"""
+    try:
+        with open(SCHEDULE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('plan'), dict):
+        return None
+    return data
+
+
+def print_schedule_plan(plan):
+    print(f"{'时段':<14}{'镜像源':<16}")
+    print("-" * 30)
+    for hour in range(24):
+        print(f"{hour:02d}:00-{hour:02d}:59{'':<3}{plan[hour] or '(历史不足，实时测速)':<16}")
+
+
+def install_schedule(args, candidates=None):
+    """
+    生成并保存时段计划，打印每小时重新应用的定时任务（cron / Windows 任务计划程序）。
+    每次执行 set --schedule 都会按最新历史重新生成计划并应用当前时段的镜像；
+    由定时任务执行（--scheduled）时不再打印计划和添加定时任务的说明，避免每小时写入 cron 邮件。
+    """
+    plan = build_schedule_plan(candidates)
+    command = get_schedule_command(args)
+    success, msg = save_schedule_plan(plan, command)
+    if args.scheduled:
+        if not success:
+            print(msg)
+        return success
+    print_schedule_plan(plan)
+    print(msg)
+    print("\n请添加每小时执行的定时任务以按时段切换镜像源：")
+    if platform.system() == 'Windows':
+        # /TR 的值整体放在双引号中，其中的双引号需要转义
+        task = command.replace('"', '\\"')
+        print(f'  schtasks /Create /SC HOURLY /TN cnpip-schedule /TR "{task}"')
+    else:
+        print(f"  crontab -e  然后添加: 0 * * * * {command}")
+    return success
+
+
+def is_pip_installed():
+    """检查 pip 是否安装"""
+    try:
+        subprocess.run([sys.executable, '-m', 'pip', '--version'],
+                       check=True,
+                       stdout=subprocess.PIPE,
+                       stderr=subprocess.PIPE)
+        return True
+    except subprocess.CalledProcessError:
+        return False
+
+
+def detect_windows_python_source():
+    """
+    Windows 专用：根据 sys.executable 路径特征检测 Python 安装方式。
+    返回: 'store' | 'uv' | 'conda' | 'pyenv' | 'scoop' | 'official' | 'unknown'
+    """
+    exe = sys.executable.replace('\\', '/').lower()
+    if 'microsoft/windowsapps' in exe or '/windowsapps/' in exe:
+        return 'store'
+    if '/uv/python/' in exe:
+        return 'uv'
+    if 'conda' in exe or 'miniconda' in exe or 'anaconda' in exe:
+        return 'conda'
+    if '.pyenv' in exe or 'pyenv-win' in exe:
+        return 'pyenv'
+    if '/scoop/' in exe:
+        return 'scoop'
+    if 'appdata/local/programs/python' in exe:
+        return 'official'
+    return 'unknown'
+
+
+WINDOWS_PYTHON_SOURCE_NAMES = {
+    'store':    'Windows 商店 (Microsoft Store)',
+    'uv':       'uv 管理的 Python',
+    'conda':    'Conda/Miniconda',
+    'pyenv':    'pyenv-win',
+    'scoop':    'Scoop',
+    'official': '官方安装包 (python.org)',
+    'unknown':  '未知',
+}
+
+
+def detect_environment():
+    """
+    检测当前 Python 环境类型。
+    返回: 'uvx' | 'uv_venv' | 'conda' | 'pipx' | 'venv' | 'system'
+    """
+    exe = sys.executable.replace('\\', '/')
+
+    # 1. uvx 临时工具环境（uv tool run / uvx）
+    uv_tool_dir = os.environ.get('UV_TOOL_DIR', '')
+    if uv_tool_dir and uv_tool_dir.replace('\\', '/') in exe:
+        return 'uvx'
+    if '/uv/tools/' in exe:
+        return 'uvx'
+
+    # 2. conda 环境（优先于 venv，因为 conda 也会改 sys.prefix）
+    if os.environ.get('CONDA_PREFIX'):
+        return 'conda'
+
+    # 3. pipx 隔离环境
+    if platform.system() == 'Windows':
+        localappdata = os.environ.get('LOCALAPPDATA', str(Path.home() / 'AppData' / 'Local'))
+        default_pipx_home = str(Path(localappdata) / 'pipx')
+    else:
+        default_pipx_home = str(Path.home() / '.local' / 'pipx')
+    pipx_home = os.environ.get('PIPX_HOME', default_pipx_home).replace('\\', '/')
+    if pipx_home in exe:
+        return 'pipx'
+
+    # 4. 虚拟环境
+    if sys.prefix != sys.base_prefix:
+        # 检测是否由 uv 创建（pyvenv.cfg 中含有 uv = ...）
+        if detect_prefix_environment(sys.prefix) == 'uv_venv':
+            return 'uv_venv'
+        return 'venv'
+
+    return 'system'
+
+
+def detect_prefix_environment(prefix):
+    """
+    根据目录内容判断其是否为 Python 环境的根目录（不要求是当前解释器）。
+    返回: 'uv_venv' | 'venv' | 'conda' | None
+    """
+    prefix = Path(prefix)
+    pyvenv_cfg = prefix / 'pyvenv.cfg'
+    if pyvenv_cfg.is_file():
+        try:
+            cfg_content = pyvenv_cfg.read_text(encoding='utf-8', errors='replace')
+            if re.search(r'^uv\s*=', cfg_content, re.MULTILINE):
+                return 'uv_venv'
+        except Exception:
+            pass
+        return 'venv'
+    if (prefix / 'conda-meta').is_dir():
+        return 'conda'
+    return None
+
+
+# 扫描虚拟环境时跳过的目录（不可能包含环境，或体积巨大）
+DISCOVER_SKIP_DIRS = {'.git', '.hg', '.svn', 'node_modules', '__pycache__', 'site-packages', '.tox', '.nox'}
+
+
+def discover_environments(root, max_depth=5):
+    """
+    在 root 下递归查找虚拟环境（pyvenv.cfg）和 conda 环境（conda-meta）。
+    找到环境后不再深入其内部，conda 根环境的 envs/ 子目录除外。
+    返回 [(prefix: Path, env_type: str)]，按路径排序。
+    """
+    root = Path(root)
+    found = []
+    for dirpath, dirnames, _ in os.walk(str(root)):
+        current = Path(dirpath)
+        depth = len(current.relative_to(root).parts)
+        env_type = detect_prefix_environment(current)
+        if env_type:
+            found.append((current, env_type))
+            dirnames[:] = ['envs'] if env_type == 'conda' and 'envs' in dirnames else []
+            continue
+        if depth >= max_depth:
+            dirnames[:] = []
+            continue
+        dirnames[:] = [d for d in dirnames if d not in DISCOVER_SKIP_DIRS]
+    found.sort(key=lambda item: str(item[0]))
+    return found
+
+
+ENV_DESCRIPTIONS = {
+    'uvx':     'uvx 临时工具环境',
+    'uv_venv': 'uv 管理的虚拟环境',
+    'conda':   'Conda 环境',
+    'pipx':    'pipx 隔离环境',
+    'venv':    '虚拟环境',
+    'system':  '系统环境',
+}
+
+
+def read_pip_config_values():
+    """
+    通过 pip config list 读取当前生效的 global.* 配置。
+    返回 {key: value}（如 'index-url'），pip 不可用时返回空字典。
+    """
+    try:
+        # 使用 subprocess 获取 pip config list 输出
+        result = subprocess.run(
+            [sys.executable, '-m', 'pip', 'config', 'list'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            encoding='utf-8',
+            errors='replace',
+            check=False
+        )
+        if result.returncode != 0:
+            return {}
+
+        values = {}
+        for line in result.stdout.splitlines():
+            # 格式: [section].index-url='...'，前缀可能是 global/user/site/install 等
+            match = re.match(r"^[^.=]+\.([A-Za-z0-9_-]+)=(.*)$", line.strip())
+            if match:
+                val = match.group(2).strip().strip("'\"")
+                if val:
+                    values[match.group(1)] = val
+        return values
+    except Exception:
+        return {}
+
+
+def read_pip_scope_value(scope_args, key, use_pip=True):
+    """
+    只读取 scope_args 对应作用域配置文件中的 global.<key>，不含其他作用域的值
+    （pip config list 给出的是合并后的生效配置）。未设置时返回 None。
+    use_pip 为 True 时通过 pip config get 读取，否则直接读取该作用域的配置文件（无 pip 的环境）。
+    """
+    if not use_pip:
+        import configparser
+        config = configparser.ConfigParser()
+        try:
+            config.read(get_pip_config_path_for_scope_args(scope_args), encoding='utf-8')
+        except (OSError, configparser.Error):
+            return None
+        return config.get('global', key, fallback=None) or None
+    try:
+        result = subprocess.run(
+            [sys.executable, '-m', 'pip', 'config', 'get'] + scope_args + [f'global.{key}'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            encoding='utf-8',
+            errors='replace',
+            check=False
+        )
+    except Exception:
+        return None
+    value = result.stdout.strip()
+    return value if result.returncode == 0 and value else None
+
+
+def get_pip_config():
+    """
+    获取当前 pip 配置 (index-url 和 trusted-host)
+    """
+    values = read_pip_config_values()
+    return values.get('index-url'), values.get('trusted-host')
+
+
+def _is_registry_url(url):
+    """
+    url 是否为镜像列表中的某个镜像或其重定向后的最终地址
+    （用于区分 cnpip 写入的备用源与用户自己的私有源）。
+    """
+    known = set(MIRRORS.values())
+    known.update(trace['final_url'] for trace in load_redirect_cache().values())
+    return url.rstrip('/') in {u.rstrip('/') for u in known}
+
+
+def merge_extra_index_urls(existing, fallback_urls):
+    """
+    合并 extra-index-url：保留用户自己配置的非镜像地址，
+    替换掉之前写入的镜像备用源，再按排名追加新的备用源。
+    existing 为空白分隔的字符串，返回 URL 列表。
+    """
+    kept = [url for url in (existing or '').split() if not _is_registry_url(url)]
+    return kept + [url for url in fallback_urls if url not in kept]
+
+
+def get_trusted_hosts(urls):
+    """
+    返回 urls 的主机名（去重，保持顺序），以空格分隔，用于 trusted-host。
+    已知某个镜像的包文件由其他主机提供时（镜像列表中的 file_host，或 discover_file_hosts 检测到的），
+    一并加入该主机。
+    """
+    file_hosts = load_file_host_cache()
+    registry_hosts = {entry['url']: entry['file_host'] for entry in MIRROR_REGISTRY.values()}
+    hosts = []
+    for url in urls:
+        for host in (urlparse(url).netloc, registry_hosts.get(url),
+                     file_hosts.get(url, {}).get('file_host')):
+            if host and host not in hosts:
+                hosts.append(host)
+    return ' '.join(hosts)
+
+
+def select_fallback_mirrors(results, primary, count):
+    """从测速结果中按排名选出最多 count 个通过测速、且不同于 primary 的备用镜像名。"""
+    fallbacks = [name for name, speed, url, error in results
+                 if error is None and name != primary and name in MIRRORS]
+    return fallbacks[:max(count, 0)]
+
+
+def get_scope_args(args):
+    """
+    根据用户标志和环境确定 pip 配置参数。
+    """
+    if args.global_:
+        return ['--global']
+    elif args.user:
+        return ['--user']
+    elif args.venv:
+        return ['--site']
+
+    # 自动检测
+    env = detect_environment()
+    if env in ('venv', 'uv_venv', 'conda'):
+        return ['--site']
+    else:
+        return ['--user']
+
+
+def get_scope_description(scope_args):
+    """
+    返回配置范围的中文描述
+    """
+    if not scope_args:
+        return "自动"
+    if '--global' in scope_args:
+        return "系统全局配置"
+    if '--user' in scope_args:
+        return "当前用户配置"
+    if '--site' in scope_args:
+        return "虚拟环境配置"
+    return " ".join(scope_args)
+
+
+def get_global_scope_hint():
+    """根据平台返回 --global 权限不足时的针对性提示"""
+    system = platform.system()
+    if system in ('Linux', 'Darwin'):
+        return "请尝试使用 sudo 运行: sudo cnpip set --global"
+    elif system == 'Windows':
+        source = detect_windows_python_source()
+        if source == 'store':
+            return ("检测到 Windows 商店版 Python，全局配置受沙盒限制。\n"
+                    "建议改用 --user: cnpip set --user")
+        else:
+            return "请以管理员身份运行 PowerShell 或命令提示符后重试"
+    return "请检查是否有足够的文件系统权限"
+
+
+# === uv 相关 ===
+
+def detect_uv_binary():
+    """查找 uv 可执行文件路径，找不到返回 None。"""
+    return shutil.which('uv')
+
+
+def get_uv_config_path():
+    """
+    返回 uv 用户级配置文件路径（跨平台）。
+    Linux/macOS: ~/.config/uv/uv.toml（遵循 XDG_CONFIG_HOME）
+    Windows:     %APPDATA%/uv/uv.toml
+    """
+    system = platform.system()
+    if system == 'Windows':
+        appdata = os.environ.get('APPDATA', str(Path.home() / 'AppData' / 'Roaming'))
+        return Path(appdata) / 'uv' / 'uv.toml'
+    else:
+        xdg_config = os.environ.get('XDG_CONFIG_HOME', str(Path.home() / '.config'))
+        return Path(xdg_config) / 'uv' / 'uv.toml'
+
+
+def get_uv_index_url():
+    """
+    读取 uv 配置文件中的 default index url。
+    不引入外部 TOML 依赖，使用正则解析（格式固定）。
+    """
+    config_path = get_uv_config_path()
+    if not config_path.exists():
+        return None
+    try:
+        content = config_path.read_text(encoding='utf-8', errors='replace')
+        in_index_block, url, explicit = False, None, False
+        for line in content.splitlines() + ['[]']:
+            stripped = line.strip()
+            if stripped.startswith('['):
+                # 块结束：explicit 的具名索引（--heavy / --pytorch）不是默认索引
+                if in_index_block and url and not explicit:
+                    return url
+                in_index_block, url, explicit = stripped == '[[index]]', None, False
+                continue
+            if in_index_block:
+                match = re.match(r'^url\s*=\s*["\'](.+)["\']', stripped)
+                if match:
+                    url = match.group(1)
+                explicit = explicit or re.match(r'^explicit\s*=\s*true', stripped) is not None
+        return None
+    except Exception:
+        return None
+
+
+def _remove_toml_blocks(content, header, predicate=None):
+    """
+    从 TOML 文本中移除所有以 header（如 '[[index]]'）开头的块，直到下一个 '[' 开头的行。
+    predicate(block_text) 返回 False 的块会被保留。
+    不引入外部 TOML 依赖，只处理 cnpip 自己写入的固定格式。
+    """
+    lines = content.splitlines(keepends=True)
+    new_lines = []
+    i = 0
+    while i < len(lines):
+        if lines[i].strip() == header:
+            start = i
+            i += 1
+            while i < len(lines):
+                if lines[i].strip().startswith('['):
+                    break
+                i += 1
+            block = ''.join(lines[start:i])
+            if predicate is not None and not predicate(block):
+                new_lines.append(block)
+        else:
+            new_lines.append(lines[i])
+            i += 1
+    return ''.join(new_lines)
+
+
+def _toml_value(value):
+    """将 Python 值格式化为 TOML 字面量（仅支持 bool / int / float / str）。"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return str(value)
+    return f'"{value}"'
+
+
+def _set_toml_top_level_value(content, key, value):
+    """设置 TOML 顶层键（必须位于第一个表之前），已存在则替换。"""
+    lines = content.splitlines(keepends=True)
+    first_table = next((i for i, line in enumerate(lines) if line.strip().startswith('[')), len(lines))
+    head = [line for line in lines[:first_table] if not re.match(rf'^{re.escape(key)}\s*=', line.strip())]
+    return f'{key} = {_toml_value(value)}\n' + ''.join(head) + ''.join(lines[first_table:])
+
+
+def _remove_toml_top_level_value(content, key, value=None):
+    """移除 TOML 顶层键（位于第一个表之前）；value 不为 None 时只在值等于 value 时移除。"""
+    lines = content.splitlines(keepends=True)
+    first_table = next((i for i, line in enumerate(lines) if line.strip().startswith('[')), len(lines))
+    pattern = rf'^{re.escape(key)}\s*=' + ('' if value is None else rf'\s*{re.escape(_toml_value(value))}\s*$')
+    head = [line for line in lines[:first_table] if not re.match(pattern, line.strip())]
+    return ''.join(head) + ''.join(lines[first_table:])
+
+
+def build_uv_index_blocks(mirror_url, fallback_urls=(), explicit_indexes=()):
+    """
+    生成 uv 的 [[index]] 块。uv 按书写顺序确定优先级，default = true 的索引始终最后查询，
+    因此主镜像写在最前，备用镜像按排名依次写入，排名最后的一个标记为 default。
+    explicit_indexes 为 [(name, url)]，写成 explicit = true 的具名索引：
+    只有在 [tool.uv.sources] 中指定了该索引的包才会从这里下载。
+    """
+    urls = [mirror_url] + list(fallback_urls)
+    blocks = []
+    for i, url in enumerate(urls):
+        block = f'[[index]]\nurl = "{url}"\n'
+        if i == len(urls) - 1:
+            block += 'default = true\n'
+        blocks.append(block)
+    for name, url in explicit_indexes:
+        blocks.append(f'[[index]]\nname = "{name}"\nurl = "{url}"\nexplicit = true\n')
+    return '\n'.join(blocks)
+
+
+UV_INDEX_NAME_RE = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]*$')
+
+
+def parse_heavy_spec(value):
+    """
+    解析 --heavy NAME=PKG[,PKG...]（如 heavy=torch,tensorflow,nvidia-*），返回 (索引名, [包名])。
+    格式无效时抛出 ValueError。
+    """
+    name, sep, packages = value.partition('=')
+    name = name.strip()
+    packages = [pkg.strip() for pkg in packages.split(',') if pkg.strip()]
+    if not sep or not UV_INDEX_NAME_RE.match(name) or not packages:
+        raise ValueError(f"无效的 --heavy 参数 '{value}'，格式应为 NAME=PKG[,PKG...]，如 heavy=torch,tensorflow")
+    return name, packages
+
+
+def print_uv_sources_guidance(index_name, packages):
+    """打印让 packages 从具名索引下载所需的 [tool.uv.sources] 配置。"""
+    exact = [pkg for pkg in packages if '*' not in pkg]
+    patterns = [pkg for pkg in packages if '*' in pkg]
+    print(f"\n在项目的 pyproject.toml 中加入以下配置，让这些包从 {index_name} 索引下载:")
+    print("[tool.uv.sources]")
+    for pkg in exact:
+        print(f'{pkg} = {{ index = "{index_name}" }}')
+    if patterns:
+        print(f"# [tool.uv.sources] 不支持通配符，{', '.join(patterns)} 需按实际依赖的包名逐个列出，"
+              "如 nvidia-cublas-cu12")
+    print(f"uv pip install 不读取 [tool.uv.sources]，可改用: uv pip install --index {index_name}=<地址> <包名>")
+
+
+def update_uv_config(mirror_url, fallback_urls=(), explicit_indexes=()):
+    """
+    写入 uv 配置文件中的 index url。
+    不引入外部依赖，直接操作文本。
+    - 若文件不存在 → 创建并写入
+    - 若存在但无 [[index]] → 追加
+    - 若存在且有 [[index]] → 移除旧块再追加（支持多个 [[index]]）
+    fallback_urls 非空时按排名追加备用镜像。uv 默认（index-strategy = "first-index"）每个包只使用
+    第一个包含它的索引，主镜像缺包（如同步延迟）时才查询后续镜像；主镜像无法访问时 uv 会报错，不会切换到备用镜像。
+    explicit_indexes 为 [(name, url)]，额外写入只供指定包使用的具名索引。
+    返回 (success: bool, message: str)
+    """
+    config_path = get_uv_config_path()
+    new_block = build_uv_index_blocks(mirror_url, fallback_urls, explicit_indexes)
+    try:
+        if config_path.exists():
+            content = config_path.read_text(encoding='utf-8', errors='replace')
+            if '[[index]]' in content:
+                # 移除现有 [[index]] 块，保留 --pytorch 等写入的厂商索引
+                clean = _remove_toml_blocks(
+                    content, '[[index]]', lambda block: _toml_block_name(block) not in VENDOR_INDEX_MIRRORS,
+                ).rstrip('\n')
+                new_content = (clean + '\n\n' + new_block) if clean else new_block
+            else:
+                new_content = content.rstrip('\n') + '\n\n' + new_block
+        else:
+            config_path.parent.mkdir(parents=True, exist_ok=True)
+            new_content = new_block
+        atomic_write_text(config_path, new_content)
+        routes = ''.join(f"\n具名索引 {name}: '{url}'" for name, url in explicit_indexes)
+        note = ("\n注意: uv 只在主镜像缺少某个包时查询备用镜像，主镜像无法访问时会直接报错，"
+                "不会切换到备用镜像（需要重新运行 cnpip set）") if fallback_urls else ''
+        return True, f"成功设置 uv 镜像源为 '{mirror_url}'{routes}\n配置文件: {config_path}{note}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"写入 uv 配置失败: {e}"
+
+
+def unset_uv_config():
+    """
+    从 uv 配置文件中移除 [[index]] 块，以及旧版本 cnpip 随备用镜像写入的
+    index-strategy = "first-index"（即 uv 的默认值）。
+    --pytorch 等写入的厂商索引会保留，只由 unset --pytorch 移除。
+    返回 (success: bool, message: str)
+    """
+    config_path = get_uv_config_path()
+    if not config_path.exists():
+        return True, "uv 配置文件不存在，无需操作"
+    try:
+        content = config_path.read_text(encoding='utf-8', errors='replace')
+        clean = _remove_toml_blocks(
+            content, '[[index]]', lambda block: _toml_block_name(block) not in VENDOR_INDEX_MIRRORS,
+        )
+        if clean == content:
+            return True, "uv 配置中未设置 index，无需操作"
+
+        atomic_write_text(config_path, _remove_toml_top_level_value(clean, 'index-strategy', 'first-index'))
+        return True, f"成功移除 uv 镜像源配置\n配置文件: {config_path}"
+    except Exception as e:
+        return False, f"移除 uv 配置失败: {e}"
+
+
+def _set_toml_table_values(content, table, values):
+    """
+    在 TOML 文本的 [table] 表中设置若干 key = value（不存在的表会追加到末尾）。
+    保留表中其他键和文件其余部分。
+    """
+    header = f'[{table}]'
+    lines = content.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.strip() == header), None)
+    if start is None:
+        block = [header] + [f'{key} = {_toml_value(value)}' for key, value in values.items()]
+        clean = '\n'.join(lines).rstrip('\n')
+        return (clean + '\n\n' if clean else '') + '\n'.join(block) + '\n'
+
+    end = next((i for i in range(start + 1, len(lines)) if lines[i].strip().startswith('[')), len(lines))
+    remaining = dict(values)
+    for i in range(start + 1, end):
+        match = re.match(r'^\s*([A-Za-z0-9_.-]+)\s*=', lines[i])
+        if match and match.group(1) in remaining:
+            key = match.group(1)
+            lines[i] = f'{key} = {_toml_value(remaining.pop(key))}'
+    insert_at = end
+    while insert_at > start + 1 and not lines[insert_at - 1].strip():
+        insert_at -= 1
+    lines[insert_at:insert_at] = [f'{key} = {_toml_value(value)}' for key, value in remaining.items()]
+    return '\n'.join(lines) + '\n'
+
+
+def _remove_yaml_keys(content, keys):
+    """
+    从 YAML 文本中移除若干顶层键及其缩进 / 列表子项。
+    不引入 PyYAML，只处理 .condarc 这类简单的键值与列表结构。
+    """
+    new_lines = []
+    skipping = False
+    for line in content.splitlines(keepends=True):
+        match = re.match(r'^([A-Za-z0-9_-]+)\s*:', line)
+        if match:
+            skipping = match.group(1) in keys
+        elif skipping and not (line[:1] in (' ', '\t', '-') and line.strip()):
+            skipping = False
+        if not skipping:
+            new_lines.append(line)
+    return ''.join(new_lines)
+
+
+# === conda / poetry / pdm 相关 ===
+
+CONDARC_KEYS = ('show_channel_urls', 'default_channels', 'custom_channels')
+CONDA_CUSTOM_CHANNELS = ('conda-forge', 'pytorch', 'bioconda')
+
+
+def get_condarc_path():
+    """返回用户级 .condarc 路径（遵循 CONDARC 环境变量）。"""
+    return Path(os.environ.get('CONDARC') or (Path.home() / '.condarc'))
+
+
+def update_condarc(base_url):
+    """
+    将 Anaconda 镜像写入 .condarc：default_channels 指向镜像的 pkgs/*，
+    常用社区频道（conda-forge 等）通过 custom_channels 指向镜像的 cloud/。
+    不修改 channels 列表及其他配置。
+    返回 (success: bool, message: str)
+    """
+    config_path = get_condarc_path()
+    base_url = base_url.rstrip('/')
+    new_block = (
+        "show_channel_urls: true\n"
+        "default_channels:\n"
+        + ''.join(f"  - {base_url}/pkgs/{name}\n" for name in ('main', 'r', 'msys2'))
+        + "custom_channels:\n"
+        + ''.join(f"  {name}: {base_url}/cloud\n" for name in CONDA_CUSTOM_CHANNELS)
+    )
+    try:
+        if config_path.exists():
+            content = config_path.read_text(encoding='utf-8', errors='replace')
+            clean = _remove_yaml_keys(content, CONDARC_KEYS).rstrip('\n')
+            new_content = (clean + '\n' + new_block) if clean else new_block
+        else:
+            config_path.parent.mkdir(parents=True, exist_ok=True)
+            new_content = new_block
+        atomic_write_text(config_path, new_content)
+        return True, f"成功设置 conda 镜像源为 '{base_url}'\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"写入 conda 配置失败: {e}"
+
+
+def unset_condarc():
+    """
+    从 .condarc 中移除 cnpip 写入的镜像配置（default_channels / custom_channels / show_channel_urls）。
+    返回 (success: bool, message: str)
+    """
+    config_path = get_condarc_path()
+    if not config_path.exists():
+        return True, "conda 配置文件不存在，无需操作"
+    try:
+        content = config_path.read_text(encoding='utf-8', errors='replace')
+        new_content = _remove_yaml_keys(content, CONDARC_KEYS)
+        if new_content == content:
+            return True, "conda 配置中未设置镜像源，无需操作"
+        atomic_write_text(config_path, new_content)
+        return True, f"成功移除 conda 镜像源配置\n配置文件: {config_path}"
+    except Exception as e:
+        return False, f"移除 conda 配置失败: {e}"
+
+
+# conda 测速下载 pkgs/main/noarch 的 repodata，优先 conda 23+ 使用的 .zst，镜像未同步时依次回退
+CONDA_REPODATA_SUBDIR = 'pkgs/main/noarch'
+CONDA_REPODATA_FILES = ('repodata.json.zst', 'repodata.json.bz2', 'repodata.json')
+
+
+def measure_conda_repodata_speed(name, base_url):
+    """
+    conda 镜像测速：完整下载压缩的 repodata，耗时包含连接与传输时间。
+    返回值与 measure_mirror_speed 相同：(name, speed, base_url, error)
+    """
+    error = "Error"
+    for filename in CONDA_REPODATA_FILES:
+        url = f"{base_url.rstrip('/')}/{CONDA_REPODATA_SUBDIR}/{filename}"
+        try:
+            duration, _ = download_timed(url, timeout=10)
+            return name, duration, base_url, None
+        except urllib.error.HTTPError as e:
+            error = _describe_probe_error(e)
+            if e.code != 404:
+                break
+        except Exception as e:
+            error = _describe_probe_error(e)
+            break
+    return name, float('inf'), base_url, error
+
+
+def list_conda_mirrors():
+    """展示 conda 镜像源列表并测速（下载 repodata）"""
+    start_time = time.monotonic()
+    print("正在测速 conda 镜像源（下载 repodata），请稍候...")
+
+    results = probe_mirrors(CONDA_MIRRORS, measure_conda_repodata_speed)
+
+    total_time = round((time.monotonic() - start_time) * 1000, 2)
+    print_mirror_results(results)
+    print(f"\n测速总耗时: {total_time} ms")
+    return results
+
+
+def set_conda_mirror(mirror_name=None):
+    """设置 conda 镜像源，未指定名称时测速并选择最快的一个。返回是否成功。"""
+    if mirror_name is None:
+        print("未指定 conda 镜像源，即将测速并选择最快的镜像源...")
+        mirror_name = select_fastest_mirror(list_conda_mirrors())
+        if mirror_name is None:
+            print("错误: 无法连接到任何 conda 镜像源")
+            return False
+        print(f"自动选择最快的 conda 镜像源: {mirror_name}")
+
+    if mirror_name not in CONDA_MIRRORS:
+        print(f"错误: 未找到 conda 镜像源 '{mirror_name}'，可选: {', '.join(CONDA_MIRRORS)}")
+        return False
+
+    success, msg = update_condarc(CONDA_MIRRORS[mirror_name])
+    print(msg)
+    return success
+
+
+# === 厂商 wheel 索引镜像（PyTorch CUDA wheel 等） ===
+
+VENDOR_PROBE_BYTES = 8 * 1024 * 1024    # 吞吐测速时用 Range 请求读取的 wheel 字节数
+VENDOR_PROBE_TIMEOUT = 30
+_VARIANT_RE = re.compile(r'^[a-z0-9][a-z0-9._-]*$')
+
+
+def vendor_index_url(entry, variant):
+    """返回厂商镜像条目在指定变体（如 cu121）下的索引地址。"""
+    return entry['url'].format(variant=variant)
+
+
+def _is_vendor_index_url(vendor, url):
+    """url 是否为 vendor 镜像列表中某个镜像（任意变体）的地址，用于替换之前写入的索引。"""
+    for entry in VENDOR_INDEX_MIRRORS[vendor]['mirrors'].values():
+        pattern = re.escape(entry['url'].rstrip('/')).replace(re.escape('{variant}'), '[^/]+')
+        if re.fullmatch(pattern, url.rstrip('/')):
+            return True
+    return False
+
+
+def find_vendor_wheel_url(index_url, index_format, project, timeout=10):
+    """
+    在厂商索引中找到 project 的一个 wheel 地址（页面中最后一个，通常是最新版本），找不到时返回 None。
+    simple 格式读取 <index>/<project>/ 项目页，flat 格式直接读取目录页。
+    """
+    page_url = index_url.rstrip('/') + '/' + project + '/' if index_format == 'simple' else index_url
+    req = urllib.request.Request(page_url, headers={'Accept': 'text/html', 'User-Agent': f'cnpip/{__version__}'})
+    with urllib.request.urlopen(req, timeout=timeout) as response:
+        # 厂商的目录页可能列出上万个文件，只读取前一部分，其中找到的 wheel 足以测速
+        page = response.read(FILE_PROBE_MAX_PAGE_BYTES).decode('utf-8', errors='replace')
+        base = response.geturl()
+    wheels = [link['url'] for link in parse_project_links(page, base)
+              if link['filename'].endswith('.whl')
+              and (parse_distribution_filename(link['filename']) or (None,))[0] == project]
+    return wheels[-1] if wheels else None
+
+
+def measure_vendor_mirror(name, entry, variant, project):
+    """
+    厂商镜像吞吐测速：在索引中找到 project 的真实 wheel，用 Range 请求读取前 VENDOR_PROBE_BYTES 字节。
+    返回 dict: {'name', 'url', 'format', 'file_url', 'ms', 'bytes', 'throughput', 'error'}
+    """
+    url = vendor_index_url(entry, variant)
+    result = {'name': name, 'url': url, 'format': entry['format'], 'file_url': None,
+              'ms': None, 'bytes': 0, 'throughput': None, 'error': None}
+    try:
+        file_url = find_vendor_wheel_url(url, entry['format'], project)
+        if file_url is None:
+            result['error'] = f"没有 {project} 的 wheel"
+            return result
+        ms, received = download_timed(file_url, timeout=VENDOR_PROBE_TIMEOUT, max_bytes=VENDOR_PROBE_BYTES,
+                                      headers={'Range': f'bytes=0-{VENDOR_PROBE_BYTES - 1}'})
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    result.update({'file_url': file_url, 'ms': ms, 'bytes': received,
+                   'throughput': round(received / (ms / 1000)) if ms > 0 else None})
+    return result
+
+
+def print_vendor_results(results):
+    name_width = max((len(r['name']) for r in results), default=8) + 2
+    print(f"{'镜像名称':<{name_width}}{'格式':<8}{'吞吐':<14}{'下载量':<12}{'地址'}")
+    print("-" * (name_width + 80))
+    for r in results:
+        if r['error'] is not None:
+            error_msg = (r['error'][:27] + '..') if len(r['error']) > 29 else r['error']
+            print(f"{r['name']:<{name_width}}{r['format']:<8}{error_msg:<26}{r['url']}")
+            continue
+        throughput = format_throughput(r['throughput']) if r['throughput'] else '-'
+        print(f"{r['name']:<{name_width}}{r['format']:<8}{throughput:<14}{format_size(r['bytes']):<12}{r['url']}")
+
+
+def probe_vendor_mirrors(vendor, variant):
+    """
+    对 vendor 的全部镜像做吞吐测速并打印，返回按吞吐从高到低排序的结果。
+    镜像之间串行测量，避免争抢本机带宽。
+    """
+    registry = VENDOR_INDEX_MIRRORS[vendor]
+    project = registry['probe_project']
+    print(f"正在测速 {vendor} ({variant}) wheel 镜像（读取 {project} wheel 的前 "
+          f"{format_size(VENDOR_PROBE_BYTES)}），请稍候...")
+    results = [measure_vendor_mirror(name, entry, variant, project) for name, entry in registry['mirrors'].items()]
+    results.sort(key=lambda r: (r['error'] is not None, -(r['throughput'] or 0)))
+    print_vendor_results(results)
+    return results
+
+
+def rank_vendor_results(results):
+    """将 measure_vendor_mirror 的结果转换为按吞吐排序的 (name, throughput, url, error) 列表。"""
+    return [(r['name'], r['throughput'] or 0, r['url'], r['error']) for r in results]
+
+
+def _toml_block_name(block):
+    match = re.search(r'^name\s*=\s*["\']([^"\']+)["\']', block, re.MULTILINE)
+    return match.group(1) if match else None
+
+
+def update_uv_vendor_index(vendor, url, index_format):
+    """
+    在 uv 配置中写入名为 vendor 的 explicit 索引（flat 格式加 format = "flat"），
+    替换之前写入的同名索引，不影响默认索引。返回 (success: bool, message: str)
+    """
+    config_path = get_uv_config_path()
+    block = f'[[index]]\nname = "{vendor}"\nurl = "{url}"\nexplicit = true\n'
+    if index_format == 'flat':
+        block += 'format = "flat"\n'
+    try:
+        if config_path.exists():
+            content = config_path.read_text(encoding='utf-8', errors='replace')
+        else:
+            config_path.parent.mkdir(parents=True, exist_ok=True)
+            content = ''
+        clean = _remove_toml_blocks(content, '[[index]]', lambda b: _toml_block_name(b) == vendor).rstrip('\n')
+        atomic_write_text(config_path, (clean + '\n\n' + block) if clean else block)
+        return True, f"成功写入 uv 具名索引 {vendor}: '{url}'\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"写入 uv 配置失败: {e}"
 
 
-WINDOWS_PYTHON_SOURCE_NAMES = {
-    'store':    'Windows 商店 (Microsoft Store)',
-    'uv':       'uv 管理的 Python',
-    'conda':    'Conda/Miniconda',
-    'pyenv':    'pyenv-win',
-    'scoop':    'Scoop',
-    'official': '官方安装包 (python.org)',
-    'unknown':  '未知',
-}
+def update_pip_vendor_index(vendor, url, index_format, scope_args):
+    """
+    将厂商索引追加到 pip 的 extra-index-url（simple 格式）或 find-links（flat 格式），
+    替换之前写入的同一厂商的镜像，保留其他地址。返回是否成功。
+    """
+    key = 'extra-index-url' if index_format == 'simple' else 'find-links'
+    other_key = 'find-links' if index_format == 'simple' else 'extra-index-url'
+    # 只读取目标作用域中的值，其他作用域的地址不应复制到这里
+    use_pip = is_pip_installed()
+    existing = read_pip_scope_value(scope_args, key, use_pip)
+    kept = [u for u in (existing or '').split() if not _is_vendor_index_url(vendor, u)]
+    success, msg = update_pip_settings({key: ' '.join(kept + [url])}, scope_args)
+    print(f"成功写入 pip {key}: {url}" if success else msg)
+    other_urls = (read_pip_scope_value(scope_args, other_key, use_pip) or '').split()
+    if any(_is_vendor_index_url(vendor, u) for u in other_urls):
+        print(f"pip 的 {other_key} 中还有之前写入的 {vendor} 镜像，可运行 cnpip unset --{vendor} 移除")
+    return success
 
 
-def detect_environment():
+def unset_vendor_index(vendor, tool='pip', scope_args=None):
     """
-    检测当前 Python 环境类型。
-    返回: 'uvx' | 'uv_venv' | 'conda' | 'pipx' | 'venv' | 'system'
+    移除 set --{vendor} 写入的厂商索引：uv 移除名为 vendor 的 [[index]] 块，
+    pip 从目标作用域的 extra-index-url / find-links 中移除该厂商镜像的地址，保留其他地址。
+    返回 (success: bool, message: str)
     """
-    exe = sys.executable.replace('\\', '/')
+    if tool == 'uv':
+        config_path = get_uv_config_path()
+        if not config_path.exists():
+            return True, "uv 配置文件不存在，无需操作"
+        try:
+            content = config_path.read_text(encoding='utf-8', errors='replace')
+            clean = _remove_toml_blocks(content, '[[index]]', lambda b: _toml_block_name(b) == vendor)
+            if clean == content:
+                return True, f"uv 配置中没有 {vendor} 索引，无需操作"
+            atomic_write_text(config_path, clean)
+            return True, f"成功移除 uv 具名索引 {vendor}\n配置文件: {config_path}"
+        except PermissionError:
+            return False, f"权限不足，无法写入 {config_path}"
+        except Exception as e:
+            return False, f"移除 uv 配置失败: {e}"
 
-    # 1. uvx 临时工具环境（uv tool run / uvx）
-    uv_tool_dir = os.environ.get('UV_TOOL_DIR', '')
-    if uv_tool_dir and uv_tool_dir.replace('\\', '/') in exe:
-        return 'uvx'
-    if '/uv/tools/' in exe:
-        return 'uvx'
+    scope_args = scope_args or []
+    use_pip = is_pip_installed()
+    updates, removed = {}, []
+    for key in ('extra-index-url', 'find-links'):
+        urls = (read_pip_scope_value(scope_args, key, use_pip) or '').split()
+        kept = [u for u in urls if not _is_vendor_index_url(vendor, u)]
+        if len(kept) == len(urls):
+            continue
+        if kept:
+            updates[key] = ' '.join(kept)
+        else:
+            removed.append(key)
+    if not updates and not removed:
+        return True, f"pip 配置中没有 {vendor} 镜像，无需操作"
+    if updates:
+        success, msg = update_pip_settings(updates, scope_args)
+        if not success:
+            return False, msg
+    if removed:
+        success, msg = unset_pip_settings(removed, scope_args)
+        if not success:
+            return False, msg
+    return True, f"成功从 pip 的 {' / '.join(list(updates) + removed)} 中移除 {vendor} 镜像"
 
-    # 2. conda 环境（优先于 venv，因为 conda 也会改 sys.prefix）
-    if os.environ.get('CONDA_PREFIX'):
-        return 'conda'
 
-    # 3. pipx 隔离环境
-    if platform.system() == 'Windows':
-        localappdata = os.environ.get('LOCALAPPDATA', str(Path.home() / 'AppData' / 'Local'))
-        default_pipx_home = str(Path(localappdata) / 'pipx')
-    else:
-        default_pipx_home = str(Path.home() / '.local' / 'pipx')
-    pipx_home = os.environ.get('PIPX_HOME', default_pipx_home).replace('\\', '/')
-    if pipx_home in exe:
-        return 'pipx'
+def set_vendor_index(vendor, variant, mirror_name=None, tool='pip', scope_args=None):
+    """
+    设置厂商 wheel 索引：未指定镜像名时按吞吐测速选择，pip 写入 extra-index-url / find-links，
+    uv 写入 explicit 具名索引并提示 [tool.uv.sources] 配置。返回是否成功。
+    """
+    registry = VENDOR_INDEX_MIRRORS[vendor]
+    if not _VARIANT_RE.match(variant):
+        print(f"错误: 无效的 {vendor} 变体 '{variant}'，应类似 cu121、cpu、rocm6.0")
+        return False
+    if tool == 'uv' and not detect_uv_binary():
+        print("错误: 未检测到 uv，请先安装 uv (https://docs.astral.sh/uv/)")
+        return False
+    if mirror_name is None:
+        mirror_name = select_fastest_mirror(rank_vendor_results(probe_vendor_mirrors(vendor, variant)))
+        if mirror_name is None:
+            print(f"错误: 无法从任何 {vendor} 镜像下载 {variant} 的 wheel")
+            return False
+        print(f"自动选择吞吐最高的 {vendor} 镜像: {mirror_name}")
+    if mirror_name not in registry['mirrors']:
+        print(f"错误: 未找到 {vendor} 镜像 '{mirror_name}'，可选: {', '.join(registry['mirrors'])}")
+        return False
 
-    # 4. 虚拟环境
-    if sys.prefix != sys.base_prefix:
-        # 检测是否由 uv 创建（pyvenv.cfg 中含有 uv = ...）
-        pyvenv_cfg = Path(sys.prefix) / 'pyvenv.cfg'
-        if pyvenv_cfg.exists():
-            try:
-                cfg_content = pyvenv_cfg.read_text(encoding='utf-8', errors='replace')
-                if re.search(r'^uv\s*=', cfg_content, re.MULTILINE):
-                    return 'uv_venv'
-            except Exception:
-                pass
-        return 'venv'
+    entry = registry['mirrors'][mirror_name]
+    url = vendor_index_url(entry, variant)
+    if tool == 'uv':
+        success, msg = update_uv_vendor_index(vendor, url, entry['format'])
+        print(msg)
+        if success:
+            print_uv_sources_guidance(vendor, registry['packages'])
+        return success
+    return update_pip_vendor_index(vendor, url, entry['format'], scope_args or [])
 
-    return 'system'
 
+# === uv Python 安装镜像（python-build-standalone） ===
 
-ENV_DESCRIPTIONS = {
-    'uvx':     'uvx 临时工具环境',
-    'uv_venv': 'uv 管理的虚拟环境',
-    'conda':   'Conda 环境',
-    'pipx':    'pipx 隔离环境',
-    'venv':    '虚拟环境',
-    'system':  '系统环境',
-}
+# 未安装 uv 时用于测速的发布文件（相对镜像根地址）。部分镜像只保留最近的发布，
+# 安装了 uv 时改用 detect_python_probe_asset() 得到的 uv 实际会下载的文件
+PYTHON_PROBE_ASSET = '20240107/cpython-3.12.1+20240107-x86_64-unknown-linux-gnu-install_only.tar.gz'
+PYTHON_PROBE_BYTES = 8 * 1024 * 1024
+PYTHON_INSTALL_MIRROR_KEY = 'python-install-mirror'
 
 
-def get_pip_config():
+def detect_python_probe_asset():
     """
-    获取当前 pip 配置 (index-url 和 trusted-host)
+    返回 uv 安装最新 CPython 时会下载的发布文件（相对镜像根地址，形如 TAG/FILE），
+    通过 `uv python list --only-downloads` 获取，与本机平台和 uv 版本一致。
+    未安装 uv 或无法解析时返回 PYTHON_PROBE_ASSET。
     """
+    uv = detect_uv_binary()
+    if not uv:
+        return PYTHON_PROBE_ASSET
     try:
-        # 使用 subprocess 获取 pip config list 输出
-        result = subprocess.run(
-            [sys.executable, '-m', 'pip', 'config', 'list'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            encoding='utf-8',
-            errors='replace',
-            check=False
-        )
-        if result.returncode != 0:
-            return None, None
+        proc = subprocess.run([uv, 'python', 'list', '--only-downloads', '--output-format', 'json'],
+                              capture_output=True, text=True, timeout=30, check=True)
+        entries = json.loads(proc.stdout)
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return PYTHON_PROBE_ASSET
+    # uv 按版本从新到旧列出；跳过 PyPy、free-threaded / debug 等变体
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict) or entry.get('implementation', 'cpython') != 'cpython':
+            continue
+        if entry.get('variant', 'default') != 'default':
+            continue
+        # 下载地址可能指向 GitHub 或已配置的镜像，二者的最后两段路径（TAG/FILE）相同
+        parts = urlparse(entry.get('url') or '').path.rstrip('/').split('/')
+        if len(parts) >= 2 and parts[-1].startswith('cpython-'):
+            return urllib.parse.unquote('/'.join(parts[-2:]))
+    return PYTHON_PROBE_ASSET
 
-        output = result.stdout
-        index_url = None
-        trusted_host = None
 
-        for line in output.splitlines():
-            # 格式: [section].index-url='...'，前缀可能是 global/user/site/install 等
-            if '.index-url' in line:
-                parts = line.split('=', 1)
-                if len(parts) == 2:
-                    val = parts[1].strip().strip("'\"")
-                    if val:
-                        index_url = val
-            elif '.trusted-host' in line:
-                parts = line.split('=', 1)
-                if len(parts) == 2:
-                    val = parts[1].strip().strip("'\"")
-                    if val:
-                        trusted_host = val
-
-        return index_url, trusted_host
-    except Exception:
-        return None, None
+def measure_python_mirror(name, base_url, asset=PYTHON_PROBE_ASSET):
+    """
+    python-build-standalone 镜像吞吐测速：用 Range 请求读取发布文件的前 PYTHON_PROBE_BYTES 字节（跟随重定向）。
+    返回 dict: {'name', 'url', 'ms', 'bytes', 'throughput', 'error'}
+    """
+    result = {'name': name, 'url': base_url, 'ms': None, 'bytes': 0, 'throughput': None, 'error': None}
+    file_url = base_url.rstrip('/') + '/' + urllib.parse.quote(asset)
+    try:
+        ms, received = download_timed(file_url, timeout=VENDOR_PROBE_TIMEOUT, max_bytes=PYTHON_PROBE_BYTES,
+                                      headers={'Range': f'bytes=0-{PYTHON_PROBE_BYTES - 1}',
+                                               'User-Agent': f'cnpip/{__version__}'})
+    except Exception as e:
+        result['error'] = _describe_probe_error(e)
+        return result
+    result.update({'ms': ms, 'bytes': received, 'throughput': round(received / (ms / 1000)) if ms > 0 else None})
+    return result
 
 
-def get_scope_args(args):
+def print_python_mirror_results(results):
+    name_width = max((len(r['name']) for r in results), default=8) + 2
+    print(f"{'镜像名称':<{name_width}}{'吞吐':<14}{'下载量':<12}{'地址'}")
+    print("-" * (name_width + 80))
+    for r in results:
+        if r['error'] is not None:
+            error_msg = (r['error'][:23] + '..') if len(r['error']) > 25 else r['error']
+            print(f"{r['name']:<{name_width}}{error_msg:<26}{r['url']}")
+            continue
+        throughput = format_throughput(r['throughput']) if r['throughput'] else '-'
+        print(f"{r['name']:<{name_width}}{throughput:<14}{format_size(r['bytes']):<12}{r['url']}")
+
+
+def probe_python_mirrors(mirrors=None):
     """
-    根据用户标志和环境确定 pip 配置参数。
+    对 python-build-standalone 镜像做吞吐测速并打印，返回按吞吐从高到低排序的结果。
+    镜像之间串行测量，避免争抢本机带宽。
     """
-    if args.global_:
-        return ['--global']
-    elif args.user:
-        return ['--user']
-    elif args.venv:
-        return ['--site']
-
-    # 自动检测
-    env = detect_environment()
-    if env in ('venv', 'uv_venv', 'conda'):
-        return ['--site']
-    else:
-        return ['--user']
+    mirrors = PYTHON_INSTALL_MIRRORS if mirrors is None else mirrors
+    asset = detect_python_probe_asset()
+    print(f"正在测速 uv Python 安装镜像（读取 {asset.rsplit('/', 1)[-1]} 的前 "
+          f"{format_size(PYTHON_PROBE_BYTES)}），请稍候...")
+    results = [measure_python_mirror(name, url, asset) for name, url in mirrors.items()]
+    results.sort(key=lambda r: (r['error'] is not None, -(r['throughput'] or 0)))
+    print_python_mirror_results(results)
+    return results
 
 
-def get_scope_description(scope_args):
+def set_uv_python_mirror(mirror_name=None):
     """
-    返回配置范围的中文描述
+    设置 uv 的 python-install-mirror，未指定名称时按吞吐测速选择。返回是否成功。
     """
-    if not scope_args:
-        return "自动"
-    if '--global' in scope_args:
-        return "系统全局配置"
-    if '--user' in scope_args:
-        return "当前用户配置"
-    if '--site' in scope_args:
-        return "虚拟环境配置"
-    return " ".join(scope_args)
+    if not detect_uv_binary():
+        print("错误: 未检测到 uv，请先安装 uv (https://docs.astral.sh/uv/)")
+        return False
+    if mirror_name is None:
+        results = probe_python_mirrors()
+        mirror_name = select_fastest_mirror([(r['name'], r['throughput'], r['url'], r['error']) for r in results])
+        if mirror_name is None:
+            print("错误: 无法从任何 Python 安装镜像下载")
+            return False
+        print(f"自动选择吞吐最高的 Python 安装镜像: {mirror_name}")
+    if mirror_name not in PYTHON_INSTALL_MIRRORS:
+        print(f"错误: 未找到 Python 安装镜像 '{mirror_name}'，可选: {', '.join(PYTHON_INSTALL_MIRRORS)}")
+        return False
+    url = PYTHON_INSTALL_MIRRORS[mirror_name]
+    success, msg = update_uv_settings({PYTHON_INSTALL_MIRROR_KEY: url})
+    print(f"成功设置 uv 的 {PYTHON_INSTALL_MIRROR_KEY} 为 '{url}'\n配置文件: {get_uv_config_path()}" if success else msg)
+    return success
 
 
-def get_global_scope_hint():
-    """根据平台返回 --global 权限不足时的针对性提示"""
-    system = platform.system()
-    if system in ('Linux', 'Darwin'):
-        return "请尝试使用 sudo 运行: sudo cnpip set --global"
-    elif system == 'Windows':
-        source = detect_windows_python_source()
-        if source == 'store':
-            return ("检测到 Windows 商店版 Python，全局配置受沙盒限制。\n"
-                    "建议改用 --user: cnpip set --user")
-        else:
-            return "请以管理员身份运行 PowerShell 或命令提示符后重试"
-    return "请检查是否有足够的文件系统权限"
+def unset_uv_python_mirror():
+    """
+    从 uv 配置文件中移除 python-install-mirror。
+    返回 (success: bool, message: str)
+    """
+    config_path = get_uv_config_path()
+    if not config_path.exists():
+        return True, "uv 配置文件不存在，无需操作"
+    try:
+        content = config_path.read_text(encoding='utf-8', errors='replace')
+        pattern = rf'^{re.escape(PYTHON_INSTALL_MIRROR_KEY)}\s*=.*\n?'
+        if not re.search(pattern, content, re.MULTILINE):
+            return True, f"uv 配置中未设置 {PYTHON_INSTALL_MIRROR_KEY}，无需操作"
+        atomic_write_text(config_path, re.sub(pattern, '', content, count=1, flags=re.MULTILINE))
+        return True, f"成功移除 uv 的 {PYTHON_INSTALL_MIRROR_KEY}\n配置文件: {config_path}"
+    except Exception as e:
+        return False, f"移除 uv 配置失败: {e}"
 
 
-# === uv 相关 ===
+def find_poetry_project(start=None):
+    """返回当前目录下使用 poetry 的 pyproject.toml 路径，不是 poetry 项目时返回 None。"""
+    pyproject = Path(start or os.getcwd()) / 'pyproject.toml'
+    if not pyproject.is_file():
+        return None
+    try:
+        content = pyproject.read_text(encoding='utf-8', errors='replace')
+    except Exception:
+        return None
+    return pyproject if re.search(r'^\[tool\.poetry[\].]', content, re.MULTILINE) else None
 
-def detect_uv_binary():
-    """查找 uv 可执行文件路径，找不到返回 None。"""
-    return shutil.which('uv')
+
+def update_poetry_source(mirror_url, pyproject_path):
+    """
+    在 poetry 项目的 pyproject.toml 中写入名为 cnpip 的主源（poetry 不支持全局源）。
+    已存在的 cnpip 源会被替换，其他源保持不变。
+    返回 (success: bool, message: str)
+    """
+    pyproject_path = Path(pyproject_path)
+    new_block = (
+        '[[tool.poetry.source]]\n'
+        'name = "cnpip"\n'
+        f'url = "{mirror_url}"\n'
+        'priority = "primary"\n'
+    )
+    try:
+        content = pyproject_path.read_text(encoding='utf-8', errors='replace')
+        clean = _remove_toml_blocks(
+            content, '[[tool.poetry.source]]',
+            lambda block: re.search(r'^name\s*=\s*["\']cnpip["\']', block, re.MULTILINE) is not None,
+        ).rstrip('\n')
+        atomic_write_text(pyproject_path, clean + '\n\n' + new_block)
+        return True, f"成功设置 poetry 镜像源为 '{mirror_url}'\n配置文件: {pyproject_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {pyproject_path}"
+    except Exception as e:
+        return False, f"写入 poetry 配置失败: {e}"
 
 
-def get_uv_config_path():
+def get_pdm_config_path():
     """
-    返回 uv 用户级配置文件路径（跨平台）。
-    Linux/macOS: ~/.config/uv/uv.toml（遵循 XDG_CONFIG_HOME）
-    Windows:     %APPDATA%/uv/uv.toml
+    返回 pdm 全局配置文件路径（遵循 PDM_CONFIG_FILE 环境变量）。
+    Linux:   ~/.config/pdm/config.toml（遵循 XDG_CONFIG_HOME）
+    macOS:   ~/Library/Application Support/pdm/config.toml
+    Windows: %LOCALAPPDATA%/pdm/pdm/config.toml
     """
+    if os.environ.get('PDM_CONFIG_FILE'):
+        return Path(os.environ['PDM_CONFIG_FILE'])
     system = platform.system()
     if system == 'Windows':
-        appdata = os.environ.get('APPDATA', str(Path.home() / 'AppData' / 'Roaming'))
-        return Path(appdata) / 'uv' / 'uv.toml'
+        localappdata = os.environ.get('LOCALAPPDATA', str(Path.home() / 'AppData' / 'Local'))
+        return Path(localappdata) / 'pdm' / 'pdm' / 'config.toml'
+    elif system == 'Darwin':
+        return Path.home() / 'Library' / 'Application Support' / 'pdm' / 'config.toml'
     else:
         xdg_config = os.environ.get('XDG_CONFIG_HOME', str(Path.home() / '.config'))
-        return Path(xdg_config) / 'uv' / 'uv.toml'
+        return Path(xdg_config) / 'pdm' / 'config.toml'
 
 
-def get_uv_index_url():
+def update_pdm_config(mirror_url):
     """
-    读取 uv 配置文件中的 default index url。
-    不引入外部 TOML 依赖，使用正则解析（格式固定）。
+    写入 pdm 全局配置中的 [pypi] url。
+    返回 (success: bool, message: str)
     """
-    config_path = get_uv_config_path()
-    if not config_path.exists():
-        return None
+    config_path = get_pdm_config_path()
     try:
-        content = config_path.read_text(encoding='utf-8', errors='replace')
-        in_index_block = False
-        for line in content.splitlines():
-            stripped = line.strip()
-            if stripped == '[[index]]':
-                in_index_block = True
-                continue
-            if in_index_block:
-                if stripped.startswith('['):
-                    break  # 进入了下一个块
-                match = re.match(r'^url\s*=\s*["\'](.+)["\']', stripped)
-                if match:
-                    return match.group(1)
-        return None
-    except Exception:
-        return None
+        if config_path.exists():
+            content = config_path.read_text(encoding='utf-8', errors='replace')
+        else:
+            config_path.parent.mkdir(parents=True, exist_ok=True)
+            content = ''
+        atomic_write_text(config_path, _set_toml_table_values(content, 'pypi', {'url': mirror_url}))
+        return True, f"成功设置 pdm 镜像源为 '{mirror_url}'\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"写入 pdm 配置失败: {e}"
 
 
-def update_uv_config(mirror_url):
+def update_uv_settings(settings):
     """
-    写入 uv 配置文件中的 index url。
-    不引入外部依赖，直接操作文本。
-    - 若文件不存在 → 创建并写入
-    - 若存在但无 [[index]] → 追加
-    - 若存在且有 [[index]] → 移除旧块再追加（支持多个 [[index]]）
+    写入 uv 配置文件的顶层设置（如 concurrent-downloads），不影响 [[index]] 等其他配置。
     返回 (success: bool, message: str)
     """
     config_path = get_uv_config_path()
-    new_block = f'[[index]]\nurl = "{mirror_url}"\ndefault = true\n'
     try:
         if config_path.exists():
             content = config_path.read_text(encoding='utf-8', errors='replace')
-            if '[[index]]' in content:
-                # 移除所有现有 [[index]] 块
-                lines = content.splitlines(keepends=True)
-                new_lines = []
-                i = 0
-                while i < len(lines):
-                    if lines[i].strip() == '[[index]]':
-                        i += 1
-                        while i < len(lines):
-                            if lines[i].strip().startswith('['):
-                                break
-                            i += 1
-                    else:
-                        new_lines.append(lines[i])
-                        i += 1
-                clean = ''.join(new_lines).rstrip('\n')
-                new_content = (clean + '\n\n' + new_block) if clean else new_block
-            else:
-                new_content = content.rstrip('\n') + '\n\n' + new_block
         else:
             config_path.parent.mkdir(parents=True, exist_ok=True)
-            new_content = new_block
-
-        config_path.write_text(new_content, encoding='utf-8')
-        return True, f"成功设置 uv 镜像源为 '{mirror_url}'\n配置文件: {config_path}"
+            content = ''
+        for key, value in settings.items():
+            content = _set_toml_top_level_value(content, key, value)
+        atomic_write_text(config_path, content)
+        summary = ', '.join(f'{key} = {value}' for key, value in settings.items())
+        return True, f"成功写入 uv 网络参数: {summary}\n配置文件: {config_path}"
     except PermissionError:
         return False, f"权限不足，无法写入 {config_path}"
     except Exception as e:
         return False, f"写入 uv 配置失败: {e}"
 
 
-def unset_uv_config():
+def unset_uv_settings(keys):
     """
-    从 uv 配置文件中移除所有 [[index]] 块。
+    移除 uv 配置文件中的若干顶层设置（如 concurrent-downloads），未设置的键直接跳过。
     返回 (success: bool, message: str)
     """
     config_path = get_uv_config_path()
     if not config_path.exists():
         return True, "uv 配置文件不存在，无需操作"
+    summary = ', '.join(keys)
     try:
         content = config_path.read_text(encoding='utf-8', errors='replace')
-        if '[[index]]' not in content:
-            return True, "uv 配置中未设置 index，无需操作"
-
-        lines = content.splitlines(keepends=True)
-        new_lines = []
-        i = 0
-        while i < len(lines):
-            if lines[i].strip() == '[[index]]':
-                i += 1
-                while i < len(lines):
-                    if lines[i].strip().startswith('['):
-                        break
-                    i += 1
-            else:
-                new_lines.append(lines[i])
-                i += 1
-
-        config_path.write_text(''.join(new_lines), encoding='utf-8')
-        return True, f"成功移除 uv 镜像源配置\n配置文件: {config_path}"
+        new_content = content
+        for key in keys:
+            new_content = _remove_toml_top_level_value(new_content, key)
+        if new_content == content:
+            return True, f"uv 配置中未设置 {summary}，无需操作"
+        atomic_write_text(config_path, new_content)
+        return True, f"成功移除 uv 网络参数: {summary}\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
     except Exception as e:
         return False, f"移除 uv 配置失败: {e}"
 
@@ -424,47 +3082,152 @@ def get_pip_config_path_for_scope(scope):
     return None
 
 
-def write_pip_config_directly(mirror_url, scope):
+def get_pip_config_path_for_scope_args(scope_args):
+    """返回 scope_args（--global / --user / --site）对应的 pip 配置文件路径，site 为当前环境。"""
+    if '--site' in scope_args:
+        return get_site_pip_config_path(sys.prefix)
+    return get_pip_config_path_for_scope('global' if '--global' in scope_args else 'user')
+
+
+def get_site_pip_config_path(prefix):
+    """返回指定环境（虚拟环境 / conda 环境根目录）的 site 级 pip 配置文件路径。"""
+    return Path(prefix) / ('pip.ini' if platform.system() == 'Windows' else 'pip.conf')
+
+
+def write_pip_config_directly(mirror_url, scope, config_path=None, fallback_urls=()):
     """
     不依赖 pip 命令，直接用 configparser 写入 pip 配置文件。
     适用于 uvx 等无 pip 的环境中用户明确指定了 --user / --global。
-    scope: 'user' | 'global'
+    scope: 'user' | 'global' | 'site'（site 需同时传入 config_path）
+    fallback_urls: 按排名写入 extra-index-url 的备用镜像
     返回 (success: bool, message: str)
     """
-    import configparser
-    config_path = get_pip_config_path_for_scope(scope)
-    if config_path is None:
-        return False, f"不支持的作用域: {scope}"
+    import configparser
+    if config_path is None:
+        config_path = get_pip_config_path_for_scope(scope)
+    if config_path is None:
+        return False, f"不支持的作用域: {scope}"
+
+    config = configparser.ConfigParser()
+    if config_path.exists():
+        config.read(config_path, encoding='utf-8')
+    if not config.has_section('global'):
+        config.add_section('global')
+    config.set('global', 'index-url', mirror_url)
+    host = get_trusted_hosts([mirror_url] + list(fallback_urls))
+    if host:
+        config.set('global', 'trusted-host', host)
+    elif config.has_option('global', 'trusted-host'):
+        # file:// 本地镜像没有主机，之前镜像的 trusted-host 已不再需要
+        config.remove_option('global', 'trusted-host')
+    extra_urls = merge_extra_index_urls(config.get('global', 'extra-index-url', fallback=''), fallback_urls)
+    if extra_urls:
+        config.set('global', 'extra-index-url', ' '.join(extra_urls))
+    elif config.has_option('global', 'extra-index-url'):
+        config.remove_option('global', 'extra-index-url')
+
+    try:
+        config_path.parent.mkdir(parents=True, exist_ok=True)
+        buf = io.StringIO()
+        config.write(buf)
+        atomic_write_text(config_path, buf.getvalue())
+        return True, f"成功设置 pip 镜像源为 '{mirror_url}'\n配置文件: {config_path}"
+    except PermissionError:
+        hint = get_global_scope_hint() if scope == 'global' else ''
+        return False, f"权限不足，无法写入 {config_path}" + (f"\n{hint}" if hint else '')
+    except Exception as e:
+        return False, f"写入失败: {e}"
+
+
+def configure_environments(environments, mirror_url, max_workers=16, fallback_urls=()):
+    """
+    并发地为多个环境写入 site 级 pip 配置（直接写文件，不调用 pip）。
+    environments: [(prefix, env_type)]
+    返回 [(prefix, success, message)]，顺序与输入一致。
+    """
+    def _configure(prefix):
+        success, msg = write_pip_config_directly(mirror_url, 'site', get_site_pip_config_path(prefix), fallback_urls)
+        return prefix, success, msg
+
+    if not environments:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(environments))) as executor:
+        return list(executor.map(_configure, [prefix for prefix, _ in environments]))
+
+
+def unconfigure_environments(environments, max_workers=16):
+    """
+    并发地移除多个环境 site 级 pip 配置中的镜像源（直接修改文件，不调用 pip）。
+    environments: [(prefix, env_type)]
+    返回 [(prefix, success, message)]，顺序与输入一致。
+    """
+    def _unconfigure(prefix):
+        success, msg = unset_pip_config_directly('site', get_site_pip_config_path(prefix))
+        return prefix, success, msg
+
+    if not environments:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(environments))) as executor:
+        return list(executor.map(_unconfigure, [prefix for prefix, _ in environments]))
+
+
+def set_all_environments(root, mirror_url, fallback_urls=()):
+    """
+    为 root 下发现的所有虚拟环境 / conda 环境设置镜像源，并输出汇总。
+    返回是否全部成功。
+    """
+    if not Path(root).is_dir():
+        print(f"错误: 目录不存在: {root}")
+        return False
+
+    environments = discover_environments(root)
+    if not environments:
+        print(f"在 {root} 下未发现虚拟环境或 conda 环境")
+        return True
+
+    print(f"在 {root} 下发现 {len(environments)} 个环境，正在写入 site 级 pip 配置...")
+    outcomes = configure_environments(environments, mirror_url, fallback_urls=fallback_urls)
+    failures = [(prefix, msg) for prefix, success, msg in outcomes if not success]
+
+    print(f"\n成功: {len(outcomes) - len(failures)} 个，失败: {len(failures)} 个")
+    for prefix, msg in failures:
+        print(f"  {prefix}: {msg.splitlines()[0]}")
+    return not failures
+
+
+def unset_all_environments(root):
+    """
+    移除 root 下发现的所有虚拟环境 / conda 环境中 site 级 pip 配置的镜像源，并输出汇总。
+    返回是否全部成功。
+    """
+    if not Path(root).is_dir():
+        print(f"错误: 目录不存在: {root}")
+        return False
 
-    host = urlparse(mirror_url).netloc
-    config = configparser.ConfigParser()
-    if config_path.exists():
-        config.read(config_path, encoding='utf-8')
-    if not config.has_section('global'):
-        config.add_section('global')
-    config.set('global', 'index-url', mirror_url)
-    config.set('global', 'trusted-host', host)
+    environments = discover_environments(root)
+    if not environments:
+        print(f"在 {root} 下未发现虚拟环境或 conda 环境")
+        return True
 
-    try:
-        config_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(config_path, 'w', encoding='utf-8') as f:
-            config.write(f)
-        return True, f"成功设置 pip 镜像源为 '{mirror_url}'\n配置文件: {config_path}"
-    except PermissionError:
-        hint = get_global_scope_hint() if scope == 'global' else ''
-        return False, f"权限不足，无法写入 {config_path}" + (f"\n{hint}" if hint else '')
-    except Exception as e:
-        return False, f"写入失败: {e}"
+    print(f"在 {root} 下发现 {len(environments)} 个环境，正在移除 site 级 pip 配置中的镜像源...")
+    outcomes = unconfigure_environments(environments)
+    failures = [(prefix, msg) for prefix, success, msg in outcomes if not success]
 
+    print(f"\n成功: {len(outcomes) - len(failures)} 个，失败: {len(failures)} 个")
+    for prefix, msg in failures:
+        print(f"  {prefix}: {msg.splitlines()[0]}")
+    return not failures
 
-def unset_pip_config_directly(scope):
+
+def unset_pip_config_directly(scope, config_path=None):
     """
     不依赖 pip 命令，直接从 pip 配置文件中移除镜像源配置。
-    scope: 'user' | 'global'
+    scope: 'user' | 'global' | 'site'（site 需同时传入 config_path）
     返回 (success: bool, message: str)
     """
     import configparser
-    config_path = get_pip_config_path_for_scope(scope)
+    if config_path is None:
+        config_path = get_pip_config_path_for_scope(scope)
     if config_path is None:
         return False, f"不支持的作用域: {scope}"
     if not config_path.exists():
@@ -477,13 +3240,24 @@ def unset_pip_config_directly(scope):
         if config.has_option('global', key):
             config.remove_option('global', key)
             changed = True
+    if config.has_option('global', 'extra-index-url'):
+        # 只移除 cnpip 写入的镜像备用源，保留用户自己的 extra-index-url
+        existing = config.get('global', 'extra-index-url')
+        extra_urls = merge_extra_index_urls(existing, ())
+        if extra_urls != existing.split():
+            changed = True
+            if extra_urls:
+                config.set('global', 'extra-index-url', ' '.join(extra_urls))
+            else:
+                config.remove_option('global', 'extra-index-url')
 
     if not changed:
         return True, "pip 配置中未设置镜像源，无需操作"
 
     try:
-        with open(config_path, 'w', encoding='utf-8') as f:
-            config.write(f)
+        buf = io.StringIO()
+        config.write(buf)
+        atomic_write_text(config_path, buf.getvalue())
         return True, f"成功移除 pip 镜像源配置\n配置文件: {config_path}"
     except PermissionError:
         return False, f"权限不足，无法写入 {config_path}"
@@ -491,9 +3265,13 @@ def unset_pip_config_directly(scope):
         return False, f"移除失败: {e}"
 
 
-def update_pip_config(mirror_url, scope_args):
+def update_pip_config(mirror_url, scope_args, fallback_urls=()):
+    """
+    设置 pip 镜像源，返回实际写入的工具名：'pip'，或未安装 pip 时自动改写的 'uv'；失败时返回 None。
+    fallback_urls 按排名写入 extra-index-url：pip 会同时查询这些源，主镜像不可用时仍能从备用源安装。
+    """
     # 提取主机名
-    host = urlparse(mirror_url).netloc
+    host = get_trusted_hosts([mirror_url] + list(fallback_urls))
     scope_str = " ".join(scope_args) if scope_args else "auto"
     scope_desc = get_scope_description(scope_args)
 
@@ -502,29 +3280,35 @@ def update_pip_config(mirror_url, scope_args):
         if '--venv' in scope_args:
             print("错误: --venv 在 uvx 临时环境中无意义，配置会随环境消失。")
             print("建议改用 --user 写入用户级 pip 配置，或 --uv 配置 uv 镜像源。")
-            return
+            return None
         elif '--user' in scope_args or '--global' in scope_args:
             direct_scope = 'global' if '--global' in scope_args else 'user'
             print(f"正在直接写入 pip {scope_desc}（无需 pip 命令）...")
-            success, msg = write_pip_config_directly(mirror_url, direct_scope)
+            success, msg = write_pip_config_directly(mirror_url, direct_scope, fallback_urls=fallback_urls)
             print(msg)
+            return 'pip' if success else None
         else:
             # 自动模式兜底：优先配置 uv
             uv = detect_uv_binary()
             if uv:
                 print("检测到 uv 已安装，自动配置 uv 镜像源...")
-                success, msg = update_uv_config(mirror_url)
+                success, msg = update_uv_config(mirror_url, fallback_urls)
                 print(msg)
+                return 'uv' if success else None
             else:
                 print(f"请复制以下命令在终端运行以生效配置 ({scope_desc}):")
                 print(f"pip config set {scope_str} global.index-url {mirror_url}")
-                print(f"pip config set {scope_str} global.trusted-host {host}")
-        return
+                if host:
+                    print(f"pip config set {scope_str} global.trusted-host \"{host}\"")
+                if fallback_urls:
+                    print(f"pip config set {scope_str} global.extra-index-url \"{' '.join(fallback_urls)}\"")
+                return None
 
     print(f"\n正在修改 [{scope_desc}] ...", flush=True)
 
     # 获取修改前配置
-    old_index, old_host = get_pip_config()
+    old_values = read_pip_config_values()
+    old_index, old_host = old_values.get('index-url'), old_values.get('trusted-host')
     print(f"修改前配置: index-url='{old_index or '默认'}', trusted-host='{old_host or '未设置'}'", flush=True)
 
     try:
@@ -532,20 +3316,112 @@ def update_pip_config(mirror_url, scope_args):
         # 用户的需求是清晰的输出，pip config set 会输出 "Writing to ..."
         # 我们保留它，因为它告诉用户文件位置
         subprocess.run([sys.executable, '-m', 'pip', 'config', 'set'] + scope_args + ['global.index-url', mirror_url], check=True)
-        subprocess.run([sys.executable, '-m', 'pip', 'config', 'set'] + scope_args + ['global.trusted-host', host], check=True)
+        if host:
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'set'] + scope_args + ['global.trusted-host', host], check=True)
+        elif read_pip_scope_value(scope_args, 'trusted-host'):
+            # file:// 本地镜像没有主机，之前镜像的 trusted-host 已不再需要
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + ['global.trusted-host'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        # 只合并目标作用域中已有的 extra-index-url，其他作用域的值不应复制到这里
+        old_extra = read_pip_scope_value(scope_args, 'extra-index-url')
+        extra_urls = merge_extra_index_urls(old_extra, fallback_urls)
+        if extra_urls:
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'set'] + scope_args +
+                           ['global.extra-index-url', ' '.join(extra_urls)], check=True)
+        elif old_extra:
+            # 之前写入的镜像备用源已不再需要
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + ['global.extra-index-url'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
 
         # 获取修改后配置
         new_index, new_host = get_pip_config()
         print(f"修改后配置: index-url='{new_index or '默认'}', trusted-host='{new_host or '未设置'}'")
 
         print(f"成功设置 pip 镜像源为 '{mirror_url}'")
+        return 'pip'
     except subprocess.CalledProcessError:
         print(f"\n警告: 无法自动修改 pip 配置文件 (可能是权限问题)。")
         if '--global' in scope_args:
             print(get_global_scope_hint())
         print(f"\n请尝试手动运行以下命令:")
         print(f"pip config set {scope_str} global.index-url {mirror_url}")
-        print(f"pip config set {scope_str} global.trusted-host {host}")
+        if host:
+            print(f"pip config set {scope_str} global.trusted-host \"{host}\"")
+        if fallback_urls:
+            print(f"pip config set {scope_str} global.extra-index-url \"{' '.join(fallback_urls)}\"")
+        return None
+
+
+def update_pip_settings(settings, scope_args):
+    """
+    写入 pip 的其他 global.* 配置（如 timeout / retries）。
+    有 pip 时使用 pip config set，否则直接写入对应作用域的配置文件。
+    返回 (success: bool, message: str)
+    """
+    import configparser
+    summary = ', '.join(f'{key} = {value}' for key, value in settings.items())
+    if is_pip_installed():
+        try:
+            for key, value in settings.items():
+                subprocess.run([sys.executable, '-m', 'pip', 'config', 'set'] + scope_args +
+                               [f'global.{key}', str(value)],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+            return True, f"成功写入 pip 网络参数: {summary}"
+        except subprocess.CalledProcessError:
+            return False, "写入 pip 网络参数失败 (可能是权限问题)"
+
+    config_path = get_pip_config_path_for_scope_args(scope_args)
+    config = configparser.ConfigParser()
+    if config_path.exists():
+        config.read(config_path, encoding='utf-8')
+    if not config.has_section('global'):
+        config.add_section('global')
+    for key, value in settings.items():
+        config.set('global', key, str(value))
+    try:
+        config_path.parent.mkdir(parents=True, exist_ok=True)
+        buf = io.StringIO()
+        config.write(buf)
+        atomic_write_text(config_path, buf.getvalue())
+        return True, f"成功写入 pip 网络参数: {summary}\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"写入失败: {e}"
+
+
+def unset_pip_settings(keys, scope_args):
+    """
+    移除 pip 的若干 global.* 配置，未设置的键直接跳过。
+    有 pip 时使用 pip config unset，否则直接修改对应作用域的配置文件。
+    返回 (success: bool, message: str)
+    """
+    import configparser
+    summary = ', '.join(keys)
+    if is_pip_installed():
+        for key in keys:
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + [f'global.{key}'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        return True, f"成功移除 pip 配置: {summary}"
+
+    config_path = get_pip_config_path_for_scope_args(scope_args)
+    if not config_path.exists():
+        return True, "pip 配置文件不存在，无需操作"
+    config = configparser.ConfigParser()
+    config.read(config_path, encoding='utf-8')
+    if not any(config.has_option('global', key) for key in keys):
+        return True, f"pip 配置中未设置 {summary}，无需操作"
+    for key in keys:
+        config.remove_option('global', key)
+    try:
+        buf = io.StringIO()
+        config.write(buf)
+        atomic_write_text(config_path, buf.getvalue())
+        return True, f"成功移除 pip 配置: {summary}\n配置文件: {config_path}"
+    except PermissionError:
+        return False, f"权限不足，无法写入 {config_path}"
+    except Exception as e:
+        return False, f"移除失败: {e}"
 
 
 def unset_pip_mirror(scope_args) -> None:
@@ -570,11 +3446,507 @@ def unset_pip_mirror(scope_args) -> None:
     try:
         subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + ['global.index-url'], check=True)
         subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + ['global.trusted-host'], check=True)
+        extra = read_pip_scope_value(scope_args, 'extra-index-url')
+        if extra and not merge_extra_index_urls(extra, ()):
+            # extra-index-url 中只有 cnpip 写入的镜像备用源时一并移除
+            subprocess.run([sys.executable, '-m', 'pip', 'config', 'unset'] + scope_args + ['global.extra-index-url'],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
         print("成功取消 pip 镜像源设置，已恢复为默认源")
     except subprocess.CalledProcessError as e:
          print(f"取消 pip 镜像源设置时出错: {e}")
 
 
+# === 多工具一次性配置 ===
+
+def detect_tool_targets(scope_args):
+    """
+    并发检测各工具是否可用及其配置位置（pip 检测需启动子进程，其余为文件系统检查）。
+    返回 {tool: target}，target 为 None 表示未检测到该工具。
+    """
+    detectors = {
+        'pip': lambda: get_scope_description(scope_args) if is_pip_installed() else None,
+        'uv': lambda: get_uv_config_path() if detect_uv_binary() else None,
+        'conda': lambda: get_condarc_path() if (
+            shutil.which('conda') or os.environ.get('CONDA_PREFIX') or get_condarc_path().exists()) else None,
+        'poetry': find_poetry_project,
+        'pdm': lambda: get_pdm_config_path() if (shutil.which('pdm') or get_pdm_config_path().exists()) else None,
+    }
+    with ThreadPoolExecutor(max_workers=len(detectors)) as executor:
+        futures = {tool: executor.submit(detector) for tool, detector in detectors.items()}
+        return {tool: future.result() for tool, future in futures.items()}
+
+
+def set_all_tools(mirror_name, mirror_url, scope_args, fallback_urls=(), poetry=False):
+    """
+    用同一个镜像源配置所有检测到的工具：pip、uv、conda、poetry、pdm。
+    未安装的工具跳过；conda 仅在该站点提供 Anaconda 镜像时配置。
+    poetry 的源写在当前目录项目的 pyproject.toml 中，只有 poetry=True（--poetry）时才修改。
+    返回成功写入的工具集合；任一工具写入失败时返回 None。
+    """
+    targets = detect_tool_targets(scope_args)
+    outcomes = []
+    written = set()
+    for tool, target in targets.items():
+        if target is None:
+            outcomes.append((tool, None, "未检测到，跳过"))
+            continue
+        if tool in written:
+            # 未安装 pip 时 pip 步骤已改写 uv 配置，不再重复写入
+            outcomes.append((tool, None, "已在 pip 步骤中写入，跳过"))
+            continue
+        if tool == 'poetry' and not poetry:
+            msg = f"检测到 poetry 项目 {target}，未指定 --poetry，不修改项目文件"
+            print(f"\n{msg}")
+            outcomes.append((tool, None, msg))
+            continue
+        print(f"\n--- {tool} ---")
+        if tool == 'pip':
+            written_tool = update_pip_config(mirror_url, scope_args, fallback_urls)
+            if written_tool:
+                written.add(written_tool)
+            outcomes.append((tool, written_tool is not None, target))
+            continue
+        if tool == 'uv':
+            success, msg = update_uv_config(mirror_url, fallback_urls)
+        elif tool == 'conda':
+            conda_url = CONDA_MIRRORS.get(mirror_name)
+            if conda_url is None:
+                msg = f"镜像源 '{mirror_name}' 不提供 Anaconda 镜像，跳过"
+                print(msg)
+                outcomes.append((tool, None, msg))
+                continue
+            success, msg = update_condarc(conda_url)
+        elif tool == 'poetry':
+            print(f"即将修改 poetry 项目文件: {target}")
+            success, msg = update_poetry_source(mirror_url, target)
+        else:
+            success, msg = update_pdm_config(mirror_url)
+        print(msg)
+        if success:
+            written.add(tool)
+        outcomes.append((tool, success, target))
+
+    print("\n--- 汇总 ---")
+    for tool, success, detail in outcomes:
+        status = '跳过' if success is None else ('成功' if success else '失败')
+        print(f"{tool:<8}{status:<6}{detail}")
+    if any(success is False for _, success, _ in outcomes):
+        return None
+    return written
+
+
+# === 端到端安装对比（cnpip verify） ===
+
+VERIFY_WORKERS = 4          # 同时进行的解析 / 下载数
+VERIFY_TIMEOUT = 600        # 单个镜像的超时 (秒)
+# 会让 uv 读取额外索引的环境变量，verify 时移除以保证只使用被测镜像
+UV_INDEX_ENV_VARS = ('UV_INDEX', 'UV_INDEX_URL', 'UV_DEFAULT_INDEX', 'UV_EXTRA_INDEX_URL', 'UV_FIND_LINKS')
+
+
+def build_verify_command(tool, requirements, url, workdir):
+    """
+    返回 (命令, 环境变量)，在 workdir 中针对单个镜像做隔离、禁用缓存的解析与下载：
+    - pip: pip download（--isolated 忽略用户配置与 PIP_* 环境变量），下载的文件留在 workdir
+    - uv: uv pip compile（--no-config，仅解析依赖，不下载安装包）
+    """
+    env = {key: value for key, value in os.environ.items() if key not in UV_INDEX_ENV_VARS}
+    if tool == 'uv':
+        command = [detect_uv_binary() or 'uv', 'pip', 'compile', str(requirements),
+                   '--index-url', url, '--no-cache', '--no-config', '--quiet',
+                   '--output-file', os.path.join(workdir, 'requirements.lock')]
+        return command, env
+    command = [sys.executable, '-m', 'pip', 'download', '-r', str(requirements),
+               '--dest', workdir, '--index-url', url, '--trusted-host', urlparse(url).netloc,
+               '--no-cache-dir', '--isolated', '--disable-pip-version-check', '--quiet']
+    return command, env
+
+
+def _directory_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for file_name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file_name))
+            except OSError:
+                pass
+    return total
+
+
+def verify_mirror(name, url, requirements, tool='pip', timeout=VERIFY_TIMEOUT):
+    """
+    在独立的临时目录中用 pip/uv 针对 url 解析（pip 还会下载）requirements。
+    返回 dict: {'name', 'url', 'ms', 'bytes', 'error'}；bytes 为下载的安装包总大小（uv 只解析，为 None）。
+    """
+    result = {'name': name, 'url': url, 'ms': None, 'bytes': None, 'error': None}
+    with tempfile.TemporaryDirectory(prefix='cnpip-verify-') as workdir:
+        command, env = build_verify_command(tool, requirements, url, workdir)
+        start_time = time.monotonic()
+        try:
+            completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env,
+                                       encoding='utf-8', errors='replace', timeout=timeout, check=False)
+        except subprocess.TimeoutExpired:
+            result['error'] = f"超时 ({timeout} 秒)"
+            return result
+        except OSError as e:
+            result['error'] = str(e)
+            return result
+        result['ms'] = round((time.monotonic() - start_time) * 1000, 2)
+        if completed.returncode != 0:
+            lines = [line.strip() for line in completed.stderr.splitlines() if line.strip()]
+            result['error'] = lines[-1] if lines else f"退出码 {completed.returncode}"
+        if tool == 'pip':
+            result['bytes'] = _directory_size(workdir)
+    return result
+
+
+def print_verify_results(results, configured_url=None):
+    name_width = max((len(r['name']) for r in results), default=8) + 4
+    print(f"{'镜像名称':<{name_width}}{'耗时':<14}{'下载量':<12}{'结果'}")
+    print("-" * (name_width + 50))
+    for r in results:
+        marker = '* ' if configured_url and r['url'].rstrip('/') == configured_url.rstrip('/') else '  '
+        elapsed = f"{r['ms'] / 1000:.1f} s" if r['ms'] is not None else '-'
+        size = format_size(r['bytes']) if r['bytes'] is not None else '-'
+        outcome = '成功' if r['error'] is None else f"失败: {r['error'][:80]}"
+        print(f"{marker + r['name']:<{name_width}}{elapsed:<14}{size:<12}{outcome}")
+    if configured_url:
+        print("\n* 为当前 pip 配置的镜像源")
+
+
+def verify_mirrors(mirrors, requirements, tool='pip', workers=VERIFY_WORKERS):
+    """
+    并行（最多 workers 个）对每个镜像做端到端解析 / 下载并打印对比结果，返回按耗时排序的结果列表。
+    """
+    if tool == 'uv' and not detect_uv_binary():
+        print("错误: 未检测到 uv，请先安装 uv (https://docs.astral.sh/uv/)")
+        return []
+    action = "解析依赖" if tool == 'uv' else "解析并下载依赖"
+    print(f"正在用 {tool} 对 {len(mirrors)} 个镜像{action}（禁用缓存，最多 {workers} 个并行），请稍候...")
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(mirrors)))) as executor:
+        results = list(executor.map(lambda item: verify_mirror(item[0], item[1], requirements, tool),
+                                    mirrors.items()))
+    results.sort(key=lambda r: (r['error'] is not None, r['ms'] or 0))
+    configured_url, _ = get_pip_config() if tool == 'pip' else (get_uv_index_url(), None)
+    print_verify_results(results, configured_url)
+    return results
+
+
+def parse_verify_mirrors(value, candidates=None):
+    """
+    解析 --mirrors：逗号分隔的镜像名或 http(s) 地址（地址以主机名作为名称）。
+    同一主机的不同地址依次命名为 host、host#2、host#3…，重复给出的同一地址只保留一次。
+    未指定时使用 candidates（按 --region / --tag 筛选）或全部镜像。返回 ({name: url}, 错误信息)。
+    """
+    if not value:
+        return dict(get_automatic_mirrors() if candidates is None else candidates), None
+    mirrors = {}
+    for item in (part.strip() for part in value.split(',')):
+        if not item:
+            continue
+        if '://' in item:
+            name = base = urlparse(item).netloc or item
+        elif item in MIRRORS:
+            name = base = item
+            item = MIRRORS[item]
+        else:
+            return None, f"未找到镜像源 '{item}'"
+        if item in mirrors.values():
+            continue
+        suffix = 2
+        while name in mirrors:
+            name = f"{base}#{suffix}"
+            suffix += 1
+        mirrors[name] = item
+    return mirrors, None
+
+
+# === 本地静态镜像（cnpip sync） ===
+
+SYNC_WORKERS = 8                    # 并行获取项目页 / 下载文件的数量
+SYNC_SOURCES = 3                    # 取排名最靠前的几个镜像作为来源，前一个失败时依次尝试下一个
+SYNC_TIMEOUT = 60
+# 保存在目标目录中，记录各项目页的 ETag / Last-Modified 与已下载文件的哈希，用于增量同步
+SYNC_MANIFEST = '.cnpip-sync.json'
+SDIST_SUFFIXES = ('.tar.gz', '.tar.bz2', '.zip')
+_PINNED_REQUIREMENT_RE = re.compile(
+    r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*===?\s*([A-Za-z0-9._+!-]+)\s*(?:;.*)?$')
+_ANCHOR_RE = re.compile(r'<a\s([^>]*)>', re.IGNORECASE)
+_ATTR_RE = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+
+
+def canonicalize_name(name):
+    """按 PEP 503 规范化项目名。"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_pinned_requirements(path):
+    """
+    读取 requirements 文件，返回 ({规范化项目名: 版本}, 未固定版本的行列表)。
+    只接受 name==version 形式（如 pip freeze / pip-compile / uv pip compile 的输出），
+    忽略空行、注释、以 - 开头的选项行以及 --hash 等行内选项。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().replace('\\\n', ' ')
+    pins, unpinned = {}, []
+    for raw_line in content.splitlines():
+        line = re.split(r'(?:^|\s)#', raw_line, 1)[0]
+        line = re.split(r'\s--?[a-z]', ' ' + line, 1)[0].strip()
+        if not line:
+            continue
+        match = _PINNED_REQUIREMENT_RE.match(line)
+        if match is None:
+            unpinned.append(line)
+            continue
+        pins[canonicalize_name(match.group(1))] = match.group(2)
+    return pins, unpinned
+
+
+def parse_distribution_filename(filename):
+    """从 wheel / sdist 文件名中解析 (规范化项目名, 版本)，无法识别时返回 None。"""
+    if filename.endswith('.whl'):
+        parts = filename[:-len('.whl')].split('-')
+        return (canonicalize_name(parts[0]), parts[1]) if len(parts) >= 5 else None
+    for suffix in SDIST_SUFFIXES:
+        if filename.endswith(suffix):
+            name, _, version = filename[:-len(suffix)].rpartition('-')
+            return (canonicalize_name(name), version) if name else None
+    return None
+
+
+def parse_project_links(page, base_url):
+    """
+    解析 PEP 503 项目页中的文件链接，返回 [{'filename', 'url', 'sha256', 'requires_python'}]。
+    url 为去掉 #sha256=... 片段的绝对地址。
+    """
+    links = []
+    for attrs_text in _ANCHOR_RE.findall(page):
+        attrs = {key.lower(): html.unescape(double or single) for key, double, single in _ATTR_RE.findall(attrs_text)}
+        if not attrs.get('href'):
+            continue
+        url, _, fragment = urljoin(base_url, attrs['href']).partition('#')
+        links.append({
+            'filename': urllib.parse.unquote(url.rsplit('/', 1)[-1]),
+            'url': url,
+            'sha256': fragment[len('sha256='):] if fragment.startswith('sha256=') else None,
+            'requires_python': attrs.get('data-requires-python'),
+        })
+    return links
+
+
+def fetch_project_page(index_url, project, etag=None, last_modified=None, timeout=SYNC_TIMEOUT):
+    """
+    条件请求下载项目页。返回 dict: {'modified', 'links', 'etag', 'last_modified'}；
+    服务器返回 304 时 modified 为 False、links 为 None。失败时抛出异常。
+    """
+    headers = {'Accept': 'text/html', 'User-Agent': f'cnpip/{__version__}'}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    req = urllib.request.Request(index_url.rstrip('/') + '/' + project + '/', headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            page = response.read().decode('utf-8', errors='replace')
+            return {'modified': True, 'links': parse_project_links(page, response.geturl()),
+                    'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return {'modified': False, 'links': None, 'etag': etag, 'last_modified': last_modified}
+        raise
+
+
+def select_version_links(links, project, version):
+    """从项目页链接中选出属于指定版本的 wheel / sdist。"""
+    selected = []
+    for link in links:
+        parsed = parse_distribution_filename(link['filename'])
+        if parsed is not None and parsed[0] == project and parsed[1].lower() == version.lower():
+            selected.append(link)
+    return selected
+
+
+def download_verified(url, path, sha256=None, timeout=SYNC_TIMEOUT):
+    """
+    下载 url 到 path（先写临时文件，校验通过后再替换），返回 (sha256, 字节数)。
+    给出 sha256 时校验不一致会抛出 ValueError，目标文件保持不变。
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.part")
+    digest = hashlib.sha256()
+    size = 0
+    req = urllib.request.Request(url, headers={'User-Agent': f'cnpip/{__version__}'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response, open(tmp_path, 'wb') as f:
+            while True:
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        if sha256 and digest.hexdigest() != sha256.lower():
+            raise ValueError(f"sha256 不匹配: {path.name}")
+        os.replace(str(tmp_path), str(path))
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return digest.hexdigest(), size
+
+
+def load_sync_manifest(dest):
+    try:
+        with open(os.path.join(dest, SYNC_MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, dict) and isinstance(manifest.get('projects'), dict) \
+                and isinstance(manifest.get('files'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {'version': 1, 'projects': {}, 'files': {}}
+
+
+def write_sync_index(dest, manifest):
+    """
+    根据清单中记录的文件生成 PEP 503 静态索引：simple/index.html 与 simple/<project>/index.html。
+    清单中已没有文件的项目页会被删除。
+    """
+    by_project = {}
+    for filename, info in sorted(manifest['files'].items()):
+        by_project.setdefault(info['project'], []).append((filename, info))
+    simple_dir = Path(dest) / 'simple'
+    simple_dir.mkdir(parents=True, exist_ok=True)
+    for project, files in by_project.items():
+        anchors = []
+        for filename, info in files:
+            href = f"../../packages/{urllib.parse.quote(filename)}#sha256={info['sha256']}"
+            requires = info.get('requires_python')
+            attr = f' data-requires-python="{html.escape(requires)}"' if requires else ''
+            anchors.append(f'    <a href="{href}"{attr}>{html.escape(filename)}</a><br/>')
+        (simple_dir / project).mkdir(exist_ok=True)
+        atomic_write_text(simple_dir / project / 'index.html',
+                          f"<!DOCTYPE html>\n<html>\n  <body>\n" + '\n'.join(anchors) + "\n  </body>\n</html>\n")
+    # 已没有文件的项目页（例如项目移出了 pins）一并删除，pip 直接请求 simple/<project>/ 时不会拿到旧文件
+    for stale in simple_dir.iterdir():
+        if stale.is_dir() and stale.name not in by_project and (stale / 'index.html').is_file():
+            shutil.rmtree(str(stale), ignore_errors=True)
+    anchors = [f'    <a href="{project}/">{project}</a><br/>' for project in sorted(by_project)]
+    atomic_write_text(simple_dir / 'index.html',
+                      "<!DOCTYPE html>\n<html>\n  <body>\n" + '\n'.join(anchors) + "\n  </body>\n</html>\n")
+
+
+def prune_sync_manifest(dest, manifest, pins):
+    """从清单与 dest/packages 中删除项目已不在 pins 中、或版本与 pins 不一致的文件，返回删除的文件数。"""
+    removed = 0
+    for filename, info in list(manifest['files'].items()):
+        parsed = parse_distribution_filename(filename)
+        pinned = pins.get(info['project'])
+        if parsed is not None and pinned is not None and parsed[1].lower() == pinned.lower():
+            continue
+        del manifest['files'][filename]
+        try:
+            os.remove(os.path.join(dest, 'packages', filename))
+        except OSError:
+            pass
+        removed += 1
+    for project in list(manifest['projects']):
+        if project not in pins:
+            del manifest['projects'][project]
+    return removed
+
+
+def _sync_project_page(project, version, sources, previous):
+    """
+    依次从 sources 获取项目页，返回 (清单中的项目条目, 错误信息)。
+    上次从同一镜像同步过同一版本时带上 ETag / Last-Modified，未变化则直接复用上次的文件列表。
+    """
+    errors = []
+    for name, index_url in sources.items():
+        reuse = previous if previous and previous.get('source') == index_url and previous.get('version') == version else None
+        try:
+            page = fetch_project_page(index_url, project, *((reuse['etag'], reuse['last_modified']) if reuse else ()))
+        except Exception as e:
+            errors.append(f"{name}: {_describe_probe_error(e)}")
+            continue
+        links = reuse['links'] if not page['modified'] else select_version_links(page['links'], project, version)
+        if not links:
+            errors.append(f"{name}: 没有 {version} 版本的文件")
+            continue
+        return {'version': version, 'source': index_url, 'etag': page['etag'],
+                'last_modified': page['last_modified'], 'links': links}, None
+    return None, '; '.join(errors)
+
+
+def _sync_file(project, link, packages_dir, sources, primary_url):
+    """下载单个文件，失败时从其他来源镜像的项目页中找到同名文件重试。返回 (sha256, 字节数)。"""
+    path = packages_dir / link['filename']
+    try:
+        return download_verified(link['url'], path, link['sha256'])
+    except Exception:
+        for index_url in sources.values():
+            if index_url == primary_url:
+                continue
+            try:
+                page = fetch_project_page(index_url, project)
+                for other in page['links']:
+                    if other['filename'] == link['filename']:
+                        return download_verified(other['url'], path, link['sha256'] or other['sha256'])
+            except Exception:
+                continue
+        raise
+
+
+def sync_mirror(pins, dest, sources, workers=SYNC_WORKERS):
+    """
+    将 pins ({项目名: 版本}) 对应的全部 wheel / sdist 从 sources ({name: index_url}，按优先级排列)
+    同步到 dest 下的静态 PEP 503 目录（dest/simple、dest/packages），项目页与文件下载均并行进行。
+    已下载且哈希与项目页一致的文件会被跳过。
+    不再固定的文件（项目已移出 pins 或固定为其他版本）会从清单与 dest/packages 中删除。
+    返回 dict: {'downloaded', 'skipped', 'removed', 'bytes', 'failed': [(项目或文件, 错误)]}。
+    """
+    dest = Path(dest)
+    packages_dir = dest / 'packages'
+    packages_dir.mkdir(parents=True, exist_ok=True)
+    manifest = load_sync_manifest(dest)
+    summary = {'downloaded': 0, 'skipped': 0, 'removed': 0, 'bytes': 0, 'failed': []}
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        pages = list(executor.map(
+            lambda item: (item[0],) + _sync_project_page(item[0], item[1], sources, manifest['projects'].get(item[0])),
+            pins.items()))
+
+        tasks = []
+        for project, entry, error in pages:
+            if entry is None:
+                summary['failed'].append((project, error))
+                continue
+            for link in entry['links']:
+                known = manifest['files'].get(link['filename'])
+                path = packages_dir / link['filename']
+                if known and path.is_file() and path.stat().st_size == known['size'] \
+                        and (link['sha256'] is None or link['sha256'].lower() == known['sha256']):
+                    summary['skipped'] += 1
+                    continue
+                tasks.append((project, link, executor.submit(_sync_file, project, link, packages_dir,
+                                                             sources, entry['source'])))
+            manifest['projects'][project] = entry
+
+        for project, link, future in tasks:
+            try:
+                sha256, size = future.result()
+            except Exception as e:
+                summary['failed'].append((link['filename'], _describe_probe_error(e)))
+                continue
+            manifest['files'][link['filename']] = {'project': project, 'sha256': sha256, 'size': size,
+                                                   'requires_python': link['requires_python']}
+            summary['downloaded'] += 1
+            summary['bytes'] += size
+
+    summary['removed'] = prune_sync_manifest(dest, manifest, pins)
+    write_sync_index(dest, manifest)
+    atomic_write_text(dest / SYNC_MANIFEST, json.dumps(manifest, indent=2, ensure_ascii=False) + '\n')
+    return summary
+
+
 def get_pip_config_files():
     """
     通过 pip config list -v 获取实际配置文件路径列表。
@@ -670,35 +4042,391 @@ def show_info():
     else:
         print("uv: 未安装")
 
+    schedule = load_schedule_plan()
+    if schedule is not None:
+        hour = time.localtime().tm_hour
+        print("\n--- 时段计划 (set --schedule) ---")
+        print(f"当前时段 ({hour:02d}:00) 镜像源: {schedule['plan'].get(str(hour)) or '历史不足，实时测速'}")
+        print(f"定时任务命令: {schedule['command']}")
+
+
+def sync_command(args, mirrors):
+    """执行 cnpip sync：选择来源镜像、同步到 --dest 并按需注册本地镜像，返回是否全部成功。"""
+    if not args.requirement or not os.path.isfile(args.requirement):
+        print("错误: 请通过 -r 指定存在的 requirements 文件")
+        return False
+    if not args.dest:
+        print("错误: 请通过 --dest 指定本地镜像的目标目录")
+        return False
+    pins, unpinned = parse_pinned_requirements(args.requirement)
+    if unpinned:
+        print("错误: sync 只同步固定版本 (name==version) 的依赖，以下行未固定版本:")
+        for line in unpinned:
+            print(f"  {line}")
+        print("可先用 pip freeze、pip-compile 或 uv pip compile 生成包含全部依赖的锁定文件")
+        return False
+    if not pins:
+        print("错误: requirements 文件中没有依赖")
+        return False
+
+    if args.mirrors:
+        sources, error = parse_verify_mirrors(args.mirrors)
+        if error:
+            print(f"错误: {error}")
+            return False
+    else:
+        # 本地镜像不作为来源
+        remote = {name: url for name, url in mirrors.items() if urlparse(url).scheme != 'file'}
+        print("正在测速以选择下载来源...")
+        ranked = probe_ranked_mirrors(args, remote)
+        sources = {name: url for name, _, url, error in ranked if error is None}
+        sources = dict(list(sources.items())[:SYNC_SOURCES])
+        if not sources:
+            print("错误: 无法连接到任何镜像源")
+            return False
+    print(f"下载来源: {', '.join(sources)}")
+
+    workers = args.workers or SYNC_WORKERS
+    print(f"正在同步 {len(pins)} 个项目到 {args.dest}（最多 {workers} 个并行）...")
+    start_time = time.monotonic()
+    summary = sync_mirror(pins, args.dest, sources, workers)
+    elapsed = time.monotonic() - start_time
+    print(f"同步完成: 下载 {summary['downloaded']} 个文件 ({format_size(summary['bytes'])})，"
+          f"跳过 {summary['skipped']} 个未变化的文件，耗时 {elapsed:.1f} s")
+    if summary['removed']:
+        print(f"删除 {summary['removed']} 个不再固定的文件")
+    for item, error in summary['failed']:
+        print(f"  失败: {item}: {error}")
+
+    if args.register:
+        url = args.serve_url or (Path(args.dest).resolve() / 'simple').as_uri()
+        success, msg = register_local_mirror(args.register, url)
+        print(msg)
+        if not success:
+            return False
+    return not summary['failed']
+
+
+def get_candidate_mirrors(args):
+    """按 --region / --tag（逗号分隔）筛选参与测速的镜像 {name: url}，未指定筛选条件时返回 None。"""
+    if not args.region and not args.tag:
+        return None
+    regions = [r.strip() for r in args.region.split(',') if r.strip()] if args.region else None
+    tags = [t.strip() for t in args.tag.split(',') if t.strip()] if args.tag else None
+    return filter_mirrors(MIRROR_REGISTRY, regions, tags)
+
+
+def probe_ranked_mirrors(args, mirrors=None):
+    """
+    按 --rank-by 指定的依据测速并返回排好序的 (name, metric, url, error) 列表，
+    供 select_fastest_mirror / select_fallback_mirrors 使用。mirrors 默认为全部镜像。
+    """
+    candidates = get_automatic_mirrors() if mirrors is None else mirrors
+    if args.rank_by == 'throughput':
+        print(f"按并发 {args.concurrency} 下的聚合吞吐排序")
+        return rank_by_throughput(probe_concurrency_scaling(candidates, args.concurrency), args.concurrency)
+    if args.rank_by == 'warm':
+        print("按复用连接（热连接）的延迟排序")
+        return rank_by_warm(probe_warm_latency(candidates))
+    if args.rank_by == 'miss':
+        print("按冷门文件（CDN 缓存未命中）的下载耗时排序")
+        return rank_by_cache_miss(probe_cache_behaviour(candidates))
+    if args.rank_by == 'page':
+        print("按协商后下载大项目页的耗时排序（优先支持 PEP 691 JSON / gzip 的镜像）")
+        return rank_by_page_cost(probe_page_formats(candidates))
+    return rank_by_history(probe_mirrors_single_flight(mirrors))
+
+
+def apply_mirror(args, mirror_name, mirror_url, fallback_urls=(), explicit_indexes=()):
+    """
+    按命令行参数将镜像写入对应的配置（pip / uv / 多工具 / 批量虚拟环境）。
+    explicit_indexes 为 --heavy 选出的 uv 具名索引 [(name, url)]，只在 --uv 时写入。
+    返回成功写入的工具集合（用于后续 --tune），需要以非零状态退出时返回 None。
+    """
+    if args.all_venvs:
+        if not set_all_environments(args.all_venvs, mirror_url, fallback_urls):
+            return None
+        return set()
+    elif args.all_tools:
+        tools = set_all_tools(mirror_name, mirror_url, get_scope_args(args), fallback_urls, args.poetry)
+        return None if tools is None else tools & {'pip', 'uv'}
+    elif args.uv:
+        # 显式配置 uv
+        if not detect_uv_binary():
+            print("错误: 未检测到 uv，请先安装 uv (https://docs.astral.sh/uv/)")
+            return None
+        success, msg = update_uv_config(mirror_url, fallback_urls, explicit_indexes)
+        print(msg)
+        return {'uv'} if success else None
+
+    env = detect_environment()
+    if env == 'uvx' and not args.global_ and not args.user and not args.venv:
+        # uvx 环境：自动走 uv 配置路径
+        uv = detect_uv_binary()
+        if uv:
+            print("检测到 uvx 环境，自动配置 uv 镜像源...")
+            success, msg = update_uv_config(mirror_url, fallback_urls)
+            print(msg)
+            return {'uv'} if success else None
+        print("检测到 uvx 环境但未找到 uv 可执行文件，请手动配置")
+        return None
+
+    scope_args = get_scope_args(args)
+    tool = update_pip_config(mirror_url, scope_args, fallback_urls)
+    return {tool} if tool else set()
+
+
+def positive_int(value):
+    """argparse 类型：不小于 1 的整数（并发数、并行数等）。"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"无效的整数: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必须不小于 1: {value}")
+    return number
+
+
+def get_list_modes(args):
+    """返回 args 中选择的 list 专项测速方式，每次只能使用一种，且都不支持 --export / --conda。"""
+    return [flag for flag, enabled in (('--files', args.files), ('--warm', args.warm), ('--uv-python', args.uv_python),
+                                       ('--pytorch', args.pytorch), ('--routes', args.routes), ('--cache', args.cache),
+                                       ('--formats', args.formats), ('--scaling', args.scaling)) if enabled]
+
+
+def get_pypi_set_options(args):
+    """返回 args 中只用于设置 PyPI 镜像源的 set 选项，set --conda / --uv-python / --pytorch 不支持这些选项。"""
+    options = [flag for flag, enabled in (
+        ('--fallbacks', args.fallbacks), ('--tune', args.tune), ('--routes', args.routes),
+        ('--resolve-redirects', args.resolve_redirects), ('--heavy', args.heavy), ('--schedule', args.schedule),
+        ('--export', args.export), ('--poetry', args.poetry), ('--region', args.region), ('--tag', args.tag),
+    ) if enabled]
+    if args.rank_by != 'latency':
+        options.append('--rank-by')
+    return options
+
 
 def main():
     """主函数，解析命令行参数并执行相应操作"""
     parser = argparse.ArgumentParser(description="轻松管理 pip 镜像源。")
-    parser.add_argument("command", choices=["list", "set", "unset", "info", "update"], help="要执行的命令")
-    parser.add_argument("mirror", nargs="?", help="要设置的镜像源名称 (仅用于 'set' 命令)")
+    parser.add_argument("command", choices=["list", "set", "unset", "info", "update", "history", "verify", "sync"],
+                        help="要执行的命令")
+    parser.add_argument("mirror", nargs="?", help="要设置的镜像源名称 (用于 'set' 命令)，或要查看历史的镜像源 (用于 'history' 命令)")
+    parser.add_argument("--export", metavar="FILE", help="将测速结果导出为 JSON 文件 (用于 'list'/'set' 命令)")
+    parser.add_argument("--from-results", metavar="FILE_OR_URL",
+                        help="使用导出的测速结果选择镜像源，跳过本机测速 (仅用于 'set' 命令)")
+    parser.add_argument("--max-age", type=int, metavar="SECONDS",
+                        help="测速结果的最长有效期（秒），过期则重新测速 (配合 --from-results 使用)")
+    parser.add_argument("--fallbacks", type=int, default=0, metavar="N",
+                        help="按测速排名额外写入 N 个通过测速的备用镜像 (仅用于 'set' 命令)；"
+                             "uv 只在主镜像缺包时使用备用镜像，不能应对主镜像故障")
+    parser.add_argument("--files", action="store_true",
+                        help="单独测速各镜像实际提供包文件的主机 (仅用于 'list' 命令)")
+    parser.add_argument("--warm", action="store_true",
+                        help="分别测量冷连接与复用连接（热连接）的延迟 (仅用于 'list' 命令)")
+    parser.add_argument("--formats", action="store_true",
+                        help="检测各镜像对 PEP 691 JSON 与 gzip 的支持，并比较大项目页的传输量 (仅用于 'list' 命令)")
+    parser.add_argument("--routes", action="store_true",
+                        help="分别经直连和已配置的代理 (HTTP(S)_PROXY / pip proxy) 测速；"
+                             "用于 'set' 时同时写入所选镜像的最佳路由 (pip proxy)")
+    parser.add_argument("--cache", action="store_true",
+                        help="比较各镜像文件下载在 CDN 缓存命中与未命中时的延迟和吞吐 (仅用于 'list' 命令)")
+    parser.add_argument("--scaling", action="store_true",
+                        help="逐级提升并发下载数测试吞吐与限流 (仅用于 'list' 命令)")
+    parser.add_argument("--rank-by", choices=["latency", "warm", "throughput", "page", "miss"], default="latency",
+                        help="自动选择镜像时的排序依据: latency（延迟，默认）、warm（复用连接后的延迟）、"
+                             "throughput（指定并发下的吞吐）、page（按 pip/uv 协商方式下载大项目页的耗时）"
+                             "或 miss（冷门文件即 CDN 缓存未命中时的下载耗时）")
+    parser.add_argument("--region", metavar="REGION[,REGION]",
+                        help="只测速指定地区的镜像，如 east 或 east,cn (用于 'list' / 'set' 命令)")
+    parser.add_argument("--tag", metavar="TAG[,TAG]",
+                        help="只测速带有指定标签或能力的镜像，如 edu、cloud、json (用于 'list' / 'set' 命令)")
+    parser.add_argument("--concurrency", type=positive_int, default=max(SCALING_LEVELS), metavar="N",
+                        help=f"按吞吐排序时使用的并发下载数 (默认 {max(SCALING_LEVELS)})")
+    parser.add_argument("--pytorch", metavar="VARIANT",
+                        help="测速 / 设置 PyTorch wheel 索引镜像，VARIANT 如 cu121、cpu；"
+                             "pip 写入 extra-index-url (或 find-links)，配合 --uv 写入 uv 具名索引")
+    parser.add_argument("--heavy", metavar="NAME=PKG[,PKG]",
+                        help="为指定的包另外写入一个按吞吐选出的 uv 具名索引 (explicit)，如 heavy=torch,tensorflow,nvidia-*；"
+                             "默认索引仍按延迟选择 (仅用于 'set --uv')")
+    parser.add_argument("--resolve-redirects", action="store_true",
+                        help="写入镜像重定向后的最终地址（及对应 trusted-host），省去每次请求的额外跳转")
+    parser.add_argument("--schedule", action="store_true",
+                        help="按测速历史为每个小时选出最好的镜像，保存时段计划并给出每小时重新应用的定时任务 "
+                             "(仅用于 'set' 命令)")
+    parser.add_argument("--live", action="store_true",
+                        help="忽略按时段的测速历史，强制实时测速 (配合 'set --schedule' 使用)")
+    parser.add_argument("--trace", metavar="FILE",
+                        help=f"将各阶段耗时写入 Chrome trace 格式的时间线文件，也可通过环境变量 {tracing.TRACE_ENV} 指定")
+    parser.add_argument("-r", "--requirement", metavar="FILE",
+                        help="要解析 / 下载的 requirements 文件 (用于 'verify' / 'sync' 命令)")
+    parser.add_argument("--mirrors", metavar="NAME_OR_URL[,...]",
+                        help="参与对比的镜像名或地址，逗号分隔，默认全部 (用于 'verify' 命令)；"
+                             "用于 'sync' 时按顺序作为下载来源，默认取测速最快的几个")
+    parser.add_argument("--workers", type=positive_int, metavar="N",
+                        help=f"同时进行的解析 / 下载数 (verify 默认 {VERIFY_WORKERS}，sync 默认 {SYNC_WORKERS})")
+    parser.add_argument("--dest", metavar="DIR",
+                        help="本地静态镜像的目标目录 (用于 'sync' 命令)")
+    parser.add_argument("--register", metavar="NAME",
+                        help="同步完成后将本地镜像注册为 NAME，之后可 cnpip set NAME (用于 'sync' 命令)")
+    parser.add_argument("--serve-url", metavar="URL",
+                        help="注册为局域网 HTTP 镜像时的 simple 地址，默认注册为 file:// 目录 (配合 --register 使用)")
+    parser.add_argument("--scheduled", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--poetry", action="store_true",
+                        help="配合 --all-tools 使用：同时在当前目录 poetry 项目的 pyproject.toml 中写入镜像源")
+    parser.add_argument("--tune", action="store_true",
+                        help="测量所选镜像的延迟分布与吞吐，写入 pip timeout/retries 与 uv concurrent-downloads；"
+                             "配合 unset 时移除这些网络参数")
 
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--global", dest="global_", action="store_true", help="设置全局系统配置")
     group.add_argument("--user", action="store_true", help="设置当前用户配置")
     group.add_argument("--venv", "--site", dest="venv", action="store_true", help="设置当前虚拟环境配置")
-    group.add_argument("--uv", dest="uv", action="store_true", help="配置 uv 镜像源 (写入 uv.toml，不修改 pip)")
+    group.add_argument("--uv", dest="uv", action="store_true", help="配置 uv 镜像源 (写入 uv.toml，不修改 pip)；用于 verify 时改用 uv 解析")
+    group.add_argument("--conda", action="store_true", help="测速 / 配置 conda 镜像源 (写入 .condarc)")
+    group.add_argument("--uv-python", action="store_true",
+                       help="测速 / 配置 uv python install 使用的 Python 安装镜像 (写入 uv.toml 的 python-install-mirror)")
+    group.add_argument("--all-tools", action="store_true",
+                       help="一次测速，同时配置 pip、uv、conda、pdm，配合 --poetry 时还写入当前 poetry 项目 (仅用于 'set' 命令)")
+    group.add_argument("--all-venvs", metavar="ROOT",
+                       help="为 ROOT 下发现的所有虚拟环境 / conda 环境写入 site 级 pip 配置；配合 unset 时移除其中的镜像源")
 
     args = parser.parse_args()
 
-    if args.command == "list":
-        list_mirrors()
+    trace_path = args.trace or os.environ.get(tracing.TRACE_ENV)
+    if trace_path:
+        tracing.start_tracing(trace_path, [sys.modules[__name__], mirrors_module], exclude=('main',))
+
+    if args.command != "update":
+        # 用户镜像列表过期时在后台刷新，下次运行生效
+        refresh_mirrors_in_background()
+
+    candidates = get_candidate_mirrors(args)
+    if candidates is not None:
+        if not candidates:
+            print("错误: 没有符合 --region / --tag 条件的镜像源")
+            sys.exit(1)
+        print(f"按条件筛选出 {len(candidates)}/{len(MIRRORS)} 个镜像源: {', '.join(candidates)}")
+    probe_targets = get_automatic_mirrors() if candidates is None else candidates
+
+    list_modes = get_list_modes(args) if args.command == "list" else []
+    set_targets = [flag for flag, enabled in (('--conda', args.conda), ('--uv-python', args.uv_python),
+                                              ('--pytorch', args.pytorch)) if enabled] if args.command == "set" else []
+
+    if len(list_modes) > 1:
+        print(f"错误: {'、'.join(list_modes)} 不能同时使用，每次 list 只能选择一种测速方式")
+        sys.exit(1)
+    elif list_modes and (args.export or args.conda):
+        # 这些测速方式的结果没有导出格式，也只针对 PyPI 镜像（--pytorch / --uv-python 除外）
+        print(f"错误: {'--export' if args.export else '--conda'} 不能与 {list_modes[0]} 同时使用")
+        sys.exit(1)
+    elif args.command == "list" and args.files:
+        list_file_hosts(probe_targets)
+    elif args.command == "list" and args.warm:
+        probe_warm_latency(probe_targets)
+    elif args.command == "list" and args.uv_python:
+        probe_python_mirrors()
+    elif args.command == "list" and args.pytorch:
+        probe_vendor_mirrors('pytorch', args.pytorch)
+    elif args.command == "list" and args.routes:
+        probe_routes(probe_targets)
+    elif args.command == "list" and args.cache:
+        probe_cache_behaviour(probe_targets)
+    elif args.command == "list" and args.formats:
+        probe_page_formats(probe_targets)
+    elif args.command == "list" and args.scaling:
+        probe_concurrency_scaling(probe_targets, args.concurrency)
+    elif args.command == "list":
+        results = list_conda_mirrors() if args.conda else list_mirrors(candidates)
+        if not args.conda:
+            report_redirects(results)
+        if args.export:
+            success, msg = export_probe_results(results, args.export, 'conda' if args.conda else 'pypi')
+            print(msg)
+            if not success:
+                sys.exit(1)
+    elif args.command == "set" and args.from_results and (args.mirror or args.conda or args.uv_python or args.pytorch):
+        # 导出的结果只用于自动选择 PyPI 镜像源，指定了镜像名或其他镜像种类时无从使用
+        print("错误: --from-results 用于自动选择 PyPI 镜像源，不能与镜像源名称、--conda、--uv-python 或 --pytorch 同时使用")
+        sys.exit(1)
+    elif len(set_targets) > 1:
+        print(f"错误: {'、'.join(set_targets)} 不能同时使用，每次 set 只能配置一种镜像")
+        sys.exit(1)
+    elif set_targets and get_pypi_set_options(args):
+        print(f"错误: {'、'.join(get_pypi_set_options(args))} 只用于设置 PyPI 镜像源，不能与 {set_targets[0]} 同时使用")
+        sys.exit(1)
+    elif args.command == "set" and args.conda:
+        if not set_conda_mirror(args.mirror):
+            sys.exit(1)
+    elif args.command == "set" and args.uv_python:
+        if not set_uv_python_mirror(args.mirror):
+            sys.exit(1)
+    elif args.command == "set" and args.pytorch:
+        if not set_vendor_index('pytorch', args.pytorch, args.mirror, 'uv' if args.uv else 'pip',
+                                get_scope_args(args)):
+            sys.exit(1)
     elif args.command == "set":
+        if args.export and args.rank_by != 'latency':
+            # 导出文件记录的是延迟，供 set --from-results 按延迟选择镜像
+            print(f"错误: --export 只导出延迟测速结果，不能与 --rank-by {args.rank_by} 同时使用")
+            sys.exit(1)
+        if args.poetry and not args.all_tools:
+            print("错误: --poetry 需要与 --all-tools 同时使用")
+            sys.exit(1)
+        heavy_spec = None
+        if args.heavy:
+            if not args.uv:
+                # --all-venvs / --all-tools 写入的配置不支持具名索引
+                print("错误: --heavy 写入 uv 的具名索引，需要同时指定 --uv（不能用于 pip、--all-venvs 或 --all-tools）")
+                sys.exit(1)
+            try:
+                heavy_spec = parse_heavy_spec(args.heavy)
+            except ValueError as e:
+                print(f"错误: {e}")
+                sys.exit(1)
+
         # 解析镜像名（set/unset 共用）
+        results = None
+        route_results = None
+        probed = False      # 本次是否实时测速（只有这时才联网检测文件主机）
         if args.mirror is None:
-            print("未指定镜像源，即将测速并选择最快的镜像源...")
-            results = list_mirrors()
-            fastest_mirror = next((name for name, speed, url, error in results if error is None), None)
+            if args.from_results:
+                results, error = load_probe_results(args.from_results, args.max_age)
+                if results is None:
+                    print(f"警告: {error}，改为本机测速")
+                else:
+                    print(f"使用 {args.from_results} 中的测速结果选择镜像源")
+            if args.schedule:
+                install_schedule(args, candidates)
+            if results is None and args.routes:
+                route_results = probe_routes(probe_targets)
+                results = rank_by_route(route_results)
+                probed = True
+            if results is None and args.schedule and args.rank_by == 'latency' and not args.live:
+                hour = time.localtime().tm_hour
+                if not history_is_recent(candidates):
+                    print("最近一天没有测速记录，实时测速以更新历史")
+                else:
+                    results = rank_from_hourly_history(hour, candidates)
+                    if results is not None:
+                        print(f"{hour:02d} 时段已有足够的测速历史，按历史评分选择镜像源（--live 可强制实时测速）")
+            if results is None:
+                print("未指定镜像源，即将测速并选择最快的镜像源...")
+                results = probe_ranked_mirrors(args, candidates)
+                probed = True
+                if args.export:
+                    success, msg = export_probe_results(results, args.export)
+                    print(msg)
+            fastest_mirror = select_fastest_mirror(results)
             if fastest_mirror is None:
                 print("错误: 无法连接到任何镜像源")
                 sys.exit(1)
             mirror_name = fastest_mirror
             print(f"自动选择最快的镜像源: {mirror_name}")
         else:
+            if args.schedule:
+                print("错误: --schedule 按时段自动选择镜像源，不能同时指定镜像源名称")
+                sys.exit(1)
             mirror_name = args.mirror
 
         if mirror_name not in MIRRORS:
@@ -707,43 +4435,116 @@ def main():
 
         mirror_url = MIRRORS[mirror_name]
 
-        if args.uv:
-            # 显式配置 uv
-            if not detect_uv_binary():
-                print("错误: 未检测到 uv，请先安装 uv (https://docs.astral.sh/uv/)")
+        fallback_urls = []
+        if args.fallbacks > 0:
+            if results is None:
+                print("正在测速以选择备用镜像源...")
+                results = probe_ranked_mirrors(args, candidates)
+            fallback_names = select_fallback_mirrors(results, mirror_name, args.fallbacks)
+            fallback_urls = [MIRRORS[name] for name in fallback_names]
+            print(f"备用镜像源: {', '.join(fallback_names) or '无（没有其他通过测速的镜像）'}")
+
+        if args.resolve_redirects:
+            traces = get_redirect_traces([mirror_url] + fallback_urls)
+            resolved = [url if traces[url]['error'] is not None else traces[url]['final_url']
+                        for url in [mirror_url] + fallback_urls]
+            for original, final in zip([mirror_url] + fallback_urls, resolved):
+                if original != final:
+                    print(f"使用重定向后的最终地址: {original} -> {final}")
+            mirror_url, fallback_urls = resolved[0], resolved[1:]
+
+        if probed and not args.uv:
+            # 包文件由其他主机提供时，trusted-host 需要同时覆盖该主机；
+            # 指定镜像名或 --from-results 时不联网，只使用 list --files 或之前测速留下的缓存
+            discover_file_hosts([mirror_url] + fallback_urls)
+
+        explicit_indexes = []
+        if heavy_spec is not None:
+            index_name, heavy_packages = heavy_spec
+            print(f"\n正在按吞吐测速，为 {', '.join(heavy_packages)} 选择镜像...")
+            heavy_mirror = select_fastest_mirror(rank_by_throughput(
+                probe_concurrency_scaling(probe_targets, args.concurrency), args.concurrency))
+            if heavy_mirror is None:
+                print("警告: 吞吐测速没有成功的镜像，不写入具名索引")
+            elif heavy_mirror == mirror_name:
+                print(f"吞吐最高的镜像同样是 {mirror_name}，无需单独的具名索引")
+            else:
+                print(f"吞吐最高的镜像: {heavy_mirror}，写入具名索引 {index_name}")
+                explicit_indexes = [(index_name, MIRRORS[heavy_mirror])]
+
+        tools = apply_mirror(args, mirror_name, mirror_url, fallback_urls, explicit_indexes)
+        if tools is None:
+            sys.exit(1)
+        if explicit_indexes:
+            print_uv_sources_guidance(*heavy_spec)
+        if args.routes:
+            if route_results is None or best_route(route_results, mirror_name) is None:
+                route_results = probe_routes({mirror_name: MIRRORS[mirror_name]})
+            chosen_route = best_route(route_results, mirror_name)
+            if chosen_route is None:
+                print(f"警告: 镜像 {mirror_name} 经所有路由都无法访问，未写入代理设置")
+            elif not apply_route(mirror_name, mirror_url, chosen_route['route'], tools, get_scope_args(args)):
                 sys.exit(1)
-            success, msg = update_uv_config(mirror_url)
-            print(msg)
-            if not success:
+        if args.tune:
+            if not tools:
+                print("未写入任何 pip / uv 配置，跳过网络参数调优")
+            elif not tune_network_settings(mirror_name, mirror_url, tools, get_scope_args(args)):
                 sys.exit(1)
-        else:
-            env = detect_environment()
-            if env == 'uvx' and not args.global_ and not args.user and not args.venv:
-                # uvx 环境：自动走 uv 配置路径
-                uv = detect_uv_binary()
-                if uv:
-                    print("检测到 uvx 环境，自动配置 uv 镜像源...")
-                    success, msg = update_uv_config(mirror_url)
-                    print(msg)
-                    if not success:
-                        sys.exit(1)
-                else:
-                    print("检测到 uvx 环境但未找到 uv 可执行文件，请手动配置")
-                    sys.exit(1)
-            else:
-                scope_args = get_scope_args(args)
-                update_pip_config(mirror_url, scope_args)
     elif args.command == "unset":
-        if args.uv:
+        if args.all_tools:
+            print("错误: unset 不支持 --all-tools，请分别对各工具执行 unset（如 cnpip unset、cnpip unset --uv）")
+            sys.exit(1)
+        elif args.all_venvs:
+            if args.tune or args.pytorch:
+                print("错误: --all-venvs 只移除各环境的镜像源配置，不能与 --tune 或 --pytorch 同时使用")
+                sys.exit(1)
+            sys.exit(0 if unset_all_environments(args.all_venvs) else 1)
+        elif args.tune:
+            # 只移除 set --tune 写入的网络参数，镜像源配置保持不变
+            if args.uv:
+                success, msg = unset_uv_settings(TUNED_UV_KEYS)
+            else:
+                success, msg = unset_pip_settings(TUNED_PIP_KEYS, get_scope_args(args))
+            print(msg)
+            sys.exit(0 if success else 1)
+        elif args.pytorch:
+            success, msg = unset_vendor_index('pytorch', 'uv' if args.uv else 'pip', get_scope_args(args))
+            print(msg)
+            sys.exit(0 if success else 1)
+        elif args.uv:
             success, msg = unset_uv_config()
             print(msg)
             sys.exit(0 if success else 1)
+        elif args.conda:
+            success, msg = unset_condarc()
+            print(msg)
+            sys.exit(0 if success else 1)
+        elif args.uv_python:
+            success, msg = unset_uv_python_mirror()
+            print(msg)
+            sys.exit(0 if success else 1)
         else:
             scope_args = get_scope_args(args)
             unset_pip_mirror(scope_args)
             sys.exit(0)
     elif args.command == "info":
         show_info()
+    elif args.command == "history":
+        show_history(args.mirror)
+    elif args.command == "verify":
+        if not args.requirement or not os.path.isfile(args.requirement):
+            print("错误: 请通过 -r 指定存在的 requirements 文件")
+            sys.exit(1)
+        mirrors, error = parse_verify_mirrors(args.mirrors, candidates)
+        if error:
+            print(f"错误: {error}")
+            sys.exit(1)
+        results = verify_mirrors(mirrors, args.requirement, 'uv' if args.uv else 'pip',
+                                 args.workers or VERIFY_WORKERS)
+        sys.exit(0 if any(r['error'] is None for r in results) else 1)
+    elif args.command == "sync":
+        if not sync_command(args, probe_targets):
+            sys.exit(1)
     elif args.command == "update":
         print("正在从远程获取最新的镜像源列表...")
         success, msg = update_mirrors_from_remote()
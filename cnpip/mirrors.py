@@ -1,9 +1,14 @@
 import json
 import os
+import sys
+import time
+import uuid
+import subprocess
 import urllib.request
 import urllib.error
 import socket
 from pathlib import Path
+from urllib.parse import urlparse
 
 # 硬编码作为后备
 DEFAULT_MIRRORS = {
@@ -17,65 +22,330 @@ DEFAULT_MIRRORS = {
     "default": "https://pypi.org/simple"
 }
 
-REMOTE_MIRRORS_URL = "https://raw.githubusercontent.com/caoergou/cnpip/main/cnpip/mirrors.json"
+# Anaconda 镜像根地址（其下为 pkgs/main、cloud/conda-forge 等）
+# 与 PyPI 镜像同属一个站点的使用相同的名称，便于 --all-tools 对应
+CONDA_MIRRORS = {
+    "tuna": "https://mirrors.tuna.tsinghua.edu.cn/anaconda",
+    "aliyun": "https://mirrors.aliyun.com/anaconda",
+    "sustech": "https://mirrors.sustech.edu.cn/anaconda",
+    "bfsu": "https://mirrors.bfsu.edu.cn/anaconda",
+    "nju": "https://mirror.nju.edu.cn/anaconda",
+    "zju": "https://mirrors.zju.edu.cn/anaconda",
+}
+
+# 厂商 wheel 索引（如 PyTorch 的 CUDA wheel）的镜像，与 PyPI 镜像分开维护
+# url 中的 {variant} 替换为具体的变体（如 cu121、cpu、rocm6.0）；
+# format 为 simple（PEP 503 索引）或 flat（只有文件列表的目录，对应 pip 的 --find-links）
+VENDOR_INDEX_MIRRORS = {
+    "pytorch": {
+        "probe_project": "torch",       # 用于吞吐测速的项目
+        "packages": ["torch", "torchvision", "torchaudio"],
+        "mirrors": {
+            "official": {"url": "https://download.pytorch.org/whl/{variant}", "format": "simple"},
+            "nju": {"url": "https://mirror.nju.edu.cn/pytorch/whl/{variant}", "format": "simple"},
+            "aliyun": {"url": "https://mirrors.aliyun.com/pytorch-wheels/{variant}/", "format": "flat"},
+            "sjtu": {"url": "https://mirror.sjtu.edu.cn/pytorch-wheels/{variant}/", "format": "flat"},
+        },
+    },
+}
+
+# uv python install 下载的 python-build-standalone 发布文件的镜像，
+# 地址替换 GitHub releases/download 前缀，写入 uv 的 python-install-mirror
+PYTHON_INSTALL_MIRRORS = {
+    "github": "https://github.com/astral-sh/python-build-standalone/releases/download",
+    "nju": "https://mirror.nju.edu.cn/github-release/indygreg/python-build-standalone",
+    "npmmirror": "https://registry.npmmirror.com/-/binary/python-build-standalone",
+}
+
+# 扩展格式的镜像列表发布在 mirrors.v2.json；mirrors.json 保持旧的 {名称: 地址} 格式，
+# 供只认识旧格式的已安装版本（1.4.0 及更早）执行 cnpip update
+REMOTE_MIRRORS_URL = "https://raw.githubusercontent.com/caoergou/cnpip/main/cnpip/mirrors.v2.json"
 USER_CONFIG_DIR = Path.home() / ".cnpip"
 USER_MIRRORS_FILE = USER_CONFIG_DIR / "mirrors.json"
+# 记录远程镜像列表的 ETag / Last-Modified 与上次检查时间，用于条件请求和自动刷新
+REGISTRY_META_FILE = USER_CONFIG_DIR / "mirrors.meta.json"
+REGISTRY_TTL = 7 * 24 * 3600
+# cnpip sync 生成的本地镜像，独立于镜像列表保存，update 时不会被覆盖
+LOCAL_MIRRORS_FILE = USER_CONFIG_DIR / "local_mirrors.json"
+# 本地镜像只包含同步过的包，不参与自动选择，需 cnpip set <name> 或 --tag local 显式选用
+LOCAL_MIRROR_TAG = "local"
+LOCAL_MIRROR_DEFAULTS = {"region": "local", "tags": [LOCAL_MIRROR_TAG], "priority": 0}
+# 设置该环境变量后不再在后台自动刷新镜像列表
+NO_AUTO_UPDATE_ENV = "CNPIP_NO_AUTO_UPDATE"
+
+
+def atomic_write_text(path, content):
+    """
+    原子地写入文本文件：先写入同目录下的临时文件，再用 os.replace 替换目标文件。
+    并发写入时读者只会看到旧文件或新文件，不会看到写了一半的内容。
+    目标文件已存在时保留其权限位；目标是符号链接时写入链接指向的真实文件，链接本身保持不变。
+    """
+    path = Path(os.path.realpath(str(path)))
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    fd = os.open(str(tmp_path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        if path.exists():
+            os.chmod(str(tmp_path), path.stat().st_mode & 0o7777)
+        os.replace(str(tmp_path), str(path))
+    except BaseException:
+        try:
+            os.remove(str(tmp_path))
+        except OSError:
+            pass
+        raise
+
 
 def get_local_mirrors_file():
-    """返回打包的 mirrors.json 路径"""
+    """返回打包的 mirrors.json 路径（旧格式）"""
     return os.path.join(os.path.dirname(__file__), 'mirrors.json')
 
-def load_mirrors():
+
+def get_local_registry_file():
+    """返回打包的 mirrors.v2.json 路径（扩展格式）"""
+    return os.path.join(os.path.dirname(__file__), 'mirrors.v2.json')
+
+# 扩展格式中每个镜像可附带的元数据及默认值（priority 越小越优先）
+MIRROR_DEFAULTS = {
+    "region": None,         # 地区，如 north / east / south，全国 CDN 为 cn，境外为 global，本地镜像为 local
+    "isp": None,            # 网络，如 cernet（教育网）、cdn
+    "file_host": None,      # 包文件由其他主机提供时的主机名
+    "capabilities": [],     # 协议能力，如 json（PEP 691）、gzip
+    "tags": [],
+    "priority": 100,
+}
+
+
+def _is_mirror_url(url, allow_file=False):
+    if not isinstance(url, str):
+        return False
+    parsed = urlparse(url)
+    if allow_file and parsed.scheme == 'file':
+        return bool(parsed.path)
+    return parsed.scheme in ('http', 'https') and bool(parsed.netloc)
+
+
+def normalize_mirror_entry(entry, allow_file=False):
+    """
+    将镜像条目统一为扩展格式的字典。
+    旧格式的条目是地址字符串，扩展格式为包含 url 及元数据的对象；格式无效时返回 None。
+    allow_file 为 True 时还接受 file:// 地址（仅用于本地镜像）。
+    """
+    if isinstance(entry, str):
+        entry = {"url": entry}
+    if not isinstance(entry, dict):
+        return None
+    url = entry.get("url")
+    if not _is_mirror_url(url, allow_file):
+        return None
+    normalized = {key: entry.get(key, default) for key, default in MIRROR_DEFAULTS.items()}
+    normalized["url"] = url
+    if not isinstance(normalized["capabilities"], list) or not isinstance(normalized["tags"], list):
+        return None
+    if not isinstance(normalized["priority"], (int, float)) or isinstance(normalized["priority"], bool):
+        return None
+    return normalized
+
+
+def validate_mirrors(data):
+    """
+    校验镜像列表：必须是非空的 JSON 对象，值为 http(s) 地址（旧格式）或包含 url 的对象（扩展格式）。
+    返回错误描述，合法时返回 None。
+    """
+    if not isinstance(data, dict) or not data:
+        return "镜像列表必须是非空的 JSON 对象"
+    for name, entry in data.items():
+        if not isinstance(name, str) or not name:
+            return f"无效的镜像名称: {name!r}"
+        if normalize_mirror_entry(entry) is None:
+            return f"镜像 {name} 的条目无效: {entry!r}"
+    return None
+
+
+def _read_registry_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if validate_mirrors(data) is not None:
+        return None
+    return {name: normalize_mirror_entry(entry) for name, entry in data.items()}
+
+
+def load_local_mirrors():
+    """读取 cnpip sync 注册的本地镜像 {name: entry}，文件不存在或无效时返回空字典。"""
+    try:
+        with open(LOCAL_MIRRORS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    local = {}
+    for name, entry in data.items():
+        normalized = normalize_mirror_entry(entry, allow_file=True)
+        if isinstance(name, str) and name and normalized is not None:
+            local[name] = normalized
+    return local
+
+
+def register_local_mirror(name, url):
+    """
+    将本地镜像（file:// 目录或局域网 http(s) 地址）写入 ~/.cnpip/local_mirrors.json，
+    之后 load_mirrors() 会包含该镜像，可直接 cnpip set <name>。返回 (success, message)。
+    """
+    entry = dict(LOCAL_MIRROR_DEFAULTS, url=url)
+    if normalize_mirror_entry(entry, allow_file=True) is None:
+        return False, f"无效的本地镜像地址: {url}"
+    try:
+        with open(LOCAL_MIRRORS_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict):
+            data = {}
+    except (OSError, ValueError):
+        data = {}
+    data[name] = entry
+    try:
+        LOCAL_MIRRORS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(LOCAL_MIRRORS_FILE, json.dumps(data, indent=2, ensure_ascii=False) + '\n')
+    except OSError as e:
+        return False, f"注册本地镜像失败: {e}"
+    return True, f"已注册本地镜像 {name}: {url}（cnpip set {name} 即可使用）"
+
+
+def load_mirror_registry():
     """
-    按优先级加载镜像源：
+    按优先级加载带元数据的镜像列表 {name: entry}：
     1. 用户自定义配置 (~/.cnpip/mirrors.json)
-    2. 包内自带配置 (cnpip/mirrors.json)
+    2. 包内自带配置 (cnpip/mirrors.v2.json，其次 cnpip/mirrors.json)
     3. 硬编码后备
+    cnpip sync 注册的本地镜像 (~/.cnpip/local_mirrors.json) 总是合并在上述列表之上。
     """
+    registry = _load_base_registry()
+    registry.update(load_local_mirrors())
+    return registry
+
+
+def _load_base_registry():
     # 1. 用户配置
     if USER_MIRRORS_FILE.exists():
         try:
-            with open(USER_MIRRORS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            registry = _read_registry_file(USER_MIRRORS_FILE)
+            if registry is not None:
+                return registry
         except Exception:
             pass # 失败则后备
 
-    # 2. 包内配置
-    pkg_file = get_local_mirrors_file()
-    if os.path.exists(pkg_file):
-        try:
-            with open(pkg_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            pass
+    # 2. 包内配置（优先扩展格式）
+    for pkg_file in (get_local_registry_file(), get_local_mirrors_file()):
+        if os.path.exists(pkg_file):
+            try:
+                registry = _read_registry_file(pkg_file)
+                if registry is not None:
+                    return registry
+            except Exception:
+                pass
 
     # 3. 硬编码
-    return DEFAULT_MIRRORS.copy()
+    return {name: normalize_mirror_entry(url) for name, url in DEFAULT_MIRRORS.items()}
+
+
+def load_mirrors():
+    """按 load_mirror_registry 的优先级加载镜像源，返回 {name: url}。"""
+    return {name: entry["url"] for name, entry in load_mirror_registry().items()}
+
+
+# 全国 CDN 镜像的地区，按地区筛选国内镜像（north / east 等）时也会包含这些镜像
+NATIONWIDE_REGION = "cn"
+NON_DOMESTIC_REGIONS = ("global", "local")
+
+
+def region_matches(region, regions):
+    """镜像地区 region 是否匹配筛选列表 regions；全国 CDN（cn）匹配任意国内地区。"""
+    if region in regions:
+        return True
+    return region == NATIONWIDE_REGION and any(r not in NON_DOMESTIC_REGIONS for r in regions)
+
+
+def filter_mirrors(registry, regions=None, tags=None):
+    """
+    按地区和标签筛选镜像，返回 {name: url}。
+    regions / tags 为可选的名称列表，分别匹配任意一个即可；tags 同时匹配 tags 和 capabilities。
+    地区为 cn 的全国 CDN 镜像覆盖所有国内地区，筛选任意国内地区时都会保留。
+    两个条件都给出时需同时满足。
+    """
+    selected = {}
+    for name, entry in registry.items():
+        if regions and not region_matches(entry["region"], regions):
+            continue
+        if tags and not set(tags) & set(entry["tags"] + entry["capabilities"]):
+            continue
+        selected[name] = entry["url"]
+    return selected
+
+
+def load_registry_meta():
+    """读取 {'etag', 'last_modified', 'checked'}，不存在或损坏时返回空字典。"""
+    try:
+        with open(REGISTRY_META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return meta if isinstance(meta, dict) else {}
+    except Exception:
+        return {}
+
+
+def save_registry_meta(meta):
+    try:
+        USER_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(REGISTRY_META_FILE, json.dumps(meta, indent=4, ensure_ascii=False))
+    except OSError:
+        pass
+
 
 def update_mirrors_from_remote():
     """
     从远程 URL 获取镜像源并保存到用户配置文件。
+    已有本地列表时携带 If-None-Match / If-Modified-Since，列表未变化时只需一次 304 响应；
+    新列表通过校验后才原子地替换本地文件。
     返回 (success, message/error)。
     """
+    meta = load_registry_meta()
+    headers = {}
+    if USER_MIRRORS_FILE.exists():
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
     try:
+        req = urllib.request.Request(REMOTE_MIRRORS_URL, headers=headers)
         # 5秒超时
-        with urllib.request.urlopen(REMOTE_MIRRORS_URL, timeout=5) as response:
-            if response.status == 200:
+        with urllib.request.urlopen(req, timeout=5) as response:
+            if response.status != 200:
+                return False, f"获取失败: HTTP {response.status}"
+            try:
                 data = json.loads(response.read().decode('utf-8'))
+            except ValueError:
+                return False, "远程 JSON 格式无效"
+            error = validate_mirrors(data)
+            if error:
+                return False, f"远程镜像列表校验失败: {error}"
 
-                # 验证：简单检查是否为字典
-                if not isinstance(data, dict):
-                    return False, "远程 JSON 格式无效"
-
-                # 确保目录存在
-                USER_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-
-                with open(USER_MIRRORS_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(data, f, indent=4, ensure_ascii=False)
-
-                return True, f"成功从 {REMOTE_MIRRORS_URL} 更新镜像源"
-            else:
-                return False, f"获取失败: HTTP {response.status}"
+            # 确保目录存在
+            USER_CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(USER_MIRRORS_FILE, json.dumps(data, indent=4, ensure_ascii=False))
+            save_registry_meta({
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked': time.time(),
+            })
+            return True, f"成功从 {REMOTE_MIRRORS_URL} 更新镜像源"
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            meta['checked'] = time.time()
+            save_registry_meta(meta)
+            return True, "镜像源列表未变化，无需更新"
+        return False, f"获取失败: HTTP {e.code}"
     except urllib.error.URLError as e:
         return False, f"网络错误: {e.reason}"
     except socket.timeout:
@@ -83,6 +353,43 @@ def update_mirrors_from_remote():
     except Exception as e:
         return False, f"错误: {e}"
 
+
+def registry_is_stale(ttl=REGISTRY_TTL):
+    """
+    超过 ttl 未检查镜像列表更新时返回 True，检查时间以 REGISTRY_META_FILE 中的 checked 为准。
+    没有检查记录时：已有用户列表 (~/.cnpip/mirrors.json) 按其修改时间判断，
+    从未获取过用户列表则视为过期，使首次运行也会在后台获取一次。
+    """
+    checked = load_registry_meta().get('checked')
+    if not isinstance(checked, (int, float)):
+        try:
+            checked = USER_MIRRORS_FILE.stat().st_mtime
+        except OSError:
+            return True
+    return time.time() - checked > ttl
+
+
+def refresh_mirrors_in_background():
+    """
+    镜像列表过期时启动独立的后台进程执行条件更新，不阻塞当前命令；本次运行仍使用现有列表。
+    启动前先记录检查时间，避免并发运行的多个 cnpip 重复刷新。返回是否启动了刷新。
+    """
+    if os.environ.get(NO_AUTO_UPDATE_ENV) or not registry_is_stale():
+        return False
+    meta = load_registry_meta()
+    meta['checked'] = time.time()
+    save_registry_meta(meta)
+    try:
+        subprocess.Popen(
+            [sys.executable, '-c', 'from cnpip.mirrors import update_mirrors_from_remote; update_mirrors_from_remote()'],
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+    except OSError:
+        return False
+    return True
+
 # 初始化 MIRRORS 以兼容旧代码
 # 但建议调用者直接使用 load_mirrors()
-MIRRORS = load_mirrors()
+MIRROR_REGISTRY = load_mirror_registry()
+MIRRORS = {name: entry["url"] for name, entry in MIRROR_REGISTRY.items()}
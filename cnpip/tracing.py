@@ -0,0 +1,171 @@
+"""
+轻量级性能跟踪：启用后为 cnpip 的各个函数和 pip/uv 子进程记录耗时区间，
+退出时写出 Chrome trace event 格式的时间线（可在 chrome://tracing 或 ui.perfetto.dev 打开），
+每个线程（如测速线程池中的各个线程）对应一条轨道。
+
+未启用时不安装任何包装函数，对正常运行没有额外开销。
+"""
+import atexit
+import functools
+import inspect
+import json
+import os
+import subprocess
+import threading
+import time
+
+# 导入 cnpip 的时间点，用于在时间线中显示导入阶段
+_IMPORT_START = time.perf_counter()
+
+from .mirrors import atomic_write_text  # noqa: E402
+
+TRACE_ENV = "CNPIP_TRACE"
+
+_tracer = None
+
+
+class Tracer:
+    """收集 complete 事件（ph=X），时间戳为相对跟踪起点的微秒数。"""
+
+    def __init__(self, path, origin=None):
+        self.path = path
+        self.origin = time.perf_counter() if origin is None else origin
+        self.pid = os.getpid()
+        self.events = []
+        self.thread_names = {}
+        self.lock = threading.Lock()
+        self.patched = []       # (namespace, name, original)，停止时还原
+
+    def add(self, name, cat, start, end, args=None):
+        thread = threading.current_thread()
+        event = {
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': round((start - self.origin) * 1e6, 3),
+            'dur': round((end - start) * 1e6, 3),
+            'pid': self.pid,
+            'tid': thread.ident,
+        }
+        if args:
+            event['args'] = args
+        with self.lock:
+            self.events.append(event)
+            self.thread_names[thread.ident] = thread.name
+
+    def to_json(self):
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid, 'tid': 0, 'args': {'name': 'cnpip'}}]
+        metadata += [{'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid, 'args': {'name': name}}
+                     for tid, name in self.thread_names.items()]
+        return json.dumps({'traceEvents': metadata + self.events, 'displayTimeUnit': 'ms'}, ensure_ascii=False)
+
+
+def _describe_args(args):
+    """将函数的字符串参数（如镜像名、地址）记录到事件中，便于在时间线上区分各次调用。"""
+    described = [arg for arg in args if isinstance(arg, (str, os.PathLike))][:3]
+    return {'args': [str(arg)[:200] for arg in described]} if described else None
+
+
+def traced(func, name=None, cat='cnpip'):
+    """返回记录 func 每次调用耗时的包装函数；跟踪停止后包装函数直接调用 func。"""
+    label = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            tracer.add(label, cat, start, time.perf_counter(), _describe_args(args))
+
+    return wrapper
+
+
+class span:
+    """手动标记的耗时区间：with span('name'): ...；未启用跟踪时不记录。"""
+
+    def __init__(self, name, cat='cnpip', **args):
+        self.name, self.cat, self.args = name, cat, args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        tracer = _tracer
+        if tracer is not None:
+            tracer.add(self.name, self.cat, self.start, time.perf_counter(), self.args or None)
+
+
+def _patch(tracer, namespace, name, replacement):
+    tracer.patched.append((namespace, name, getattr(namespace, name)))
+    setattr(namespace, name, replacement)
+
+
+def instrument(tracer, module, exclude=()):
+    """为 module 中定义于 cnpip 包内的所有函数安装跟踪包装（按名称替换模块全局变量）。"""
+    for name, obj in list(vars(module).items()):
+        if name in exclude or not inspect.isfunction(obj):
+            continue
+        defined_here = obj.__module__ == module.__name__
+        if not (defined_here or (obj.__module__ or '').startswith('cnpip')) or obj.__module__ == __name__:
+            continue
+        _patch(tracer, module, name, traced(obj, f"{obj.__module__.split('.')[-1]}.{name}"))
+
+
+def _traced_subprocess_run(original):
+    @functools.wraps(original)
+    def run(args, *rest, **kwargs):
+        tracer = _tracer
+        start = time.perf_counter()
+        try:
+            return original(args, *rest, **kwargs)
+        finally:
+            if tracer is not None:
+                command = ' '.join(str(a) for a in args) if isinstance(args, (list, tuple)) else str(args)
+                tracer.add('subprocess', 'subprocess', start, time.perf_counter(), {'command': command[:500]})
+    return run
+
+
+def start_tracing(path, modules, exclude=()):
+    """
+    开始跟踪：为 modules 中的函数与 subprocess.run 安装包装，并在进程退出时写出时间线。
+    时间线从导入 cnpip 开始，导入阶段显示为 import 区间。重复调用时忽略。
+    """
+    global _tracer
+    if _tracer is not None:
+        return _tracer
+    tracer = Tracer(path, origin=_IMPORT_START)
+    tracer.add('import', 'cnpip', _IMPORT_START, time.perf_counter())
+    for module in modules:
+        instrument(tracer, module, exclude)
+    _patch(tracer, subprocess, 'run', _traced_subprocess_run(subprocess.run))
+    tracer.started = time.perf_counter()
+    _tracer = tracer
+    atexit.register(stop_tracing)
+    return tracer
+
+
+def stop_tracing():
+    """
+    停止跟踪：还原所有包装，记录整个运行区间并写出时间线文件。
+    返回写出的路径，未在跟踪或写入失败时返回 None。
+    """
+    global _tracer
+    tracer = _tracer
+    if tracer is None:
+        return None
+    _tracer = None
+    tracer.add('main', 'cnpip', tracer.started, time.perf_counter())
+    for namespace, name, original in reversed(tracer.patched):
+        setattr(namespace, name, original)
+    try:
+        atomic_write_text(tracer.path, tracer.to_json())
+    except OSError as e:
+        print(f"写入性能跟踪失败: {e}")
+        return None
+    print(f"性能跟踪已写入 {tracer.path}（可在 chrome://tracing 或 https://ui.perfetto.dev 打开）")
+    return tracer.path
@@ -30,3 +30,46 @@ def fake_uv_config_path(tmp_path, monkeypatch):
     uv_toml = tmp_path / 'uv' / 'uv.toml'
     monkeypatch.setattr(module, 'get_uv_config_path', lambda: uv_toml)
     return uv_toml
+
+
+@pytest.fixture(autouse=True)
+def isolated_probe_cache(tmp_path, monkeypatch):
+    """将 ~/.cnpip 下的锁文件、缓存（单飞测速、重定向、文件主机）、测速历史和本地镜像注册表重定向到 tmp_path，避免读写真实的 ~/.cnpip。"""
+    import cnpip.cnpip as module
+    import cnpip.mirrors as mirrors_module
+
+    cache_dir = tmp_path / 'cnpip_home'
+    monkeypatch.setattr(module, 'PROBE_LOCK_FILE', cache_dir / 'probe.lock')
+    monkeypatch.setattr(module, 'PROBE_CACHE_FILE', cache_dir / 'probe_results.json')
+    monkeypatch.setattr(module, 'REDIRECT_CACHE_FILE', cache_dir / 'redirects.json')
+    monkeypatch.setattr(module, 'FILE_HOST_CACHE_FILE', cache_dir / 'file_hosts.json')
+    monkeypatch.setattr(module, 'HISTORY_FILE', cache_dir / 'history.jsonl')
+    monkeypatch.setattr(module, 'HISTORY_LOCK_FILE', cache_dir / 'history.lock')
+    monkeypatch.setattr(module, 'SCHEDULE_FILE', cache_dir / 'schedule.json')
+    monkeypatch.setattr(mirrors_module, 'LOCAL_MIRRORS_FILE', cache_dir / 'local_mirrors.json')
+    # 不在测试中启动后台刷新镜像列表的进程
+    monkeypatch.setenv('CNPIP_NO_AUTO_UPDATE', '1')
+    return cache_dir
+
+
+@pytest.fixture
+def static_server(tmp_path):
+    """在本机随机端口启动静态文件服务（根目录为返回的 root），用于不依赖外网的测速测试。"""
+    import functools
+    import threading
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    class _QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    root = tmp_path / 'www'
+    root.mkdir()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_QuietHandler, directory=str(root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.root = root
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
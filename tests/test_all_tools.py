@@ -0,0 +1,182 @@
+"""测试多工具配置（set --all-tools）：conda、poetry、pdm 的配置写入与一次性配置流程。"""
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (
+    update_condarc, update_poetry_source, update_pdm_config, find_poetry_project, detect_tool_targets, set_all_tools,
+)
+from cnpip.mirrors import MIRRORS, CONDA_MIRRORS
+
+MIRROR_URL = MIRRORS['tuna']
+CONDA_URL = CONDA_MIRRORS['tuna']
+
+
+@pytest.fixture
+def fake_condarc(tmp_path, monkeypatch):
+    path = tmp_path / '.condarc'
+    monkeypatch.setenv('CONDARC', str(path))
+    return path
+
+
+@pytest.fixture
+def fake_pdm_config(tmp_path, monkeypatch):
+    path = tmp_path / 'pdm' / 'config.toml'
+    monkeypatch.setenv('PDM_CONFIG_FILE', str(path))
+    return path
+
+
+@pytest.fixture
+def poetry_project(tmp_path, monkeypatch):
+    project = tmp_path / 'proj'
+    project.mkdir()
+    (project / 'pyproject.toml').write_text(
+        '[tool.poetry]\nname = "demo"\n\n[tool.poetry.dependencies]\npython = "^3.8"\n',
+        encoding='utf-8',
+    )
+    monkeypatch.chdir(project)
+    return project / 'pyproject.toml'
+
+
+class TestUpdateCondarc:
+    def test_creates_condarc(self, fake_condarc):
+        success, msg = update_condarc(CONDA_URL)
+        assert success, msg
+        content = fake_condarc.read_text(encoding='utf-8')
+        assert f'  - {CONDA_URL}/pkgs/main' in content
+        assert f'  conda-forge: {CONDA_URL}/cloud' in content
+
+    def test_preserves_channels_and_replaces_old_mirror(self, fake_condarc):
+        fake_condarc.write_text(
+            'channels:\n  - defaults\n  - conda-forge\n'
+            'default_channels:\n  - https://old.example/pkgs/main\n'
+            'auto_activate_base: false\n',
+            encoding='utf-8',
+        )
+        update_condarc(CONDA_URL)
+        content = fake_condarc.read_text(encoding='utf-8')
+        assert 'old.example' not in content
+        assert 'channels:\n  - defaults\n  - conda-forge\n' in content
+        assert 'auto_activate_base: false' in content
+        assert content.count('default_channels:') == 1
+
+
+class TestUpdatePoetrySource:
+    def test_detects_poetry_project(self, poetry_project):
+        assert find_poetry_project() == poetry_project
+
+    def test_not_a_poetry_project(self, tmp_path):
+        (tmp_path / 'pyproject.toml').write_text('[project]\nname = "x"\n', encoding='utf-8')
+        assert find_poetry_project(tmp_path) is None
+
+    def test_writes_and_replaces_source(self, poetry_project):
+        update_poetry_source('https://old.example/simple', poetry_project)
+        success, msg = update_poetry_source(MIRROR_URL, poetry_project)
+        assert success, msg
+        content = poetry_project.read_text(encoding='utf-8')
+        assert content.count('[[tool.poetry.source]]') == 1
+        assert f'url = "{MIRROR_URL}"' in content
+        assert 'python = "^3.8"' in content
+
+    def test_keeps_other_sources(self, poetry_project):
+        with open(poetry_project, 'a', encoding='utf-8') as f:
+            f.write('\n[[tool.poetry.source]]\nname = "private"\nurl = "https://pypi.corp/simple"\n')
+        update_poetry_source(MIRROR_URL, poetry_project)
+        content = poetry_project.read_text(encoding='utf-8')
+        assert 'name = "private"' in content
+        assert content.count('[[tool.poetry.source]]') == 2
+
+
+class TestUpdatePdmConfig:
+    def test_creates_config(self, fake_pdm_config):
+        success, msg = update_pdm_config(MIRROR_URL)
+        assert success, msg
+        assert fake_pdm_config.read_text(encoding='utf-8') == f'[pypi]\nurl = "{MIRROR_URL}"\n'
+
+    def test_updates_existing_table(self, fake_pdm_config):
+        fake_pdm_config.parent.mkdir(parents=True)
+        fake_pdm_config.write_text(
+            '[pypi]\nurl = "https://old.example/simple"\nverify_ssl = true\n\n[python]\nuse_venv = true\n',
+            encoding='utf-8',
+        )
+        update_pdm_config(MIRROR_URL)
+        content = fake_pdm_config.read_text(encoding='utf-8')
+        assert f'url = "{MIRROR_URL}"' in content
+        assert 'old.example' not in content
+        assert 'verify_ssl = true' in content
+        assert '[python]\nuse_venv = true' in content
+
+
+class TestSetAllTools:
+    def test_detects_tools_concurrently(self, monkeypatch, fake_condarc, fake_pdm_config, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: True)
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: None)
+        monkeypatch.setattr(module.shutil, 'which', lambda name: None)
+        monkeypatch.delenv('CONDA_PREFIX', raising=False)
+        targets = detect_tool_targets(['--user'])
+        assert targets['pip'] == '当前用户配置'
+        assert targets['uv'] is None
+        assert targets['conda'] is None
+        assert targets['poetry'] is None
+        assert targets['pdm'] is None
+
+    def test_cli_writes_every_detected_tool(self, monkeypatch, fake_condarc, fake_pdm_config,
+                                            fake_uv_config_path, poetry_project, capsys):
+        pip_calls = []
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: True)
+        monkeypatch.setattr(module, 'update_pip_config', lambda url, scope, fallbacks=(): pip_calls.append(url) or 'pip')
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(module.shutil, 'which', lambda name: '/usr/bin/' + name)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--all-tools', '--poetry'])
+        module.main()
+
+        assert pip_calls == [MIRROR_URL]
+        assert MIRROR_URL in fake_uv_config_path.read_text(encoding='utf-8')
+        assert CONDA_URL in fake_condarc.read_text(encoding='utf-8')
+        assert MIRROR_URL in poetry_project.read_text(encoding='utf-8')
+        assert MIRROR_URL in fake_pdm_config.read_text(encoding='utf-8')
+
+    def test_poetry_project_needs_opt_in(self, monkeypatch, fake_condarc, fake_pdm_config,
+                                         poetry_project, capsys):
+        original = poetry_project.read_text(encoding='utf-8')
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: None)
+        monkeypatch.setattr(module.shutil, 'which', lambda name: '/usr/bin/' + name)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--all-tools'])
+        module.main()
+        assert poetry_project.read_text(encoding='utf-8') == original
+        assert '--poetry' in capsys.readouterr().out
+
+    def test_poetry_flag_requires_all_tools(self, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--poetry'])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
+
+    def test_uv_written_once_when_pip_step_falls_back(self, monkeypatch, tmp_path):
+        monkeypatch.chdir(tmp_path)
+        uv_calls = []
+        monkeypatch.setattr(module, 'detect_tool_targets',
+                            lambda scope: {'pip': 'auto', 'uv': 'uv.toml', 'conda': None, 'poetry': None, 'pdm': None})
+        monkeypatch.setattr(module, 'update_pip_config', lambda url, scope, fallbacks=(): 'uv')
+        monkeypatch.setattr(module, 'update_uv_config', lambda *a: uv_calls.append(a) or (True, 'ok'))
+        assert set_all_tools('tuna', MIRROR_URL, []) == {'uv'}
+        assert uv_calls == []
+
+    def test_pip_failure_is_reported(self, monkeypatch):
+        monkeypatch.setattr(module, 'detect_tool_targets',
+                            lambda scope: {'pip': 'auto', 'uv': None, 'conda': None, 'poetry': None, 'pdm': None})
+        monkeypatch.setattr(module, 'update_pip_config', lambda url, scope, fallbacks=(): None)
+        assert set_all_tools('tuna', MIRROR_URL, ['--user']) is None
+
+    def test_cli_skips_conda_without_anaconda_mirror(self, monkeypatch, fake_condarc, fake_pdm_config,
+                                                     tmp_path, capsys):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: None)
+        monkeypatch.setattr(module.shutil, 'which', lambda name: '/usr/bin/' + name)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'default', '--all-tools'])
+        module.main()
+        assert not fake_condarc.exists()
+        assert '不提供 Anaconda 镜像' in capsys.readouterr().out
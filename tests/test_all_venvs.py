@@ -0,0 +1,138 @@
+"""测试批量发现并配置虚拟环境（set --all-venvs / unset --all-venvs）。"""
+import configparser
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (
+    detect_prefix_environment, discover_environments, configure_environments, unconfigure_environments,
+    get_site_pip_config_path,
+)
+from cnpip.mirrors import MIRRORS
+
+MIRROR_URL = MIRRORS['tuna']
+
+
+def make_venv(path, uv=False):
+    path.mkdir(parents=True)
+    content = 'home = /usr/bin\n' + ('uv = 0.5.0\n' if uv else '')
+    (path / 'pyvenv.cfg').write_text(content, encoding='utf-8')
+    return path
+
+
+def make_conda(path):
+    (path / 'conda-meta').mkdir(parents=True)
+    return path
+
+
+@pytest.fixture
+def env_tree(tmp_path):
+    root = tmp_path / 'projects'
+    make_venv(root / 'app' / '.venv')
+    make_venv(root / 'tool' / 'venv', uv=True)
+    conda = make_conda(root / 'miniconda3')
+    make_conda(conda / 'envs' / 'ml')
+    make_venv(root / 'app' / 'node_modules' / 'fake')
+    return root
+
+
+class TestDetectPrefixEnvironment:
+    def test_plain_venv(self, tmp_path):
+        assert detect_prefix_environment(make_venv(tmp_path / 'v')) == 'venv'
+
+    def test_uv_venv(self, tmp_path):
+        assert detect_prefix_environment(make_venv(tmp_path / 'v', uv=True)) == 'uv_venv'
+
+    def test_conda(self, tmp_path):
+        assert detect_prefix_environment(make_conda(tmp_path / 'c')) == 'conda'
+
+    def test_not_an_env(self, tmp_path):
+        assert detect_prefix_environment(tmp_path) is None
+
+
+class TestDiscoverEnvironments:
+    def test_finds_venvs_and_conda_envs(self, env_tree):
+        found = {str(p.relative_to(env_tree)).replace('\\', '/'): t for p, t in discover_environments(env_tree)}
+        assert found == {
+            'app/.venv': 'venv',
+            'tool/venv': 'uv_venv',
+            'miniconda3': 'conda',
+            'miniconda3/envs/ml': 'conda',
+        }
+
+    def test_respects_max_depth(self, env_tree):
+        found = [p for p, _ in discover_environments(env_tree, max_depth=1)]
+        assert env_tree / 'miniconda3' in found
+        assert env_tree / 'app' / '.venv' not in found
+
+
+class TestConfigureEnvironments:
+    def test_writes_site_config_for_each_env(self, env_tree):
+        environments = discover_environments(env_tree)
+        outcomes = configure_environments(environments, MIRROR_URL)
+        assert all(success for _, success, _ in outcomes)
+        for prefix, _ in environments:
+            cfg = configparser.ConfigParser()
+            cfg.read(str(get_site_pip_config_path(prefix)), encoding='utf-8')
+            assert cfg.get('global', 'index-url') == MIRROR_URL
+
+    def test_reports_failures(self, env_tree, monkeypatch):
+        def _fail(mirror_url, scope, config_path=None, fallback_urls=()):
+            return False, '权限不足'
+
+        monkeypatch.setattr(module, 'write_pip_config_directly', _fail)
+        outcomes = configure_environments(discover_environments(env_tree), MIRROR_URL)
+        assert outcomes and not any(success for _, success, _ in outcomes)
+
+
+class TestUnconfigureEnvironments:
+    def test_removes_mirror_keeps_other_settings(self, env_tree):
+        environments = discover_environments(env_tree)
+        configure_environments(environments, MIRROR_URL)
+        prefix = environments[0][0]
+        config_path = get_site_pip_config_path(prefix)
+        config_path.write_text(config_path.read_text(encoding='utf-8') + 'timeout = 30\n', encoding='utf-8')
+
+        outcomes = unconfigure_environments(environments)
+        assert all(success for _, success, _ in outcomes)
+        for prefix, _ in environments:
+            cfg = configparser.ConfigParser()
+            cfg.read(str(get_site_pip_config_path(prefix)), encoding='utf-8')
+            assert not cfg.has_option('global', 'index-url')
+        cfg = configparser.ConfigParser()
+        cfg.read(str(config_path), encoding='utf-8')
+        assert cfg.get('global', 'timeout') == '30'
+
+
+class TestSetAllVenvsCommand:
+    def test_cli_configures_all_envs_without_pip(self, env_tree, monkeypatch, capsys):
+        def _no_pip(*args, **kwargs):
+            raise AssertionError('不应调用 pip')
+
+        monkeypatch.setattr(module.subprocess, 'run', _no_pip)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--all-venvs', str(env_tree)])
+        module.main()
+        out = capsys.readouterr().out
+        assert '成功: 4 个，失败: 0 个' in out
+
+    def test_cli_missing_root(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--all-venvs', str(tmp_path / 'missing')])
+        with pytest.raises(SystemExit) as exc_info:
+            module.main()
+        assert exc_info.value.code == 1
+
+    def test_cli_unset_all_envs(self, env_tree, monkeypatch, capsys):
+        configure_environments(discover_environments(env_tree), MIRROR_URL)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'unset', '--all-venvs', str(env_tree)])
+        with pytest.raises(SystemExit) as exc_info:
+            module.main()
+        assert exc_info.value.code == 0
+        assert '成功: 4 个，失败: 0 个' in capsys.readouterr().out
+        for prefix, _ in discover_environments(env_tree):
+            assert MIRROR_URL not in get_site_pip_config_path(prefix).read_text(encoding='utf-8')
+
+    def test_cli_unset_rejects_all_tools(self, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'unset', '--all-tools'])
+        with pytest.raises(SystemExit) as exc_info:
+            module.main()
+        assert exc_info.value.code == 1
@@ -0,0 +1,118 @@
+"""测试 CDN 缓存命中 / 未命中测速（list --cache、set --rank-by miss）。"""
+import random
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (measure_cache_behaviour, parse_cache_status, rank_by_cache_miss,
+                         select_cache_probe_files)
+
+VERSIONS = ['21.0', '22.0', '23.0', '24.0']
+MISS_DELAY = 0.2
+
+
+@pytest.fixture
+def cdn_mirror():
+    """模拟 CDN：文件第一次请求时回源（延迟 MISS_DELAY 秒，X-Cache: MISS），之后命中缓存。"""
+    cached = set()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/simple/pip/'):
+                body = ''.join(f'<a href="/files/pip-{v}-py3-none-any.whl#sha256=00">x</a>\n'
+                               for v in VERSIONS).encode()
+                headers = {}
+            else:
+                with lock:
+                    hit = self.path in cached
+                    cached.add(self.path)
+                if not hit:
+                    time.sleep(MISS_DELAY)
+                body = b'x' * 8192
+                headers = {'X-Cache': 'HIT from edge' if hit else 'MISS from edge'}
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/simple'
+    server.shutdown()
+    server.server_close()
+
+
+class TestParseCacheStatus:
+    @pytest.mark.parametrize('headers, expected', [
+        ({'X-Cache': 'HIT TCP_MEM_HIT dirn:1:2'}, 'hit'),
+        ({'x-cache': 'MISS, HIT'}, 'hit'),          # 多级缓存以最后一级为准
+        ({'X-Cache': 'HIT, MISS'}, 'miss'),
+        ({'CF-Cache-Status': 'EXPIRED'}, 'miss'),
+        ({'X-Cache-Lookup': 'Cache Miss'}, 'miss'),
+        ({'Age': '120'}, 'hit'),
+        ({'Age': '0'}, 'miss'),
+        ({'Content-Type': 'application/octet-stream'}, None),
+    ])
+    def test_headers(self, headers, expected):
+        assert parse_cache_status(headers) == expected
+
+
+class TestSelectCacheProbeFiles:
+    def test_popular_is_latest_wheel_and_rare_is_older(self):
+        links = [f'https://m/pip-{v}-py3-none-any.whl' for v in VERSIONS] + ['https://m/pip-24.0.tar.gz']
+        popular, rare = select_cache_probe_files(links, random.Random(0))
+        assert popular.endswith('pip-24.0-py3-none-any.whl')
+        assert rare in links[:2]
+
+    def test_single_file(self):
+        assert select_cache_probe_files(['https://m/pip-24.0-py3-none-any.whl']) == \
+            ('https://m/pip-24.0-py3-none-any.whl', None)
+
+
+class TestMeasureCacheBehaviour:
+    def test_hit_and_miss(self, cdn_mirror):
+        result = measure_cache_behaviour('cdn', cdn_mirror, random.Random(0))
+        assert result['error'] is None
+        assert [result[key]['cache'] for key in ('first', 'hit', 'miss')] == ['miss', 'hit', 'miss']
+        assert result['miss']['ttfb_ms'] >= MISS_DELAY * 1000
+        assert result['hit']['ttfb_ms'] < result['miss']['ttfb_ms']
+
+    def test_unreachable_mirror(self):
+        result = measure_cache_behaviour('down', 'http://127.0.0.1:9/simple')
+        assert result['error']
+
+    def test_rank_by_miss(self):
+        results = [
+            {'name': 'cdn', 'url': 'u1', 'miss': {'ms': 900.0}, 'error': None},
+            {'name': 'down', 'url': 'u2', 'miss': None, 'error': 'Timeout'},
+            {'name': 'origin', 'url': 'u3', 'miss': {'ms': 120.0}, 'error': None},
+        ]
+        assert [r[0] for r in rank_by_cache_miss(results)] == ['origin', 'cdn', 'down']
+
+
+class TestCacheCli:
+    def test_list_cache(self, monkeypatch, cdn_mirror, capsys):
+        monkeypatch.setattr(module, 'MIRRORS', {'cdn': cdn_mirror})
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--cache'])
+        module.main()
+        out = capsys.readouterr().out
+        assert 'MISS/HIT/MISS' in out
+
+    def test_set_rank_by_miss(self, monkeypatch, fake_uv_config_path):
+        monkeypatch.setattr(module, 'probe_cache_behaviour', lambda mirrors: [
+            {'name': 'tuna', 'url': module.MIRRORS['tuna'], 'miss': {'ms': 300.0}, 'error': None},
+            {'name': 'ustc', 'url': module.MIRRORS['ustc'], 'miss': {'ms': 100.0}, 'error': None},
+        ])
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--rank-by', 'miss'])
+        module.main()
+        assert module.MIRRORS['ustc'] in fake_uv_config_path.read_text(encoding='utf-8')
@@ -21,7 +21,12 @@ def no_network(monkeypatch):
     def _fake_speed(name, url):
         return name, 100.0, url, None
 
+    def _fake_trace(url):
+        return {'url': url, 'chain': [{'url': url, 'status': 200, 'ms': 1.0}], 'final_url': url,
+                'hops': 0, 'redirect_ms': 0.0, 'error': None}
+
     monkeypatch.setattr(module, 'measure_mirror_speed', _fake_speed)
+    monkeypatch.setattr(module, 'trace_redirects', _fake_trace)
 
 
 class TestInfoCommand:
@@ -128,3 +133,28 @@ class TestListCommand:
         captured = capsys.readouterr()
         assert 'tuna' in captured.out
         assert 'ustc' in captured.out
+
+
+class TestUnsupportedCombinations:
+    """会被静默忽略的选项组合直接报错。"""
+
+    @pytest.mark.parametrize('argv', [
+        ['list', '--files', '--warm'],
+        ['list', '--cache', '--scaling'],
+        ['list', '--formats', '--export', 'out.json'],
+        ['list', '--routes', '--conda'],
+        ['set', '--conda', '--tune'],
+        ['set', '--uv-python', '--fallbacks', '2'],
+        ['set', '--pytorch', 'cu121', '--routes'],
+        ['set', '--pytorch', 'cu121', '--resolve-redirects'],
+        ['set', '--pytorch', 'cu121', '--conda'],
+    ])
+    def test_rejected(self, monkeypatch, capsys, argv):
+        monkeypatch.setattr(sys, 'argv', ['cnpip'] + argv)
+        monkeypatch.setattr(module, 'set_conda_mirror', lambda *a: pytest.fail('不应写入配置'))
+        monkeypatch.setattr(module, 'set_uv_python_mirror', lambda *a: pytest.fail('不应写入配置'))
+        monkeypatch.setattr(module, 'set_vendor_index', lambda *a: pytest.fail('不应写入配置'))
+        with pytest.raises(SystemExit) as exc_info:
+            main()
+        assert exc_info.value.code == 1
+        assert '错误' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+"""测试 conda 镜像源测速（下载 repodata）与 set/unset --conda。"""
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import measure_conda_repodata_speed, set_conda_mirror, unset_condarc, update_condarc
+from cnpip.mirrors import CONDA_MIRRORS
+
+
+@pytest.fixture
+def fake_condarc(tmp_path, monkeypatch):
+    path = tmp_path / '.condarc'
+    monkeypatch.setenv('CONDARC', str(path))
+    return path
+
+
+def publish_repodata(server, filename, size=4096):
+    subdir = server.root / 'anaconda' / 'pkgs' / 'main' / 'noarch'
+    subdir.mkdir(parents=True, exist_ok=True)
+    (subdir / filename).write_bytes(b'x' * size)
+    return server.url + '/anaconda'
+
+
+class TestMeasureCondaRepodataSpeed:
+    def test_downloads_zst_repodata(self, static_server):
+        base = publish_repodata(static_server, 'repodata.json.zst')
+        name, speed, url, error = measure_conda_repodata_speed('local', base)
+        assert error is None
+        assert speed != float('inf')
+        assert url == base
+
+    def test_falls_back_to_bz2(self, static_server):
+        base = publish_repodata(static_server, 'repodata.json.bz2')
+        _, speed, _, error = measure_conda_repodata_speed('local', base)
+        assert error is None
+
+    def test_reports_error_when_missing(self, static_server):
+        _, speed, _, error = measure_conda_repodata_speed('local', static_server.url + '/missing')
+        assert speed == float('inf')
+        assert error
+
+
+class TestSetCondaMirror:
+    def test_set_named_mirror(self, fake_condarc):
+        assert set_conda_mirror('tuna')
+        assert CONDA_MIRRORS['tuna'] in fake_condarc.read_text(encoding='utf-8')
+
+    def test_unknown_mirror(self, fake_condarc):
+        assert not set_conda_mirror('nonexistent')
+        assert not fake_condarc.exists()
+
+    def test_auto_selects_fastest(self, fake_condarc, monkeypatch):
+        def _fake_probe(name, url):
+            return name, (10.0 if name == 'bfsu' else 500.0), url, None
+
+        monkeypatch.setattr(module, 'measure_conda_repodata_speed', _fake_probe)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--conda'])
+        module.main()
+        assert CONDA_MIRRORS['bfsu'] in fake_condarc.read_text(encoding='utf-8')
+
+    def test_unset_conda(self, fake_condarc, monkeypatch):
+        fake_condarc.write_text('channels:\n  - defaults\n', encoding='utf-8')
+        update_condarc(CONDA_MIRRORS['tuna'])
+        success, msg = unset_condarc()
+        assert success, msg
+        assert fake_condarc.read_text(encoding='utf-8') == 'channels:\n  - defaults\n'
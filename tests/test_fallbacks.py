@@ -0,0 +1,142 @@
+"""测试按测速排名写入备用镜像（set --fallbacks N）。"""
+import configparser
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (
+    select_fallback_mirrors, merge_extra_index_urls, write_pip_config_directly, unset_pip_config_directly,
+    update_uv_config, get_uv_index_url, unset_uv_config, update_pip_config, read_pip_scope_value,
+)
+from cnpip.mirrors import MIRRORS
+
+PRIVATE_URL = 'https://pypi.corp.example/simple'
+
+RESULTS = [
+    ('ustc', 50.0, MIRRORS['ustc'], None),
+    ('tuna', 80.0, MIRRORS['tuna'], None),
+    ('aliyun', 90.0, MIRRORS['aliyun'], None),
+    ('huawei', float('inf'), MIRRORS['huawei'], 'Timeout'),
+]
+
+
+def read_config(path):
+    cfg = configparser.ConfigParser()
+    cfg.read(str(path), encoding='utf-8')
+    return cfg
+
+
+class TestSelectFallbackMirrors:
+    def test_ranked_and_excludes_primary(self):
+        assert select_fallback_mirrors(RESULTS, 'ustc', 2) == ['tuna', 'aliyun']
+
+    def test_excludes_failed_probes(self):
+        assert select_fallback_mirrors(RESULTS, 'tuna', 5) == ['ustc', 'aliyun']
+
+    def test_zero(self):
+        assert select_fallback_mirrors(RESULTS, 'ustc', 0) == []
+
+
+class TestMergeExtraIndexUrls:
+    def test_keeps_private_index(self):
+        existing = f'{PRIVATE_URL} {MIRRORS["aliyun"]}'
+        assert merge_extra_index_urls(existing, [MIRRORS['tuna']]) == [PRIVATE_URL, MIRRORS['tuna']]
+
+    def test_removes_old_fallbacks(self):
+        assert merge_extra_index_urls(MIRRORS['aliyun'], []) == []
+
+
+class TestPipFallbacks:
+    def test_writes_extra_index_urls_and_trusted_hosts(self, fake_pip_config_path):
+        success, msg = write_pip_config_directly(MIRRORS['ustc'], 'user',
+                                                 fallback_urls=[MIRRORS['tuna'], MIRRORS['aliyun']])
+        assert success, msg
+        cfg = read_config(fake_pip_config_path / 'pip.conf')
+        assert cfg.get('global', 'index-url') == MIRRORS['ustc']
+        assert cfg.get('global', 'extra-index-url').split() == [MIRRORS['tuna'], MIRRORS['aliyun']]
+        assert cfg.get('global', 'trusted-host').split() == [
+            'pypi.mirrors.ustc.edu.cn', 'pypi.tuna.tsinghua.edu.cn', 'mirrors.aliyun.com']
+
+    def test_set_without_fallbacks_drops_old_ones(self, fake_pip_config_path):
+        write_pip_config_directly(MIRRORS['ustc'], 'user', fallback_urls=[MIRRORS['tuna']])
+        write_pip_config_directly(MIRRORS['ustc'], 'user')
+        cfg = read_config(fake_pip_config_path / 'pip.conf')
+        assert not cfg.has_option('global', 'extra-index-url')
+
+    def test_unset_keeps_private_extra_index(self, fake_pip_config_path):
+        fake_pip_config_path.mkdir(parents=True)
+        (fake_pip_config_path / 'pip.conf').write_text(
+            f'[global]\nextra-index-url = {PRIVATE_URL}\n', encoding='utf-8')
+        write_pip_config_directly(MIRRORS['ustc'], 'user', fallback_urls=[MIRRORS['tuna']])
+        success, msg = unset_pip_config_directly('user')
+        assert success, msg
+        cfg = read_config(fake_pip_config_path / 'pip.conf')
+        assert cfg.get('global', 'extra-index-url') == PRIVATE_URL
+
+
+class TestUvFallbacks:
+    def test_writes_ranked_indexes(self, fake_uv_config_path):
+        success, msg = update_uv_config(MIRRORS['ustc'], [MIRRORS['tuna'], MIRRORS['aliyun']])
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        # uv 默认的 first-index 只在缺包时查询后续索引，不写入 index-strategy
+        assert 'index-strategy' not in content
+        positions = [content.index(MIRRORS[name]) for name in ('ustc', 'tuna', 'aliyun')]
+        assert positions == sorted(positions)
+        assert content.count('[[index]]') == 3
+        # 只有排名最后的备用镜像标记为 default（uv 最后查询 default 索引）
+        assert content.count('default = true') == 1
+        assert content.rstrip().endswith('default = true')
+        assert get_uv_index_url() == MIRRORS['ustc']
+        # uv 不会在主镜像故障时切换，写入时明确提示
+        assert '不会切换到备用镜像' in msg
+
+    def test_no_failover_note_without_fallbacks(self, fake_uv_config_path):
+        success, msg = update_uv_config(MIRRORS['ustc'])
+        assert success and '备用镜像' not in msg
+
+    def test_keeps_existing_top_level_settings(self, fake_uv_config_path):
+        fake_uv_config_path.parent.mkdir(parents=True)
+        fake_uv_config_path.write_text('native-tls = true\n\n[pip]\nonly-binary = [":all:"]\n', encoding='utf-8')
+        update_uv_config(MIRRORS['ustc'], [MIRRORS['tuna']])
+        update_uv_config(MIRRORS['ustc'], [MIRRORS['tuna']])
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert content.index('native-tls = true') < content.index('[pip]')
+        assert content.count('[[index]]') == 2
+
+    def test_unset_removes_legacy_index_strategy(self, fake_uv_config_path):
+        fake_uv_config_path.parent.mkdir(parents=True)
+        fake_uv_config_path.write_text('index-strategy = "first-index"\nnative-tls = true\n\n'
+                                       f'[[index]]\nurl = "{MIRRORS["ustc"]}"\ndefault = true\n', encoding='utf-8')
+        success, msg = unset_uv_config()
+        assert success, msg
+        assert fake_uv_config_path.read_text(encoding='utf-8') == 'native-tls = true\n\n'
+
+
+class TestSetFallbacksCommand:
+    def test_cli_uses_probe_ranking(self, monkeypatch, fake_uv_config_path):
+        monkeypatch.setattr(module, 'probe_mirrors_single_flight', lambda mirrors=None: list(RESULTS))
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--fallbacks', '1'])
+        module.main()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert MIRRORS['ustc'] in content
+        assert MIRRORS['tuna'] in content
+        assert MIRRORS['aliyun'] not in content
+
+
+@pytest.mark.skipif(sys.platform != 'linux', reason='通过 XDG_CONFIG_HOME 隔离 pip 用户配置')
+class TestPipScopeExtraIndex:
+    @pytest.fixture
+    def pip_env(self, tmp_path, monkeypatch):
+        """pip 用户配置重定向到 tmp_path；PIP_EXTRA_INDEX_URL 模拟其他作用域中的私有源。"""
+        monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'xdg'))
+        monkeypatch.setenv('PIP_EXTRA_INDEX_URL', PRIVATE_URL)
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: True)
+        return tmp_path / 'xdg' / 'pip' / 'pip.conf'
+
+    def test_other_scope_not_copied(self, pip_env):
+        assert update_pip_config(MIRRORS['ustc'], ['--user'], [MIRRORS['tuna']])
+        cfg = read_config(pip_env)
+        assert cfg.get('global', 'extra-index-url') == MIRRORS['tuna']
+        assert read_pip_scope_value(['--user'], 'extra-index-url') == MIRRORS['tuna']
@@ -0,0 +1,116 @@
+"""测试文件主机测速（list --files）以及 trusted-host 覆盖文件主机。"""
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (discover_file_url, timed_get, measure_file_host, discover_file_hosts,
+                         get_trusted_hosts, write_pip_config_directly)
+
+
+@pytest.fixture
+def split_mirror(static_server):
+    """索引页经 127.0.0.1 访问，包文件链接指向 localhost，模拟独立的文件主机。"""
+    port = static_server.url.rsplit(':', 1)[1]
+    file_base = f'http://localhost:{port}'
+    (static_server.root / 'simple' / 'pip').mkdir(parents=True)
+    (static_server.root / 'files').mkdir()
+    (static_server.root / 'files' / 'pip-24.0-py3-none-any.whl').write_bytes(b'x' * 4096)
+    (static_server.root / 'files' / 'pip-24.0.tar.gz').write_bytes(b'y' * 10)
+    (static_server.root / 'simple' / 'pip' / 'index.html').write_text(
+        f'<a href="{file_base}/files/pip-24.0-py3-none-any.whl#sha256=abc">whl</a>\n'
+        '<a href="../../files/pip-24.0.tar.gz#sha256=def">sdist</a>\n', encoding='utf-8')
+    static_server.index_url = static_server.url + '/simple'
+    static_server.file_host = f'localhost:{port}'
+    return static_server
+
+
+class TestDiscoverFileUrl:
+    def test_prefers_wheel_and_strips_fragment(self, split_mirror):
+        url = discover_file_url(split_mirror.index_url)
+        assert url == f'http://{split_mirror.file_host}/files/pip-24.0-py3-none-any.whl'
+
+    def test_resolves_relative_links(self, static_server):
+        (static_server.root / 'simple' / 'pip').mkdir(parents=True)
+        (static_server.root / 'simple' / 'pip' / 'index.html').write_text(
+            '<a href="../../files/pip-24.0.tar.gz">sdist</a>', encoding='utf-8')
+        url = discover_file_url(static_server.url + '/simple')
+        assert url == static_server.url + '/files/pip-24.0.tar.gz'
+
+    def test_page_without_links(self, static_server):
+        (static_server.root / 'simple' / 'pip').mkdir(parents=True)
+        (static_server.root / 'simple' / 'pip' / 'index.html').write_text('<html></html>', encoding='utf-8')
+        assert discover_file_url(static_server.url + '/simple') is None
+
+
+class TestMeasureFileHost:
+    def test_timed_get_respects_max_bytes(self, split_mirror):
+        timing = timed_get(split_mirror.url + '/files/pip-24.0-py3-none-any.whl', max_bytes=1000)
+        assert timing['bytes'] == 1000
+        assert timing['connect_ms'] >= 0 and timing['ttfb_ms'] >= 0
+
+    def test_reports_both_hosts(self, split_mirror):
+        result = measure_file_host('local', split_mirror.index_url)
+        assert result['error'] is None
+        assert result['index_host'] == split_mirror.url.split('//', 1)[1]
+        assert result['file_host'] == split_mirror.file_host
+        assert result['bytes'] == 4096
+
+    def test_missing_project_page(self, static_server):
+        result = measure_file_host('local', static_server.url + '/simple')
+        assert result['error']
+        assert result['file_host'] is None
+
+
+class TestTrustedFileHosts:
+    def test_discovered_host_added_to_trusted_hosts(self, split_mirror):
+        hosts = discover_file_hosts([split_mirror.index_url])
+        assert hosts == {split_mirror.index_url: split_mirror.file_host}
+        trusted = get_trusted_hosts([split_mirror.index_url]).split()
+        assert trusted == [split_mirror.url.split('//', 1)[1], split_mirror.file_host]
+
+    def test_written_to_pip_config(self, split_mirror, fake_pip_config_path):
+        discover_file_hosts([split_mirror.index_url])
+        success, _ = write_pip_config_directly(split_mirror.index_url, 'user')
+        assert success
+        assert split_mirror.file_host in (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+
+    def test_same_host_not_duplicated(self, static_server):
+        (static_server.root / 'simple' / 'pip').mkdir(parents=True)
+        (static_server.root / 'files').mkdir()
+        (static_server.root / 'files' / 'pip.whl').write_bytes(b'x')
+        (static_server.root / 'simple' / 'pip' / 'index.html').write_text(
+            '<a href="../../files/pip.whl">whl</a>', encoding='utf-8')
+        url = static_server.url + '/simple'
+        discover_file_hosts([url])
+        assert get_trusted_hosts([url]) == static_server.url.split('//', 1)[1]
+
+
+def test_list_files(monkeypatch, capsys, split_mirror):
+    monkeypatch.setattr(module, 'MIRRORS', {'local': split_mirror.index_url})
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--files'])
+    module.main()
+    out = capsys.readouterr().out
+    assert split_mirror.file_host in out
+    assert get_trusted_hosts([split_mirror.index_url]).endswith(split_mirror.file_host)
+
+
+class TestSetDiscovery:
+    @pytest.fixture
+    def discovered(self, monkeypatch, fake_pip_config_path):
+        calls = []
+        monkeypatch.setattr(module, 'discover_file_hosts', lambda urls: calls.append(urls) or {})
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        return calls
+
+    def test_explicit_mirror_does_not_discover(self, monkeypatch, discovered, fake_pip_config_path):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--user'])
+        module.main()
+        assert discovered == []
+        assert 'tuna' in (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+
+    def test_auto_probe_discovers(self, monkeypatch, discovered):
+        monkeypatch.setattr(module, 'probe_ranked_mirrors',
+                            lambda args, mirrors=None: [('tuna', 10.0, module.MIRRORS['tuna'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--user'])
+        module.main()
+        assert discovered == [[module.MIRRORS['tuna']]]
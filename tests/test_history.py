@@ -0,0 +1,161 @@
+"""测试测速历史的记录、压缩、EWMA 评分与 cnpip history。"""
+import json
+import os
+import sys
+import threading
+import time
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (record_probe_history, load_probe_history, compact_probe_history,
+                         score_mirror_history, rank_by_history)
+from cnpip.mirrors import MIRRORS
+
+
+def record(name, ms, t, error=None):
+    return {'t': t, 'name': name, 'url': MIRRORS[name], 'ms': ms, 'error': error}
+
+
+class TestRecordProbeHistory:
+    def test_appends_results(self):
+        record_probe_history([('tuna', 50.0, MIRRORS['tuna'], None)], timestamp=100)
+        record_probe_history([('tuna', float('inf'), MIRRORS['tuna'], 'Timeout')], timestamp=200)
+        records = load_probe_history()
+        assert [(r['t'], r['ms'], r['error']) for r in records] == [(100, 50.0, None), (200, None, 'Timeout')]
+
+    def test_skips_corrupt_lines(self):
+        module.HISTORY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.HISTORY_FILE.write_text('garbage\n' + json.dumps(record('tuna', 10, 5)) + '\n', encoding='utf-8')
+        assert len(load_probe_history()) == 1
+
+    def test_list_mirrors_records(self, monkeypatch):
+        monkeypatch.setattr(module, 'measure_mirror_speed', lambda name, url: (name, 42.0, url, None))
+        module.list_mirrors({'tuna': MIRRORS['tuna']})
+        assert [r['name'] for r in load_probe_history()] == ['tuna']
+
+
+class TestCompaction:
+    def test_drops_expired_records(self):
+        now = time.time()
+        record_probe_history([('tuna', 1.0, MIRRORS['tuna'], None)], timestamp=now - module.HISTORY_RETENTION - 10)
+        record_probe_history([('ustc', 1.0, MIRRORS['ustc'], None)], timestamp=now)
+        compact_probe_history(now)
+        assert [r['name'] for r in load_probe_history()] == ['ustc']
+
+    def test_bounded_size(self, monkeypatch):
+        monkeypatch.setattr(module, 'HISTORY_MAX_BYTES', 2000)
+        now = time.time()
+        for i in range(100):
+            record_probe_history([('tuna', float(i), MIRRORS['tuna'], None)], timestamp=now + i)
+        assert module.HISTORY_FILE.stat().st_size <= 2000
+        # 保留的是最新的记录
+        assert load_probe_history()[-1]['ms'] == 99.0
+
+
+    def test_keeps_records_appended_during_compaction(self, monkeypatch):
+        now = time.time()
+        record_probe_history([('tuna', 1.0, MIRRORS['tuna'], None)], timestamp=now)
+        original = module.load_probe_history
+        appenders = []
+
+        def _load_then_append(since=None):
+            records = original(since)
+            if not appenders:
+                # 模拟其他进程在读取之后、替换之前追加记录：追加需等待压缩释放锁
+                appender = threading.Thread(target=record_probe_history,
+                                            args=([('ustc', 2.0, MIRRORS['ustc'], None)], now + 1))
+                appender.start()
+                appenders.append(appender)
+                time.sleep(0.1)
+                assert appender.is_alive()
+            return records
+
+        monkeypatch.setattr(module, 'load_probe_history', _load_then_append)
+        compact_probe_history(now)
+        appenders[0].join(timeout=5)
+        assert [r['name'] for r in original()] == ['tuna', 'ustc']
+        assert not module.HISTORY_LOCK_FILE.exists()
+
+    def test_breaks_stale_history_lock(self):
+        module.HISTORY_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.HISTORY_LOCK_FILE.write_text('{}', encoding='utf-8')
+        old = time.time() - module.HISTORY_LOCK_STALE - 10
+        os.utime(str(module.HISTORY_LOCK_FILE), (old, old))
+        record_probe_history([('tuna', 1.0, MIRRORS['tuna'], None)], timestamp=100)
+        assert [r['name'] for r in load_probe_history()] == ['tuna']
+        assert not module.HISTORY_LOCK_FILE.exists()
+
+
+class TestScore:
+    def test_empty(self):
+        assert score_mirror_history([]) is None
+
+    def test_ewma_weights_recent_samples(self):
+        stats = score_mirror_history([record('tuna', 100, 1), record('tuna', 100, 2), record('tuna', 500, 3)])
+        assert 100 < stats['ewma_ms'] < 500
+        assert stats['failure_rate'] == 0
+
+    def test_unreliable_fast_mirror_loses(self):
+        fast = [record('tuna', 30, t) for t in range(8)] + [record('tuna', None, t, 'Timeout') for t in (8, 9)]
+        steady = [record('ustc', 200, t) for t in range(10)]
+        assert score_mirror_history(fast)['failure_rate'] == pytest.approx(0.2)
+        assert score_mirror_history(fast)['score'] > score_mirror_history(steady)['score']
+
+    def test_all_failed(self):
+        stats = score_mirror_history([record('tuna', None, 1, 'Timeout')])
+        assert stats['ewma_ms'] is None
+        assert stats['score'] == module.HISTORY_FAILURE_PENALTY_MS
+
+
+class TestRankByHistory:
+    def test_history_overrides_single_measurement(self, capsys):
+        now = time.time()
+        for i in range(10):
+            error = 'Timeout' if i % 4 == 0 else None
+            record_probe_history([('tuna', float('inf') if error else 30.0, MIRRORS['tuna'], error),
+                                  ('ustc', 200.0, MIRRORS['ustc'], None)], timestamp=now - 3600 + i)
+        results = [('tuna', 20.0, MIRRORS['tuna'], None), ('ustc', 210.0, MIRRORS['ustc'], None)]
+        ranked = rank_by_history(results)
+        assert ranked[0][0] == 'ustc'
+        assert ranked[0][1] == 210.0
+        assert '历史记录' in capsys.readouterr().out
+
+    def test_winner_without_history(self, capsys):
+        now = time.time()
+        for i in range(5):
+            record_probe_history([('tuna', 300.0, MIRRORS['tuna'], None)], timestamp=now - 3600 + i)
+        results = [('tuna', 40.0, MIRRORS['tuna'], None), ('ustc', 50.0, MIRRORS['ustc'], None)]
+        assert [r[0] for r in rank_by_history(results)] == ['ustc', 'tuna']
+        assert '没有测速历史' in capsys.readouterr().out
+
+    def test_without_history_keeps_latency_order(self):
+        results = [('tuna', 20.0, MIRRORS['tuna'], None), ('ustc', 210.0, MIRRORS['ustc'], None),
+                   ('huawei', float('inf'), MIRRORS['huawei'], 'Timeout')]
+        assert rank_by_history(results) == results
+
+    def test_current_failure_always_last(self):
+        record_probe_history([('tuna', 5.0, MIRRORS['tuna'], None)] * 5)
+        results = [('ustc', 300.0, MIRRORS['ustc'], None), ('tuna', float('inf'), MIRRORS['tuna'], 'Timeout')]
+        assert [r[0] for r in rank_by_history(results)] == ['ustc', 'tuna']
+
+
+class TestHistoryCommand:
+    def test_empty(self, monkeypatch, capsys):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'history'])
+        module.main()
+        assert '暂无测速历史' in capsys.readouterr().out
+
+    def test_summary_and_detail(self, monkeypatch, capsys):
+        now = time.time()
+        record_probe_history([('tuna', 50.0, MIRRORS['tuna'], None),
+                              ('ustc', float('inf'), MIRRORS['ustc'], 'Timeout')], timestamp=now - 60)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'history'])
+        module.main()
+        out = capsys.readouterr().out
+        assert 'tuna' in out and 'ustc' in out and '100%' in out
+
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'history', 'tuna'])
+        module.main()
+        out = capsys.readouterr().out
+        assert time.strftime('%Y-%m-%d', time.localtime(now - 60)) in out
+        assert '50 ms' in out
@@ -0,0 +1,258 @@
+"""测试镜像列表的扩展格式与筛选、条件更新、校验与后台刷新（cnpip update）。"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.mirrors as mirrors
+import cnpip.cnpip as module
+from cnpip.mirrors import (validate_mirrors, update_mirrors_from_remote, load_mirrors, load_mirror_registry,
+                           normalize_mirror_entry, filter_mirrors, MIRROR_REGISTRY,
+                           load_registry_meta, registry_is_stale, refresh_mirrors_in_background)
+
+REGISTRY = {'tuna': 'https://pypi.tuna.tsinghua.edu.cn/simple', 'default': 'https://pypi.org/simple'}
+ETAG = '"v1"'
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    """本地远程镜像列表服务（支持 ETag），并将 ~/.cnpip 重定向到 tmp_path。"""
+    state = {'body': json.dumps(REGISTRY).encode(), 'requests': [], 'status': 200}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state['requests'].append(dict(self.headers))
+            if self.headers.get('If-None-Match') == ETAG:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(state['status'])
+            self.send_header('ETag', ETAG)
+            self.send_header('Last-Modified', 'Mon, 01 Jan 2024 00:00:00 GMT')
+            self.send_header('Content-Length', str(len(state['body'])))
+            self.end_headers()
+            self.wfile.write(state['body'])
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    home = tmp_path / 'cnpip_home'
+    monkeypatch.setattr(mirrors, 'REMOTE_MIRRORS_URL', f'http://127.0.0.1:{server.server_address[1]}/mirrors.json')
+    monkeypatch.setattr(mirrors, 'USER_CONFIG_DIR', home)
+    monkeypatch.setattr(mirrors, 'USER_MIRRORS_FILE', home / 'mirrors.json')
+    monkeypatch.setattr(mirrors, 'REGISTRY_META_FILE', home / 'mirrors.meta.json')
+    state['home'] = home
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+class TestValidateMirrors:
+    def test_valid(self):
+        assert validate_mirrors(REGISTRY) is None
+
+    def test_rich_form(self):
+        assert validate_mirrors({'tuna': {'url': REGISTRY['tuna'], 'region': 'north', 'tags': ['edu']}}) is None
+
+    @pytest.mark.parametrize('data', [[], {}, {'tuna': 42}, {'tuna': 'ftp://example.com/simple'},
+                                      {'tuna': 'not a url'}, {'tuna': {'region': 'north'}},
+                                      {'tuna': {'url': REGISTRY['tuna'], 'tags': 'edu'}},
+                                      {'tuna': {'url': REGISTRY['tuna'], 'priority': 'high'}}])
+    def test_invalid(self, data):
+        assert validate_mirrors(data)
+
+
+class TestUpdateMirrorsFromRemote:
+    def test_first_update_writes_file_and_meta(self, registry):
+        success, msg = update_mirrors_from_remote()
+        assert success, msg
+        assert json.loads((registry['home'] / 'mirrors.json').read_text(encoding='utf-8')) == REGISTRY
+        meta = load_registry_meta()
+        assert meta['etag'] == ETAG
+        assert meta['last_modified']
+        assert 'If-None-Match' not in registry['requests'][0]
+
+    def test_unchanged_list_costs_one_304(self, registry):
+        update_mirrors_from_remote()
+        before = (registry['home'] / 'mirrors.json').stat().st_mtime_ns
+        success, msg = update_mirrors_from_remote()
+        assert success
+        assert '未变化' in msg
+        assert registry['requests'][1]['If-None-Match'] == ETAG
+        assert (registry['home'] / 'mirrors.json').stat().st_mtime_ns == before
+
+    def test_invalid_registry_keeps_existing_file(self, registry):
+        update_mirrors_from_remote()
+        (registry['home'] / 'mirrors.meta.json').unlink()
+        registry['body'] = json.dumps({'tuna': 'javascript:alert(1)'}).encode()
+        success, msg = update_mirrors_from_remote()
+        assert not success
+        assert '校验失败' in msg
+        assert json.loads((registry['home'] / 'mirrors.json').read_text(encoding='utf-8')) == REGISTRY
+
+    def test_malformed_json(self, registry):
+        registry['body'] = b'{not json'
+        success, _ = update_mirrors_from_remote()
+        assert not success
+        assert not (registry['home'] / 'mirrors.json').exists()
+
+    def test_http_error(self, registry):
+        registry['status'] = 500
+        success, msg = update_mirrors_from_remote()
+        assert not success
+        assert '500' in msg
+
+
+class TestLoadMirrors:
+    def test_invalid_user_file_falls_back(self, registry):
+        registry['home'].mkdir()
+        (registry['home'] / 'mirrors.json').write_text('{"tuna": 1}', encoding='utf-8')
+        assert load_mirrors() != {'tuna': 1}
+
+    def test_flat_user_file_still_supported(self, registry):
+        registry['home'].mkdir()
+        (registry['home'] / 'mirrors.json').write_text(json.dumps(REGISTRY), encoding='utf-8')
+        assert load_mirrors() == REGISTRY
+        assert load_mirror_registry()['tuna']['priority'] == 100
+
+    def test_published_legacy_file_stays_flat(self):
+        """已安装的旧版本只认识 {名称: 地址}，mirrors.json 必须保持旧格式。"""
+        with open(mirrors.get_local_mirrors_file(), encoding='utf-8') as f:
+            data = json.load(f)
+        assert data and all(isinstance(url, str) for url in data.values())
+        assert mirrors.REMOTE_MIRRORS_URL.endswith('/mirrors.v2.json')
+
+    def test_packaged_registry_is_rich(self):
+        assert MIRROR_REGISTRY['default']['file_host'] == 'files.pythonhosted.org'
+        assert all(entry['region'] for entry in MIRROR_REGISTRY.values())
+
+    def test_normalize_fills_defaults(self):
+        entry = normalize_mirror_entry({'url': REGISTRY['tuna'], 'tags': ['edu']})
+        assert entry['tags'] == ['edu']
+        assert entry['capabilities'] == [] and entry['region'] is None
+
+
+RICH = {
+    'tuna': normalize_mirror_entry({'url': REGISTRY['tuna'], 'region': 'north', 'tags': ['edu']}),
+    'ustc': normalize_mirror_entry({'url': 'https://pypi.mirrors.ustc.edu.cn/simple', 'region': 'east',
+                                    'tags': ['edu']}),
+    'aliyun': normalize_mirror_entry({'url': 'https://mirrors.aliyun.com/pypi/simple', 'region': 'cn',
+                                      'tags': ['cloud']}),
+    'default': normalize_mirror_entry({'url': REGISTRY['default'], 'region': 'global',
+                                       'capabilities': ['json', 'gzip']}),
+}
+
+
+class TestFilterMirrors:
+    def test_no_filters(self):
+        assert list(filter_mirrors(RICH)) == ['tuna', 'ustc', 'aliyun', 'default']
+
+    def test_regions(self):
+        assert list(filter_mirrors(RICH, regions=['east', 'cn'])) == ['ustc', 'aliyun']
+
+    def test_nationwide_cdn_matches_domestic_region(self):
+        assert list(filter_mirrors(RICH, regions=['east'])) == ['ustc', 'aliyun']
+        assert list(filter_mirrors(RICH, regions=['global'])) == ['default']
+
+    def test_tags_match_capabilities(self):
+        assert list(filter_mirrors(RICH, tags=['json'])) == ['default']
+
+    def test_region_and_tag(self):
+        assert list(filter_mirrors(RICH, regions=['north', 'cn'], tags=['edu'])) == ['tuna']
+
+
+class TestRegionFilterCli:
+    def test_set_probes_only_candidates(self, monkeypatch, fake_uv_config_path):
+        probed = []
+
+        def _fake_probe(mirrors=None):
+            probed.append(mirrors)
+            return [(name, 10.0, url, None) for name, url in mirrors.items()]
+
+        monkeypatch.setattr(module, 'MIRROR_REGISTRY', RICH)
+        monkeypatch.setattr(module, 'probe_mirrors_single_flight', _fake_probe)
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--region', 'east'])
+        module.main()
+        assert list(probed[0]) == ['ustc', 'aliyun']
+
+    def test_no_match_exits(self, monkeypatch):
+        monkeypatch.setattr(module, 'MIRROR_REGISTRY', RICH)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--tag', 'nonexistent'])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
+
+
+def test_probe_ties_broken_by_priority(monkeypatch):
+    monkeypatch.setattr(module, 'MIRROR_REGISTRY', {
+        'a': normalize_mirror_entry({'url': 'https://a.example/simple', 'priority': 50}),
+        'b': normalize_mirror_entry({'url': 'https://b.example/simple', 'priority': 10}),
+    })
+    results = module.probe_mirrors({'a': 'https://a.example/simple', 'b': 'https://b.example/simple'},
+                                   probe=lambda name, url: (name, 5.0, url, None))
+    assert [r[0] for r in results] == ['b', 'a']
+
+
+def test_probe_near_ties_broken_by_priority(monkeypatch):
+    """耗时在误差范围内视为相同并按 priority 排序，明显更慢的镜像不受 priority 影响。"""
+    monkeypatch.setattr(module, 'MIRROR_REGISTRY', {
+        'a': normalize_mirror_entry({'url': 'https://a.example/simple', 'priority': 50}),
+        'b': normalize_mirror_entry({'url': 'https://b.example/simple', 'priority': 10}),
+        'c': normalize_mirror_entry({'url': 'https://c.example/simple', 'priority': 1}),
+        'd': normalize_mirror_entry({'url': 'https://d.example/simple', 'priority': 1}),
+    })
+    speeds = {'a': 100.0, 'b': 108.0, 'c': 200.0, 'd': float('inf')}
+    results = module.probe_mirrors({name: f'https://{name}.example/simple' for name in speeds},
+                                   probe=lambda name, url: (name, speeds[name], url,
+                                                            None if speeds[name] != float('inf') else 'Timeout'))
+    assert [r[0] for r in results] == ['b', 'a', 'c', 'd']
+
+
+class TestBackgroundRefresh:
+    def test_stale_without_user_registry(self, registry):
+        """从未获取过用户列表时视为过期，首次运行即在后台获取。"""
+        assert registry_is_stale()
+
+    def test_first_refresh_without_user_registry(self, registry, monkeypatch):
+        monkeypatch.delenv('CNPIP_NO_AUTO_UPDATE', raising=False)
+        spawned = []
+        monkeypatch.setattr(mirrors.subprocess, 'Popen', lambda *a, **kw: spawned.append(a))
+        assert refresh_mirrors_in_background()
+        # 后台获取失败（例如离线）时也不会每次运行都重试，等到 ttl 之后再检查
+        assert not registry_is_stale()
+        assert not refresh_mirrors_in_background()
+        assert len(spawned) == 1
+
+    def test_stale_after_ttl(self, registry):
+        update_mirrors_from_remote()
+        assert not registry_is_stale()
+        meta = load_registry_meta()
+        meta['checked'] = time.time() - mirrors.REGISTRY_TTL - 1
+        (registry['home'] / 'mirrors.meta.json').write_text(json.dumps(meta), encoding='utf-8')
+        assert registry_is_stale()
+
+    def test_refresh_spawns_once(self, registry, monkeypatch):
+        monkeypatch.delenv('CNPIP_NO_AUTO_UPDATE', raising=False)
+        update_mirrors_from_remote()
+        old = time.time() - mirrors.REGISTRY_TTL - 1
+        (registry['home'] / 'mirrors.meta.json').write_text(json.dumps({'checked': old}), encoding='utf-8')
+        spawned = []
+        monkeypatch.setattr(mirrors.subprocess, 'Popen', lambda *a, **kw: spawned.append(a))
+        assert refresh_mirrors_in_background()
+        assert not refresh_mirrors_in_background()
+        assert len(spawned) == 1
+
+    def test_disabled_by_env(self, registry, monkeypatch):
+        update_mirrors_from_remote()
+        os.utime(registry['home'] / 'mirrors.json', (0, 0))
+        (registry['home'] / 'mirrors.meta.json').unlink()
+        monkeypatch.setenv('CNPIP_NO_AUTO_UPDATE', '1')
+        monkeypatch.setattr(mirrors.subprocess, 'Popen', lambda *a, **kw: pytest.fail('不应启动刷新'))
+        assert registry_is_stale()
+        assert not refresh_mirrors_in_background()
@@ -0,0 +1,130 @@
+"""测试 PEP 691 JSON / gzip 支持检测（list --formats / set --rank-by page）。"""
+import gzip
+import json
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import measure_page_formats, rank_by_page_cost, SIMPLE_JSON_TYPE
+from cnpip.mirrors import MIRRORS
+
+FILES = [f'boto3-1.{i}.0-py3-none-any.whl' for i in range(300)]
+HTML_BODY = ''.join(f'<a href="../../files/{f}#sha256={"0" * 64}">{f}</a><br/>\n' for f in FILES).encode()
+JSON_BODY = json.dumps({'meta': {'api-version': '1.1'}, 'name': 'boto3',
+                        'files': [{'filename': f, 'url': f'../../files/{f}', 'hashes': {}} for f in FILES]}).encode()
+
+
+def start_server(modern):
+    """modern=True 时按 Accept / Accept-Encoding 协商返回 JSON 与 gzip，否则始终返回未压缩的 HTML。"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            accept = self.headers.get('Accept', '')
+            if modern and SIMPLE_JSON_TYPE in accept:
+                content_type, body = SIMPLE_JSON_TYPE, JSON_BODY
+            else:
+                content_type, body = 'text/html', HTML_BODY
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            if modern and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body)
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/simple'
+    return server
+
+
+@pytest.fixture
+def servers():
+    modern, legacy = start_server(True), start_server(False)
+    yield modern, legacy
+    for server in (modern, legacy):
+        server.shutdown()
+        server.server_close()
+
+
+class TestMeasurePageFormats:
+    def test_modern_mirror(self, servers):
+        modern, _ = servers
+        result = measure_page_formats('modern', modern.url)
+        assert result['error'] is None
+        assert result['json'] and result['gzip']
+        assert result['legacy']['content_type'] == 'text/html'
+        assert result['legacy']['bytes'] == len(HTML_BODY)
+        # JSON 与 gzip 的效果分别测量：仅 JSON 不压缩，仅 gzip 仍为 HTML
+        assert result['json_page']['content_type'] == SIMPLE_JSON_TYPE
+        assert result['json_page']['bytes'] == len(JSON_BODY)
+        assert result['gzip_page']['content_type'] == 'text/html'
+        assert result['gzip_page']['content_encoding'] == 'gzip'
+        assert result['negotiated']['bytes'] < result['gzip_page']['bytes'] < result['legacy']['bytes']
+
+    def test_legacy_mirror(self, servers):
+        _, legacy = servers
+        result = measure_page_formats('legacy', legacy.url)
+        assert not result['json'] and not result['gzip']
+        assert result['negotiated']['bytes'] == len(HTML_BODY)
+
+    def test_unreachable_mirror(self):
+        result = measure_page_formats('dead', 'http://127.0.0.1:9/simple')
+        assert result['error']
+        assert not result['json']
+
+
+def make_format(name, ms, json_support=True, gzip_support=True, error=None):
+    page = {'ms': ms, 'bytes': 1, 'content_type': '', 'content_encoding': ''}
+    return {'name': name, 'url': MIRRORS[name], 'json': json_support, 'gzip': gzip_support,
+            'legacy': page, 'json_page': page, 'gzip_page': page, 'negotiated': page, 'error': error}
+
+
+class TestRankByPageCost:
+    def test_sorted_by_negotiated_time(self):
+        ranked = rank_by_page_cost([make_format('tuna', 300), make_format('ustc', 100)])
+        assert [r[0] for r in ranked] == ['ustc', 'tuna']
+
+    def test_tie_prefers_cheaper_representation(self):
+        ranked = rank_by_page_cost([make_format('tuna', 100, json_support=False, gzip_support=False),
+                                    make_format('ustc', 100)])
+        assert ranked[0][0] == 'ustc'
+
+    def test_near_tie_prefers_cheaper_representation(self):
+        # 耗时差异在误差范围内，视为相同
+        ranked = rank_by_page_cost([make_format('tuna', 100.0, json_support=False, gzip_support=False),
+                                    make_format('ustc', 104.5)])
+        assert [r[0] for r in ranked] == ['ustc', 'tuna']
+
+    def test_clear_difference_wins_over_representation(self):
+        ranked = rank_by_page_cost([make_format('tuna', 100, json_support=False, gzip_support=False),
+                                    make_format('ustc', 400)])
+        assert [r[0] for r in ranked] == ['tuna', 'ustc']
+
+    def test_failed_last(self):
+        ranked = rank_by_page_cost([make_format('tuna', 0, error='Timeout'), make_format('ustc', 500)])
+        assert [r[0] for r in ranked] == ['ustc', 'tuna']
+        assert ranked[1][1] == float('inf')
+
+
+def test_set_rank_by_page(monkeypatch, fake_uv_config_path):
+    monkeypatch.setattr(module, 'probe_page_formats',
+                        lambda mirrors: [make_format('tuna', 300), make_format('ustc', 100)])
+    monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--rank-by', 'page'])
+    module.main()
+    assert MIRRORS['ustc'] in fake_uv_config_path.read_text(encoding='utf-8')
+
+
+def test_list_formats(monkeypatch, capsys, servers):
+    modern, legacy = servers
+    monkeypatch.setattr(module, 'MIRRORS', {'modern': modern.url, 'legacy': legacy.url})
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--formats'])
+    module.main()
+    out = capsys.readouterr().out
+    assert 'modern' in out and 'legacy' in out
@@ -0,0 +1,153 @@
+"""测试测速结果的导出与复用（list --export / set --from-results）。"""
+import json
+import sys
+import time
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import export_probe_results, load_probe_results, select_fastest_mirror
+from cnpip.mirrors import MIRRORS
+
+RESULTS = [
+    ('ustc', 80.0, MIRRORS['ustc'], None),
+    ('tuna', 120.5, MIRRORS['tuna'], None),
+    ('huawei', float('inf'), MIRRORS['huawei'], 'Timeout'),
+]
+
+
+def write_results(path, entries, timestamp=None):
+    path.write_text(json.dumps({
+        'version': 1,
+        'timestamp': time.time() if timestamp is None else timestamp,
+        'host': 'node-1',
+        'results': entries,
+    }), encoding='utf-8')
+
+
+class TestExportProbeResults:
+    def test_roundtrip(self, tmp_path):
+        path = tmp_path / 'results.json'
+        success, msg = export_probe_results(RESULTS, path)
+        assert success, msg
+        results, error = load_probe_results(str(path))
+        assert error is None
+        assert [r[0] for r in results] == ['ustc', 'tuna', 'huawei']
+        assert results[0][1] == 80.0
+        assert results[2][1] == float('inf')
+        assert results[2][3] == 'Timeout'
+
+    def test_failed_probe_exported_as_null(self, tmp_path):
+        path = tmp_path / 'results.json'
+        export_probe_results(RESULTS, path)
+        data = json.loads(path.read_text(encoding='utf-8'))
+        assert data['results'][2]['latency_ms'] is None
+
+    def test_creates_parent_directories(self, tmp_path):
+        path = tmp_path / 'shared' / 'results.json'
+        success, msg = export_probe_results(RESULTS, path)
+        assert success, msg
+        assert path.exists()
+
+
+class TestLoadProbeResults:
+    def test_missing_file(self, tmp_path):
+        results, error = load_probe_results(str(tmp_path / 'missing.json'))
+        assert results is None
+        assert error
+
+    def test_invalid_json(self, tmp_path):
+        path = tmp_path / 'results.json'
+        path.write_text('not json', encoding='utf-8')
+        results, error = load_probe_results(str(path))
+        assert results is None
+
+    def test_rejects_stale_results(self, tmp_path):
+        path = tmp_path / 'results.json'
+        write_results(path, [{'name': 'tuna', 'url': MIRRORS['tuna'], 'latency_ms': 10, 'error': None}],
+                      timestamp=time.time() - 3600)
+        results, error = load_probe_results(str(path), max_age=60)
+        assert results is None
+        assert '过期' in error
+
+    def test_drops_entries_unknown_to_local_registry(self, tmp_path):
+        path = tmp_path / 'results.json'
+        write_results(path, [
+            {'name': 'evil', 'url': 'https://evil.example/simple', 'latency_ms': 1, 'error': None},
+            {'name': 'tuna', 'url': 'https://evil.example/simple', 'latency_ms': 2, 'error': None},
+            {'name': 'ustc', 'url': MIRRORS['ustc'], 'latency_ms': 50, 'error': None},
+        ])
+        results, error = load_probe_results(str(path))
+        assert error is None
+        assert [r[0] for r in results] == ['ustc']
+
+    def test_no_matching_entries(self, tmp_path):
+        path = tmp_path / 'results.json'
+        write_results(path, [{'name': 'evil', 'url': 'https://evil.example/simple', 'latency_ms': 1, 'error': None}])
+        results, error = load_probe_results(str(path))
+        assert results is None
+
+    def test_rejects_conda_results(self, tmp_path):
+        path = tmp_path / 'results.json'
+        export_probe_results([('tuna', 10.0, MIRRORS['tuna'], None)], path, kind='conda')
+        results, error = load_probe_results(str(path))
+        assert results is None
+        assert 'conda' in error
+
+    def test_sorted_by_latency(self, tmp_path):
+        path = tmp_path / 'results.json'
+        write_results(path, [
+            {'name': 'tuna', 'url': MIRRORS['tuna'], 'latency_ms': 300, 'error': None},
+            {'name': 'ustc', 'url': MIRRORS['ustc'], 'latency_ms': 100, 'error': None},
+        ])
+        results, _ = load_probe_results(str(path))
+        assert select_fastest_mirror(results) == 'ustc'
+
+
+class TestSetFromResults:
+    def test_set_uses_results_without_probing(self, monkeypatch, tmp_path, fake_uv_config_path):
+        path = tmp_path / 'results.json'
+        export_probe_results(RESULTS, path)
+
+        def _no_probe():
+            raise AssertionError('不应重新测速')
+
+        monkeypatch.setattr(module, 'list_mirrors', _no_probe)
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--from-results', str(path)])
+        module.main()
+        assert MIRRORS['ustc'] in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_set_falls_back_to_probe_when_stale(self, monkeypatch, tmp_path, fake_uv_config_path):
+        path = tmp_path / 'results.json'
+        write_results(path, [{'name': 'ustc', 'url': MIRRORS['ustc'], 'latency_ms': 10, 'error': None}],
+                      timestamp=time.time() - 3600)
+        monkeypatch.setattr(module, 'list_mirrors', lambda: [('tuna', 5.0, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--from-results', str(path), '--max-age', '60'])
+        module.main()
+        assert MIRRORS['tuna'] in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_list_export(self, monkeypatch, tmp_path):
+        path = tmp_path / 'results.json'
+        monkeypatch.setattr(module, 'measure_mirror_speed', lambda name, url: (name, 42.0, url, None))
+        monkeypatch.setattr(module, 'report_redirects', lambda results: None)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--export', str(path)])
+        module.main()
+        data = json.loads(path.read_text(encoding='utf-8'))
+        assert {entry['name'] for entry in data['results']} == set(MIRRORS)
+
+    def test_list_conda_export_records_kind(self, monkeypatch, tmp_path):
+        path = tmp_path / 'results.json'
+        monkeypatch.setattr(module, 'list_conda_mirrors', lambda: [('tuna', 42.0, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--conda', '--export', str(path)])
+        module.main()
+        assert json.loads(path.read_text(encoding='utf-8'))['kind'] == 'conda'
+
+    @pytest.mark.parametrize('args', [['tuna'], ['--conda'], ['--uv-python']])
+    def test_set_rejects_from_results_when_unused(self, monkeypatch, tmp_path, args):
+        path = tmp_path / 'results.json'
+        export_probe_results(RESULTS, path)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set'] + args + ['--from-results', str(path)])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
@@ -0,0 +1,99 @@
+"""测试重定向链检测、缓存，以及 set --resolve-redirects 写入最终地址。"""
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import trace_redirects, get_redirect_traces, report_redirects, load_redirect_cache
+
+ROUTES = {
+    '/old': (301, '/moved'),
+    '/moved': (308, '/simple/'),
+    '/loop': (302, '/loop'),
+    '/missing': (404, None),
+}
+
+
+@pytest.fixture
+def redirect_server():
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            status, location = ROUTES.get(self.path, (200, None))
+            self.send_response(status)
+            if location:
+                self.send_header('Location', location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        do_GET = do_HEAD
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestTraceRedirects:
+    def test_records_full_chain(self, redirect_server):
+        trace = trace_redirects(redirect_server.url + '/old')
+        assert trace['error'] is None
+        assert [hop['status'] for hop in trace['chain']] == [301, 308, 200]
+        assert trace['final_url'] == redirect_server.url + '/simple/'
+        assert trace['hops'] == 2
+        assert trace['redirect_ms'] >= 0
+
+    def test_no_redirect(self, redirect_server):
+        trace = trace_redirects(redirect_server.url + '/simple/')
+        assert trace['hops'] == 0
+        assert trace['final_url'] == redirect_server.url + '/simple/'
+
+    def test_redirect_loop(self, redirect_server):
+        trace = trace_redirects(redirect_server.url + '/loop', max_hops=3)
+        assert trace['error']
+
+    def test_http_error(self, redirect_server):
+        trace = trace_redirects(redirect_server.url + '/missing')
+        assert trace['error']
+
+
+class TestRedirectCache:
+    def test_caches_successful_traces(self, redirect_server, monkeypatch):
+        url = redirect_server.url + '/old'
+        get_redirect_traces([url])
+        assert load_redirect_cache()[url]['final_url'] == redirect_server.url + '/simple/'
+
+        def _no_trace(url):
+            raise AssertionError('应使用缓存')
+
+        monkeypatch.setattr(module, 'trace_redirects', _no_trace)
+        assert get_redirect_traces([url])[url]['hops'] == 2
+
+    def test_does_not_cache_errors(self, redirect_server):
+        url = redirect_server.url + '/missing'
+        get_redirect_traces([url])
+        assert url not in load_redirect_cache()
+
+    def test_report_flags_redirected_mirrors(self, redirect_server, capsys):
+        results = [('slow', 10.0, redirect_server.url + '/old', None),
+                   ('direct', 12.0, redirect_server.url + '/simple/', None)]
+        report_redirects(results)
+        out = capsys.readouterr().out
+        assert 'slow: 2 跳' in out
+        assert 'direct:' not in out
+
+
+class TestSetResolveRedirects:
+    def test_writes_final_url(self, redirect_server, monkeypatch, fake_uv_config_path):
+        monkeypatch.setitem(module.MIRRORS, 'local', redirect_server.url + '/old')
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'local', '--uv', '--resolve-redirects'])
+        module.main()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert f'url = "{redirect_server.url}/simple/"' in content
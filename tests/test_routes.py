@@ -0,0 +1,124 @@
+"""测试直连 / 代理路由对比（list --routes、set --routes），使用本地替身代理。"""
+import sys
+import threading
+import time
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (DIRECT_ROUTE, best_route, get_configured_proxies, measure_route, probe_routes,
+                         rank_by_route)
+
+PROXY_VARS = ('http_proxy', 'https_proxy', 'all_proxy', 'no_proxy',
+              'HTTP_PROXY', 'HTTPS_PROXY', 'ALL_PROXY', 'NO_PROXY')
+# 只能经代理访问的镜像：直连时域名无法解析
+PROXY_ONLY_URL = 'http://mirror.invalid/simple/'
+
+
+@pytest.fixture(autouse=True)
+def no_proxy_env(monkeypatch):
+    for var in PROXY_VARS:
+        monkeypatch.delenv(var, raising=False)
+    monkeypatch.setattr(module, 'read_pip_config_values', lambda: {})
+
+
+@pytest.fixture
+def proxy(static_server):
+    """替身代理：把任意主机的请求转发到 static_server，可设置额外延迟，记录经过的请求。"""
+    state = {'delay': 0.0, 'requests': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_HEAD(self):
+            state['requests'].append(self.path)
+            time.sleep(state['delay'])
+            parsed = urlparse(self.path)
+            opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+            try:
+                with opener.open(urllib.request.Request(static_server.url + parsed.path, method='HEAD')) as resp:
+                    status = resp.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    (static_server.root / 'simple').mkdir(exist_ok=True)
+    state['url'] = f'http://127.0.0.1:{server.server_address[1]}'
+    state['mirror_url'] = static_server.url + '/simple/'
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+class TestConfiguredProxies:
+    def test_env_and_pip_config(self, monkeypatch):
+        monkeypatch.setenv('HTTPS_PROXY', 'http://proxy.corp:3128')
+        monkeypatch.setenv('HTTP_PROXY', 'http://proxy.corp:3128')
+        monkeypatch.setattr(module, 'read_pip_config_values', lambda: {'proxy': 'user:pw@other.corp:8080'})
+        assert get_configured_proxies() == ['http://proxy.corp:3128', 'http://user:pw@other.corp:8080']
+
+    def test_none(self):
+        assert get_configured_proxies() == []
+
+
+class TestMeasureRoute:
+    def test_direct_does_not_touch_proxy(self, proxy, monkeypatch):
+        monkeypatch.setenv('HTTP_PROXY', proxy['url'])
+        result = measure_route('local', proxy['mirror_url'], DIRECT_ROUTE)
+        assert result['error'] is None
+        assert proxy['requests'] == []
+
+    def test_through_proxy(self, proxy):
+        result = measure_route('remote', PROXY_ONLY_URL, proxy['url'])
+        assert result['error'] is None
+        assert proxy['requests'] == [PROXY_ONLY_URL] * module.ROUTE_SAMPLES
+        assert measure_route('remote', PROXY_ONLY_URL, DIRECT_ROUTE)['error']
+
+
+class TestRouteMatrix:
+    def test_best_route_per_mirror(self, proxy, monkeypatch, capsys):
+        proxy['delay'] = 0.1
+        monkeypatch.setenv('HTTP_PROXY', proxy['url'])
+        results = probe_routes({'local': proxy['mirror_url'], 'remote': PROXY_ONLY_URL})
+        assert best_route(results, 'local')['route'] == DIRECT_ROUTE
+        assert best_route(results, 'remote')['route'] == proxy['url']
+        ranked = rank_by_route(results)
+        assert [r[0] for r in ranked] == ['local', 'remote']
+        out = capsys.readouterr().out
+        assert '直连' in out and urlparse(proxy['url']).netloc in out
+
+    def test_unreachable_everywhere(self, proxy):
+        results = probe_routes({'down': 'http://127.0.0.1:9/simple'}, [DIRECT_ROUTE])
+        assert best_route(results, 'down') is None
+        assert rank_by_route(results)[0][1] == float('inf')
+
+
+class TestSetRoutes:
+    def test_writes_pip_proxy_for_proxied_mirror(self, proxy, monkeypatch, fake_pip_config_path):
+        monkeypatch.setenv('HTTP_PROXY', proxy['url'])
+        monkeypatch.setattr(module, 'MIRRORS', {'remote': PROXY_ONLY_URL})
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(module, 'discover_file_hosts', lambda urls: {})
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--user', '--routes'])
+        module.main()
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert f'index-url = {PROXY_ONLY_URL}' in content
+        assert f'proxy = {proxy["url"]}' in content
+
+    def test_direct_mirror_gets_no_proxy_hint(self, proxy, monkeypatch, fake_pip_config_path, capsys):
+        proxy['delay'] = 0.1
+        monkeypatch.setenv('HTTP_PROXY', proxy['url'])
+        monkeypatch.setattr(module, 'MIRRORS', {'local': proxy['mirror_url']})
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'local', '--user', '--routes'])
+        module.main()
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert 'proxy' not in content
+        assert 'NO_PROXY=127.0.0.1' in capsys.readouterr().out
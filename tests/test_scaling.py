@@ -0,0 +1,125 @@
+"""测试并发扩展测速（list --scaling / set --rank-by throughput）。"""
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import measure_concurrency_scaling, throughput_at, rank_by_throughput
+from cnpip.mirrors import MIRRORS
+
+BODY = b'<a href="pip-24.0.tar.gz">pip-24.0.tar.gz</a>\n' * 500
+
+
+@pytest.fixture
+def throttling_mirror():
+    """并发连接数超过 limit 时返回 429 的本地镜像，每个响应延迟 50 ms 以保证请求重叠。"""
+    state = {'active': 0, 'limit': 4}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                state['active'] += 1
+                over = state['active'] > state['limit']
+            try:
+                time.sleep(0.05)
+                if over:
+                    self.send_response(429)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(BODY)))
+                self.end_headers()
+                self.wfile.write(BODY)
+            finally:
+                with lock:
+                    state['active'] -= 1
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/simple'
+    server.state = state
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_scaling(name, throughputs):
+    return {
+        'name': name, 'url': MIRRORS[name], 'saturation': None,
+        'levels': [{'concurrency': c, 'throughput': t, 'error_rate': 0.0, 'throttled': False}
+                   for c, t in throughputs],
+    }
+
+
+class TestMeasureConcurrencyScaling:
+    def test_detects_throttling_and_saturation(self, throttling_mirror):
+        scaling = measure_concurrency_scaling('local', throttling_mirror.url, levels=(1, 4, 16))
+        by_level = {level['concurrency']: level for level in scaling['levels']}
+        assert by_level[1]['error_rate'] == 0
+        assert by_level[4]['error_rate'] == 0
+        assert by_level[16]['throttled']
+        assert by_level[16]['error_rate'] > 0
+        assert scaling['saturation'] == 4
+
+    def test_unreachable_mirror(self):
+        scaling = measure_concurrency_scaling('dead', 'http://127.0.0.1:9/simple', levels=(1, 4))
+        # 错误率 100% 时不再继续加压
+        assert len(scaling['levels']) == 1
+        assert scaling['saturation'] is None
+
+
+class TestRankByThroughput:
+    def test_throughput_at_uses_highest_level_not_above(self):
+        scaling = make_scaling('tuna', [(1, 100), (4, 400), (16, 500)])
+        assert throughput_at(scaling, 8) == 400
+        assert throughput_at(scaling, 16) == 500
+
+    def test_ranks_by_throughput_at_concurrency(self):
+        # ustc 单连接更快，但在并发 16 时 tuna 吞吐更高
+        scalings = [
+            make_scaling('ustc', [(1, 300), (4, 320), (16, 330)]),
+            make_scaling('tuna', [(1, 100), (4, 400), (16, 1600)]),
+            make_scaling('huawei', [(1, 0)]),
+        ]
+        ranked = rank_by_throughput(scalings, 16)
+        assert [r[0] for r in ranked] == ['tuna', 'ustc', 'huawei']
+        assert ranked[2][3] is not None
+        assert [r[0] for r in rank_by_throughput(scalings, 1)][:2] == ['ustc', 'tuna']
+
+    def test_cli_set_rank_by_throughput(self, monkeypatch, fake_uv_config_path):
+        scalings = {
+            'ustc': make_scaling('ustc', [(1, 300), (4, 320), (16, 330)]),
+            'tuna': make_scaling('tuna', [(1, 100), (4, 400), (16, 1600)]),
+        }
+        monkeypatch.setattr(module, 'measure_concurrency_scaling',
+                            lambda name, url, levels: scalings.get(name, make_scaling(name, [(1, 0)])))
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--rank-by', 'throughput'])
+        module.main()
+        assert MIRRORS['tuna'] in fake_uv_config_path.read_text(encoding='utf-8')
+
+
+class TestArguments:
+    @pytest.mark.parametrize('value', ['0', '-2'])
+    def test_concurrency_must_be_positive(self, monkeypatch, value):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--scaling', '--concurrency', value])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 2
+
+    def test_export_rejected_with_throughput_ranking(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(module, 'probe_concurrency_scaling', lambda *a: pytest.fail('不应测速'))
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--rank-by', 'throughput',
+                                          '--export', str(tmp_path / 'r.json')])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
+        assert not (tmp_path / 'r.json').exists()
@@ -0,0 +1,159 @@
+"""测试按时段的测速画像与 set --schedule。"""
+import json
+import sys
+import time
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (record_probe_history, hourly_history_stats, rank_from_hourly_history,
+                         build_schedule_plan)
+from cnpip.mirrors import MIRRORS
+
+
+def at_hour(hour, days_ago=1):
+    """返回 days_ago 天前本地时间 hour:30 的时间戳。"""
+    t = time.localtime(time.time() - days_ago * 86400)
+    return time.mktime((t.tm_year, t.tm_mon, t.tm_mday, hour, 30, 0, 0, 0, -1))
+
+
+def fill_history(hour, latencies, samples=module.HOURLY_MIN_SAMPLES):
+    """在 hour 时段为每个镜像写入 samples 天的记录，latencies 为 {name: ms}。"""
+    for day in range(1, samples + 1):
+        record_probe_history([(name, ms, MIRRORS[name], None) for name, ms in latencies.items()],
+                             timestamp=at_hour(hour, day))
+
+
+class TestHourlyProfiles:
+    def test_grouped_by_local_hour(self):
+        fill_history(3, {'tuna': 20.0, 'ustc': 90.0})
+        fill_history(14, {'tuna': 400.0, 'ustc': 60.0})
+        stats = hourly_history_stats()
+        assert set(stats) == {3, 14}
+        assert stats[3]['tuna']['ewma_ms'] == 20.0
+        assert stats[14]['ustc']['samples'] == module.HOURLY_MIN_SAMPLES
+
+    def test_rank_by_hour(self):
+        fill_history(3, {'tuna': 20.0, 'ustc': 90.0})
+        fill_history(14, {'tuna': 400.0, 'ustc': 60.0})
+        assert rank_from_hourly_history(3)[0][0] == 'tuna'
+        assert rank_from_hourly_history(14)[0][0] == 'ustc'
+
+    def test_insufficient_samples(self):
+        fill_history(3, {'tuna': 20.0}, samples=module.HOURLY_MIN_SAMPLES - 1)
+        assert rank_from_hourly_history(3) is None
+
+    def test_ignores_records_for_changed_urls(self):
+        fill_history(3, {'tuna': 20.0})
+        assert rank_from_hourly_history(3, {'tuna': 'https://elsewhere.example/simple'}) is None
+
+    def test_plan(self):
+        fill_history(3, {'tuna': 20.0, 'ustc': 90.0})
+        fill_history(14, {'tuna': 400.0, 'ustc': 60.0})
+        plan = build_schedule_plan()
+        assert plan[3] == 'tuna' and plan[14] == 'ustc'
+        assert plan[8] is None
+        assert len(plan) == 24
+
+
+class TestSetWithHistory:
+    @pytest.fixture
+    def uv(self, monkeypatch, fake_uv_config_path):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        return fake_uv_config_path
+
+    def test_schedule_skips_live_probe_with_recent_history(self, monkeypatch, uv):
+        fill_history(time.localtime().tm_hour, {'tuna': 300.0, 'ustc': 40.0})
+        record_probe_history([('ustc', 40.0, MIRRORS['ustc'], None)])
+        monkeypatch.setattr(module, 'probe_ranked_mirrors', lambda args, mirrors=None: pytest.fail('不应实时测速'))
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--schedule'])
+        module.main()
+        assert MIRRORS['ustc'] in uv.read_text(encoding='utf-8')
+
+    def test_plain_set_always_probes(self, monkeypatch, uv):
+        fill_history(time.localtime().tm_hour, {'tuna': 300.0, 'ustc': 40.0})
+        record_probe_history([('ustc', 40.0, MIRRORS['ustc'], None)])
+        monkeypatch.setattr(module, 'probe_ranked_mirrors',
+                            lambda args, mirrors=None: [('tuna', 10.0, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv'])
+        module.main()
+        assert MIRRORS['tuna'] in uv.read_text(encoding='utf-8')
+
+    def test_schedule_probes_when_history_is_old(self, monkeypatch, uv):
+        fill_history(time.localtime().tm_hour, {'tuna': 300.0, 'ustc': 40.0})
+        monkeypatch.setattr(module, 'HOURLY_MAX_AGE', 3600)
+        monkeypatch.setattr(module, 'probe_ranked_mirrors',
+                            lambda args, mirrors=None: [('tuna', 10.0, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--schedule'])
+        module.main()
+        assert MIRRORS['tuna'] in uv.read_text(encoding='utf-8')
+
+    def test_live_flag_forces_probe(self, monkeypatch, uv):
+        fill_history(time.localtime().tm_hour, {'tuna': 300.0, 'ustc': 40.0})
+        monkeypatch.setattr(module, 'probe_ranked_mirrors',
+                            lambda args, mirrors=None: [('tuna', 10.0, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--schedule', '--live'])
+        module.main()
+        assert MIRRORS['tuna'] in uv.read_text(encoding='utf-8')
+
+    def test_schedule_saves_plan_and_prints_job(self, monkeypatch, capsys, uv):
+        hour = time.localtime().tm_hour
+        fill_history(hour, {'tuna': 300.0, 'ustc': 40.0})
+        record_probe_history([('ustc', 40.0, MIRRORS['ustc'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--schedule', '--region', 'east',
+                                          '--rank-by', 'latency', '--tune', '--resolve-redirects'])
+        monkeypatch.setattr(module, 'get_redirect_traces', lambda urls: {
+            url: {'final_url': url, 'error': None} for url in urls})
+        monkeypatch.setattr(module, 'tune_network_settings', lambda *a: True)
+        module.main()
+        data = json.loads(module.SCHEDULE_FILE.read_text(encoding='utf-8'))
+        assert data['plan'][str(hour)] == 'ustc'
+        assert '--uv' in data['command'] and '--region east' in data['command']
+        assert '--tune' in data['command'] and '--resolve-redirects' in data['command']
+        out = capsys.readouterr().out
+        assert 'set --schedule' in out
+        assert MIRRORS['ustc'] in uv.read_text(encoding='utf-8')
+
+    def test_command_keeps_rank_and_venv_root(self, tmp_path):
+        args = module.argparse.Namespace(
+            global_=False, user=False, venv=False, uv=False, all_tools=False, tune=False, resolve_redirects=False,
+            routes=False, region=None, tag=None, heavy=None, all_venvs=str(tmp_path), rank_by='throughput',
+            concurrency=4, fallbacks=0)
+        command = module.get_schedule_command(args)
+        assert f'--all-venvs {tmp_path}' in command
+        assert '--rank-by throughput --concurrency 4' in command
+
+    def test_command_quotes_for_shell_and_windows(self, monkeypatch):
+        args = module.argparse.Namespace(
+            global_=False, user=False, venv=False, uv=True, all_tools=False, tune=False, resolve_redirects=False,
+            routes=False, region=None, tag=None, heavy='heavy=torch,nvidia-*', all_venvs=None, rank_by='latency',
+            concurrency=4, fallbacks=0)
+        monkeypatch.setattr(sys, 'executable', '/opt/my python/bin/python')
+        posix = module.get_schedule_command(args, 'Linux')
+        assert module.shlex.split(posix)[:2] == ['/opt/my python/bin/python', '-m']
+        assert "'heavy=torch,nvidia-*'" in posix
+        assert '--scheduled' in posix
+
+        monkeypatch.setattr(sys, 'executable', r'C:\Program Files\Python\python.exe')
+        windows = module.get_schedule_command(args, 'Windows')
+        assert windows.startswith(r'"C:\Program Files\Python\python.exe" -m cnpip.cnpip')
+
+    def test_scheduled_run_prints_no_instructions(self, monkeypatch, capsys, uv):
+        hour = time.localtime().tm_hour
+        fill_history(hour, {'tuna': 300.0, 'ustc': 40.0})
+        record_probe_history([('ustc', 40.0, MIRRORS['ustc'], None)])
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--schedule', '--scheduled'])
+        module.main()
+        out = capsys.readouterr().out
+        assert 'crontab' not in out and 'schtasks' not in out
+        assert MIRRORS['ustc'] in uv.read_text(encoding='utf-8')
+
+    def test_saved_plan_round_trip(self):
+        hour = time.localtime().tm_hour
+        module.save_schedule_plan({hour: 'ustc'}, 'cnpip set --schedule')
+        assert module.load_schedule_plan()['plan'][str(hour)] == 'ustc'
+
+    def test_schedule_rejects_explicit_mirror(self, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--schedule'])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
@@ -0,0 +1,154 @@
+"""测试单飞测速（跨进程共享一次测速）与配置文件的原子写入。"""
+import os
+import threading
+import time
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import atomic_write_text, export_probe_results, probe_mirrors_single_flight
+from cnpip.mirrors import MIRRORS
+
+RESULTS = [('ustc', 80.0, MIRRORS['ustc'], None)]
+
+
+@pytest.fixture
+def probe_counter(monkeypatch):
+    calls = []
+
+    def _fake_list_mirrors():
+        calls.append(1)
+        return list(RESULTS)
+
+    monkeypatch.setattr(module, 'list_mirrors', _fake_list_mirrors)
+    return calls
+
+
+class TestProbeSingleFlight:
+    def test_probes_and_writes_cache(self, probe_counter, isolated_probe_cache):
+        results = probe_mirrors_single_flight()
+        assert results == RESULTS
+        assert len(probe_counter) == 1
+        assert module.PROBE_CACHE_FILE.exists()
+        assert not module.PROBE_LOCK_FILE.exists()
+
+    def test_sequential_run_does_not_reuse_cache(self, probe_counter):
+        export_probe_results(RESULTS, module.PROBE_CACHE_FILE)
+        probe_mirrors_single_flight()
+        assert len(probe_counter) == 1
+
+    def test_waits_for_lock_holder(self, probe_counter, monkeypatch):
+        monkeypatch.setattr(module, 'PROBE_LOCK_POLL', 0.01)
+        module.PROBE_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.PROBE_LOCK_FILE.write_text('{}', encoding='utf-8')
+
+        def _finish_probe():
+            time.sleep(0.1)
+            export_probe_results(RESULTS, module.PROBE_CACHE_FILE)
+            os.remove(str(module.PROBE_LOCK_FILE))
+
+        holder = threading.Thread(target=_finish_probe)
+        holder.start()
+        results = probe_mirrors_single_flight()
+        holder.join()
+        assert [r[0] for r in results] == ['ustc']
+        assert probe_counter == []
+
+    def test_recovers_stale_lock(self, probe_counter, monkeypatch):
+        module.PROBE_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.PROBE_LOCK_FILE.write_text('{}', encoding='utf-8')
+        old = time.time() - module.PROBE_LOCK_STALE - 10
+        os.utime(str(module.PROBE_LOCK_FILE), (old, old))
+        results = probe_mirrors_single_flight()
+        assert results == RESULTS
+        assert len(probe_counter) == 1
+        assert not module.PROBE_LOCK_FILE.exists()
+
+    def test_does_not_break_replaced_lock(self, probe_counter, monkeypatch):
+        """判定过期后锁已被其他进程换成新锁时不移除。"""
+        module.PROBE_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.PROBE_LOCK_FILE.write_text('{}', encoding='utf-8')
+        old = time.time() - module.PROBE_LOCK_STALE - 10
+        os.utime(str(module.PROBE_LOCK_FILE), (old, old))
+        identities = iter([(1, 1), (2, 2)])
+        monkeypatch.setattr(module, '_lock_identity', lambda st: next(identities))
+        assert not module._break_stale_probe_lock()
+        assert module.PROBE_LOCK_FILE.exists()
+        assert not module.PROBE_LOCK_FILE.with_name('probe.lock.break').exists()
+
+    def test_one_breaker_at_a_time(self, probe_counter):
+        module.PROBE_LOCK_FILE.parent.mkdir(parents=True, exist_ok=True)
+        module.PROBE_LOCK_FILE.write_text('{}', encoding='utf-8')
+        old = time.time() - module.PROBE_LOCK_STALE - 10
+        os.utime(str(module.PROBE_LOCK_FILE), (old, old))
+        module.PROBE_LOCK_FILE.with_name('probe.lock.break').write_text('', encoding='utf-8')
+        assert not module._break_stale_probe_lock()
+        assert module.PROBE_LOCK_FILE.exists()
+
+    def test_heartbeat_keeps_slow_probe_alive(self, monkeypatch):
+        monkeypatch.setattr(module, 'PROBE_LOCK_HEARTBEAT', 0.01)
+        ages = []
+
+        def _slow_list_mirrors():
+            old = time.time() - module.PROBE_LOCK_STALE - 10
+            os.utime(str(module.PROBE_LOCK_FILE), (old, old))
+            time.sleep(0.1)
+            ages.append(time.time() - module.PROBE_LOCK_FILE.stat().st_mtime)
+            return list(RESULTS)
+
+        monkeypatch.setattr(module, 'list_mirrors', _slow_list_mirrors)
+        probe_mirrors_single_flight()
+        assert ages[0] < module.PROBE_LOCK_STALE
+
+    def test_concurrent_callers_probe_once(self, probe_counter, monkeypatch):
+        monkeypatch.setattr(module, 'PROBE_LOCK_POLL', 0.01)
+
+        def _slow_list_mirrors():
+            probe_counter.append(1)
+            time.sleep(0.1)
+            return list(RESULTS)
+
+        monkeypatch.setattr(module, 'list_mirrors', _slow_list_mirrors)
+        outputs = []
+        threads = [threading.Thread(target=lambda: outputs.append(probe_mirrors_single_flight()))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(probe_counter) == 1
+        assert len(outputs) == 5
+
+
+class TestAtomicWriteText:
+    def test_writes_content(self, tmp_path):
+        path = tmp_path / 'uv.toml'
+        atomic_write_text(path, 'hello\n')
+        assert path.read_text(encoding='utf-8') == 'hello\n'
+
+    def test_replaces_existing_without_leftovers(self, tmp_path):
+        path = tmp_path / 'pip.conf'
+        path.write_text('old', encoding='utf-8')
+        atomic_write_text(path, 'new')
+        assert path.read_text(encoding='utf-8') == 'new'
+        assert [p.name for p in tmp_path.iterdir()] == ['pip.conf']
+
+    @pytest.mark.skipif(os.name == 'nt', reason='POSIX 权限位')
+    def test_preserves_file_mode(self, tmp_path):
+        path = tmp_path / 'pip.conf'
+        path.write_text('old', encoding='utf-8')
+        os.chmod(str(path), 0o600)
+        atomic_write_text(path, 'new')
+        assert path.stat().st_mode & 0o777 == 0o600
+
+    @pytest.mark.skipif(os.name == 'nt', reason='创建符号链接需要额外权限')
+    def test_writes_through_symlink(self, tmp_path):
+        dotfiles = tmp_path / 'dotfiles'
+        dotfiles.mkdir()
+        real = dotfiles / 'real.toml'
+        real.write_text('old', encoding='utf-8')
+        link = tmp_path / 'link.toml'
+        link.symlink_to(real)
+        atomic_write_text(link, 'new')
+        assert link.is_symlink()
+        assert real.read_text(encoding='utf-8') == 'new'
+        assert [p.name for p in dotfiles.iterdir()] == ['real.toml']
@@ -0,0 +1,245 @@
+"""测试本地静态镜像同步（cnpip sync），使用本地静态文件服务作为上游镜像。"""
+import hashlib
+import json
+import subprocess
+import sys
+import pytest
+
+import cnpip.cnpip as module
+import cnpip.mirrors as mirrors_module
+from cnpip.cnpip import (SYNC_MANIFEST, canonicalize_name, parse_distribution_filename, parse_pinned_requirements,
+                         parse_project_links, sync_mirror)
+from cnpip.mirrors import load_local_mirrors, register_local_mirror
+from .test_verify import build_wheel, pip_available
+
+
+def publish(root, project, files, sha256=True):
+    """在上游镜像中发布 project 的文件 {文件名: 内容}，生成带 sha256 片段的项目页。"""
+    (root / 'files').mkdir(exist_ok=True)
+    anchors = []
+    for file_name, content in files.items():
+        (root / 'files' / file_name).write_bytes(content)
+        fragment = f'#sha256={hashlib.sha256(content).hexdigest()}' if sha256 else ''
+        anchors.append(f'<a href="../../files/{file_name}{fragment}" data-requires-python="&gt;=3.7">{file_name}</a>')
+    (root / 'simple' / project).mkdir(parents=True, exist_ok=True)
+    (root / 'simple' / project / 'index.html').write_text('\n'.join(anchors) + '\n', encoding='utf-8')
+
+
+@pytest.fixture
+def upstream(static_server):
+    wheel_name, wheel = build_wheel('demo', '1.0')
+    old_name, old_wheel = build_wheel('demo', '0.9')
+    publish(static_server.root, 'demo', {wheel_name: wheel, old_name: old_wheel, 'demo-1.0.tar.gz': b'sdist'})
+    static_server.sources = {'local': static_server.url + '/simple'}
+    return static_server
+
+
+class TestParsing:
+    def test_canonicalize_name(self):
+        assert canonicalize_name('Foo_Bar.baz') == 'foo-bar-baz'
+
+    def test_pinned_requirements(self, tmp_path):
+        path = tmp_path / 'requirements.txt'
+        path.write_text('# lock\n--index-url https://example.com/simple\nRequests[socks]==2.31.0 \\\n'
+                        '    --hash=sha256:abc\nidna==3.4  # via requests\nclick>=8\n'
+                        'colorama==0.4.6 ; sys_platform == "win32"\n', encoding='utf-8')
+        pins, unpinned = parse_pinned_requirements(path)
+        assert pins == {'requests': '2.31.0', 'idna': '3.4', 'colorama': '0.4.6'}
+        assert unpinned == ['click>=8']
+
+    @pytest.mark.parametrize('file_name, expected', [
+        ('Foo_Bar-1.0-py3-none-any.whl', ('foo-bar', '1.0')),
+        ('foo-bar-1.0.tar.gz', ('foo-bar', '1.0')),
+        ('foo-1.0.exe', None),
+    ])
+    def test_distribution_filename(self, file_name, expected):
+        assert parse_distribution_filename(file_name) == expected
+
+    def test_project_links(self):
+        page = '<a href="../../packages/ab/demo-1.0.tar.gz#sha256=ff" data-requires-python="&gt;=3.8">x</a>'
+        links = parse_project_links(page, 'https://mirror.example/simple/demo/')
+        assert links == [{'filename': 'demo-1.0.tar.gz', 'url': 'https://mirror.example/packages/ab/demo-1.0.tar.gz',
+                          'sha256': 'ff', 'requires_python': '>=3.8'}]
+
+
+class TestSyncMirror:
+    def test_builds_static_index(self, upstream, tmp_path):
+        dest = tmp_path / 'pypi'
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert summary['failed'] == []
+        assert summary['downloaded'] == 2
+        assert sorted(p.name for p in (dest / 'packages').iterdir()) == ['demo-1.0-py3-none-any.whl',
+                                                                       'demo-1.0.tar.gz']
+        project_page = (dest / 'simple' / 'demo' / 'index.html').read_text(encoding='utf-8')
+        assert '../../packages/demo-1.0.tar.gz#sha256=' in project_page
+        assert 'data-requires-python="&gt;=3.7"' in project_page
+        assert 'href="demo/"' in (dest / 'simple' / 'index.html').read_text(encoding='utf-8')
+
+    def test_second_run_is_incremental(self, upstream, tmp_path):
+        dest = tmp_path / 'pypi'
+        sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert summary['downloaded'] == 0
+        assert summary['skipped'] == 2
+
+    def test_changed_file_is_downloaded_again(self, upstream, tmp_path):
+        dest = tmp_path / 'pypi'
+        sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        (dest / 'packages' / 'demo-1.0.tar.gz').write_bytes(b'truncated')
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert summary['downloaded'] == 1
+        assert (dest / 'packages' / 'demo-1.0.tar.gz').read_bytes() == b'sdist'
+
+    def test_hash_mismatch_fails_without_writing(self, upstream, tmp_path):
+        (upstream.root / 'files' / 'demo-1.0.tar.gz').write_bytes(b'tampered')
+        dest = tmp_path / 'pypi'
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert [item for item, _ in summary['failed']] == ['demo-1.0.tar.gz']
+        assert not (dest / 'packages' / 'demo-1.0.tar.gz').exists()
+
+    def test_falls_back_to_next_source(self, upstream, tmp_path):
+        sources = {'down': 'http://127.0.0.1:9/simple', 'local': upstream.url + '/simple'}
+        summary = sync_mirror({'demo': '1.0'}, tmp_path / 'pypi', sources)
+        assert summary['failed'] == []
+        manifest = json.loads((tmp_path / 'pypi' / SYNC_MANIFEST).read_text(encoding='utf-8'))
+        assert manifest['projects']['demo']['source'] == upstream.url + '/simple'
+
+    def test_missing_version_is_reported(self, upstream, tmp_path):
+        summary = sync_mirror({'demo': '2.0'}, tmp_path / 'pypi', upstream.sources)
+        assert summary['failed'][0][0] == 'demo'
+        assert '2.0' in summary['failed'][0][1]
+
+    def test_prunes_files_of_other_versions(self, upstream, tmp_path):
+        dest = tmp_path / 'pypi'
+        sync_mirror({'demo': '0.9'}, dest, upstream.sources)
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert summary['removed'] == 1
+        assert sorted(p.name for p in (dest / 'packages').iterdir()) == ['demo-1.0-py3-none-any.whl',
+                                                                       'demo-1.0.tar.gz']
+        manifest = json.loads((dest / SYNC_MANIFEST).read_text(encoding='utf-8'))
+        assert sorted(manifest['files']) == ['demo-1.0-py3-none-any.whl', 'demo-1.0.tar.gz']
+        assert '0.9' not in (dest / 'simple' / 'demo' / 'index.html').read_text(encoding='utf-8')
+
+    def test_prunes_projects_removed_from_pins(self, upstream, tmp_path):
+        other_name, other_wheel = build_wheel('other', '2.0')
+        publish(upstream.root, 'other', {other_name: other_wheel})
+        dest = tmp_path / 'pypi'
+        sync_mirror({'demo': '1.0', 'other': '2.0'}, dest, upstream.sources)
+        summary = sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        assert summary['removed'] == 1
+        assert not (dest / 'packages' / other_name).exists()
+        assert not (dest / 'simple' / 'other').exists()
+        manifest = json.loads((dest / SYNC_MANIFEST).read_text(encoding='utf-8'))
+        assert 'other' not in manifest['projects']
+        assert 'href="other/"' not in (dest / 'simple' / 'index.html').read_text(encoding='utf-8')
+
+    @pytest.mark.skipif(not pip_available(), reason='需要 pip')
+    def test_pip_installs_from_synced_tree(self, upstream, tmp_path):
+        dest = tmp_path / 'pypi'
+        sync_mirror({'demo': '1.0'}, dest, upstream.sources)
+        completed = subprocess.run([sys.executable, '-m', 'pip', 'download', 'demo==1.0', '--no-deps',
+                                    '--only-binary', ':all:', '--isolated', '--no-cache-dir',
+                                    '--index-url', (dest / 'simple').as_uri(), '--dest', str(tmp_path / 'out')],
+                                   capture_output=True, text=True)
+        assert completed.returncode == 0, completed.stderr
+        assert (tmp_path / 'out' / 'demo-1.0-py3-none-any.whl').exists()
+
+
+class TestLocalMirrorRegistry:
+    def test_register_file_mirror(self, tmp_path):
+        url = (tmp_path / 'pypi' / 'simple').as_uri()
+        success, msg = register_local_mirror('lan', url)
+        assert success, msg
+        entry = load_local_mirrors()['lan']
+        assert entry['url'] == url
+        assert 'local' in entry['tags']
+        assert mirrors_module.load_mirrors()['lan'] == url
+
+    @pytest.fixture
+    def registered(self, tmp_path, monkeypatch, fake_uv_config_path):
+        """注册一个本地镜像 lan，测速时所有远程镜像 50 ms、本地镜像 0 ms，返回被测速的镜像名列表。"""
+        simple = tmp_path / 'pypi' / 'simple'
+        simple.mkdir(parents=True)
+        (simple / 'index.html').write_text('', encoding='utf-8')
+        register_local_mirror('lan', simple.as_uri())
+        registry = mirrors_module.load_mirror_registry()
+        monkeypatch.setattr(module, 'MIRROR_REGISTRY', registry)
+        monkeypatch.setattr(module, 'MIRRORS', {name: entry['url'] for name, entry in registry.items()})
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        probed = []
+
+        def _fake_probe(name, url):
+            probed.append(name)
+            return name, 0.0 if url.startswith('file:') else 50.0, url, None
+
+        monkeypatch.setattr(module, 'measure_mirror_speed', _fake_probe)
+        return probed
+
+    def test_local_mirror_not_selected_automatically(self, monkeypatch, registered, fake_uv_config_path):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv'])
+        module.main()
+        assert 'lan' not in registered
+        assert 'file:' not in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_local_mirror_opt_in_by_tag(self, monkeypatch, registered, fake_uv_config_path):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--tag', 'local'])
+        module.main()
+        assert registered == ['lan']
+        assert 'file:' in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_local_mirror_by_name(self, monkeypatch, registered, fake_uv_config_path):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'lan', '--uv'])
+        module.main()
+        assert 'file:' in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_file_mirror_drops_trusted_host(self, tmp_path, fake_pip_config_path):
+        """file:// 镜像没有主机：不写入空的 trusted-host，并移除之前镜像留下的值。"""
+        module.write_pip_config_directly(mirrors_module.MIRRORS['tuna'], 'user')
+        success, msg = module.write_pip_config_directly((tmp_path / 'pypi' / 'simple').as_uri(), 'user')
+        assert success, msg
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert 'index-url = file:' in content
+        assert 'trusted-host' not in content
+
+    @pytest.mark.skipif(sys.platform != 'linux' or not pip_available(), reason='通过 XDG_CONFIG_HOME 隔离 pip 用户配置')
+    def test_file_mirror_unsets_trusted_host_with_pip(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('XDG_CONFIG_HOME', str(tmp_path / 'xdg'))
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: True)
+        assert module.update_pip_config(mirrors_module.MIRRORS['tuna'], ['--user'])
+        assert module.update_pip_config((tmp_path / 'pypi' / 'simple').as_uri(), ['--user'])
+        content = (tmp_path / 'xdg' / 'pip' / 'pip.conf').read_text(encoding='utf-8')
+        assert 'index-url = file:' in content
+        assert 'trusted-host' not in content
+
+    def test_rejects_invalid_url(self):
+        success, _ = register_local_mirror('lan', 'ftp://example.com/simple')
+        assert not success
+
+    def test_local_mirror_probe(self, tmp_path):
+        simple = tmp_path / 'simple'
+        simple.mkdir()
+        name, speed, url, error = module.measure_mirror_speed('lan', simple.as_uri())
+        assert error
+        (simple / 'index.html').write_text('', encoding='utf-8')
+        name, speed, url, error = module.measure_mirror_speed('lan', simple.as_uri())
+        assert error is None
+
+
+class TestSyncCommand:
+    def test_rejects_unpinned_requirements(self, monkeypatch, tmp_path, capsys):
+        requirements = tmp_path / 'requirements.txt'
+        requirements.write_text('demo>=1\n', encoding='utf-8')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'sync', '-r', str(requirements), '--dest', str(tmp_path / 'd')])
+        with pytest.raises(SystemExit):
+            module.main()
+        assert 'demo>=1' in capsys.readouterr().out
+
+    def test_sync_and_register(self, monkeypatch, upstream, tmp_path):
+        requirements = tmp_path / 'requirements.txt'
+        requirements.write_text('demo==1.0\n', encoding='utf-8')
+        dest = tmp_path / 'pypi'
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'sync', '-r', str(requirements), '--dest', str(dest),
+                                          '--mirrors', upstream.url + '/simple', '--register', 'lan'])
+        module.main()
+        assert (dest / 'simple' / 'demo' / 'index.html').exists()
+        assert load_local_mirrors()['lan']['url'] == (dest / 'simple').resolve().as_uri()
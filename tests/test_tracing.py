@@ -0,0 +1,95 @@
+"""测试性能跟踪（--trace / CNPIP_TRACE）生成的时间线。"""
+import json
+import subprocess
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip import tracing
+from cnpip.mirrors import MIRRORS
+
+
+@pytest.fixture(autouse=True)
+def stop_after_test():
+    yield
+    tracing.stop_tracing()
+
+
+def load_events(path):
+    return json.loads(path.read_text(encoding='utf-8'))['traceEvents']
+
+
+def fake_speed(name, url):
+    return name, 10.0, url, None
+
+
+class TestTracer:
+    def test_disabled_by_default(self):
+        assert tracing._tracer is None
+        assert not hasattr(module.probe_mirrors, '__wrapped__')
+
+    def test_probe_threads_get_own_tracks(self, tmp_path, static_server):
+        path = tmp_path / 'trace.json'
+        tracing.start_tracing(str(path), [module])
+        module.probe_mirrors({name: static_server.url + '/' for name in ('tuna', 'ustc', 'aliyun')})
+        assert tracing.stop_tracing() == str(path)
+
+        events = load_events(path)
+        probes = [e for e in events if e['name'] == 'cnpip.measure_mirror_speed']
+        assert sorted(e['args']['args'][0] for e in probes) == ['aliyun', 'tuna', 'ustc']
+        # 每个测速线程一条轨道（线程池线程空闲时可能被复用，因此不要求恰好 3 条）
+        thread_names = {e['tid']: e['args']['name'] for e in events if e['name'] == 'thread_name'}
+        assert all(thread_names[e['tid']].startswith('ThreadPoolExecutor') for e in probes)
+        assert {'import', 'main', 'cnpip.probe_mirrors'} <= {e['name'] for e in events}
+        assert all(e['dur'] >= 0 for e in events if e['ph'] == 'X')
+
+    def test_stop_restores_functions(self, tmp_path):
+        original = module.detect_environment
+        original_run = subprocess.run
+        tracing.start_tracing(str(tmp_path / 'trace.json'), [module])
+        assert module.detect_environment is not original
+        tracing.stop_tracing()
+        assert module.detect_environment is original
+        assert subprocess.run is original_run
+
+    def test_subprocess_spans(self, tmp_path):
+        path = tmp_path / 'trace.json'
+        tracing.start_tracing(str(path), [module])
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        tracing.stop_tracing()
+        spans = [e for e in load_events(path) if e['name'] == 'subprocess']
+        assert len(spans) == 1
+        assert sys.executable in spans[0]['args']['command']
+
+    def test_manual_span(self, tmp_path):
+        path = tmp_path / 'trace.json'
+        with tracing.span('ignored'):
+            pass
+        tracing.start_tracing(str(path), [])
+        with tracing.span('phase', mirror='tuna'):
+            pass
+        tracing.stop_tracing()
+        names = [e['name'] for e in load_events(path)]
+        assert 'phase' in names and 'ignored' not in names
+
+
+class TestTraceCli:
+    def test_trace_flag(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(module, 'measure_mirror_speed', fake_speed)
+        monkeypatch.setattr(module, 'report_redirects', lambda results: None)
+        path = tmp_path / 'trace.json'
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--trace', str(path)])
+        module.main()
+        tracing.stop_tracing()
+        names = {e['name'] for e in load_events(path)}
+        assert 'cnpip.list_mirrors' in names
+        assert 'cnpip.main' not in names
+
+    def test_env_var(self, tmp_path, monkeypatch):
+        path = tmp_path / 'trace.json'
+        monkeypatch.setenv('CNPIP_TRACE', str(path))
+        monkeypatch.setattr(module, 'show_info', lambda: None)
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'info'])
+        module.main()
+        tracing.stop_tracing()
+        assert path.exists()
@@ -0,0 +1,133 @@
+"""测试根据测量数据调优网络参数（set --tune / unset --tune）。"""
+import configparser
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (
+    percentile, derive_network_settings, measure_mirror_profile, update_uv_settings, update_pip_settings,
+    unset_uv_settings,
+)
+
+
+def make_profile(latencies, failures=0, throughput=5 * 1024 * 1024, tolerated=8, throttled=False):
+    return {
+        'name': 'm', 'url': 'http://m/simple', 'latencies': latencies, 'failures': failures,
+        'samples': len(latencies) + failures, 'throughput': throughput,
+        'tolerated_concurrency': tolerated, 'throttled': throttled,
+    }
+
+
+class TestPercentile:
+    def test_nearest_rank(self):
+        assert percentile([10, 20, 30, 40, 50], 50) == 30
+        assert percentile([10, 20, 30, 40, 50], 95) == 50
+
+    def test_empty(self):
+        assert percentile([], 50) is None
+
+
+class TestDeriveNetworkSettings:
+    def test_low_latency_link(self):
+        settings = derive_network_settings(make_profile([20, 25, 30, 22, 21]))
+        assert settings['pip'] == {'timeout': 5, 'retries': 3}
+        assert settings['uv']['concurrent-downloads'] == 4
+        assert settings['env']['UV_HTTP_TIMEOUT'] == 30
+
+    def test_high_latency_high_bandwidth_link(self):
+        settings = derive_network_settings(make_profile([400, 420, 450, 500, 2000]))
+        assert settings['pip']['timeout'] == 20
+        assert settings['uv']['concurrent-downloads'] == 23
+        assert settings['env']['UV_HTTP_TIMEOUT'] == 40
+
+    def test_throttled_mirror_limits_concurrency(self):
+        settings = derive_network_settings(make_profile([400] * 5, tolerated=3, throttled=True))
+        assert settings['uv']['concurrent-downloads'] == 3
+
+    def test_slow_stream_doubles_concurrency(self):
+        settings = derive_network_settings(make_profile([100] * 5, throughput=200 * 1024))
+        assert settings['uv']['concurrent-downloads'] == 10
+
+    def test_flaky_mirror_gets_more_retries(self):
+        settings = derive_network_settings(make_profile([50] * 3, failures=3))
+        assert settings['pip']['retries'] == 10
+
+
+class TestMeasureMirrorProfile:
+    def test_profiles_local_mirror(self, static_server):
+        (static_server.root / 'simple' / 'pip').mkdir(parents=True)
+        (static_server.root / 'simple' / 'pip' / 'index.html').write_bytes(b'<a>pip</a>' * 1000)
+        profile = measure_mirror_profile('local', static_server.url + '/simple', samples=3, burst=4)
+        assert len(profile['latencies']) == 3
+        assert profile['failures'] == 0
+        assert profile['throughput'] > 0
+        assert profile['tolerated_concurrency'] == 4
+        assert not profile['throttled']
+
+
+class TestWriteSettings:
+    def test_update_uv_settings(self, fake_uv_config_path):
+        fake_uv_config_path.parent.mkdir(parents=True)
+        fake_uv_config_path.write_text('[[index]]\nurl = "https://x/simple"\ndefault = true\n', encoding='utf-8')
+        success, msg = update_uv_settings({'concurrent-downloads': 12})
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert content.startswith('concurrent-downloads = 12\n')
+        assert '[[index]]' in content
+
+    def test_update_pip_settings_without_pip(self, fake_pip_config_path, monkeypatch):
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        success, msg = update_pip_settings({'timeout': 20, 'retries': 4}, ['--user'])
+        assert success, msg
+        cfg = configparser.ConfigParser()
+        cfg.read(str(fake_pip_config_path / 'pip.conf'), encoding='utf-8')
+        assert cfg.get('global', 'timeout') == '20'
+        assert cfg.get('global', 'retries') == '4'
+
+
+class TestSetTuneCommand:
+    def test_cli_tunes_uv(self, monkeypatch, fake_uv_config_path, capsys):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(module, 'measure_mirror_profile', lambda name, url: make_profile([400] * 5))
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--uv', '--tune'])
+        module.main()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'concurrent-downloads = 20' in content
+        assert 'export UV_HTTP_TIMEOUT=' in capsys.readouterr().out
+
+    def test_cli_tunes_pip_written_by_uv_fallback(self, monkeypatch, fake_uv_config_path, capsys):
+        # 未安装 pip 且未指定作用域时改写 uv，--tune 应写入 uv 的参数而不是 pip 的
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(module, 'detect_environment', lambda: 'system')
+        monkeypatch.setattr(module, 'get_scope_args', lambda args: [])
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(module, 'update_pip_settings', lambda *a: pytest.fail('pip 未被写入'))
+        monkeypatch.setattr(module, 'measure_mirror_profile', lambda name, url: make_profile([400] * 5))
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--tune'])
+        module.main()
+        assert 'concurrent-downloads = 20' in fake_uv_config_path.read_text(encoding='utf-8')
+
+
+class TestUnsetTune:
+    def test_unset_uv_settings_keeps_index(self, fake_uv_config_path):
+        fake_uv_config_path.parent.mkdir(parents=True)
+        fake_uv_config_path.write_text('concurrent-downloads = 12\nnative-tls = true\n\n'
+                                       '[[index]]\nurl = "https://x/simple"\ndefault = true\n', encoding='utf-8')
+        success, msg = unset_uv_settings(module.TUNED_UV_KEYS)
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'concurrent-downloads' not in content
+        assert 'native-tls = true' in content and '[[index]]' in content
+
+    def test_cli_unset_tune_pip(self, monkeypatch, fake_pip_config_path):
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        fake_pip_config_path.mkdir(parents=True)
+        (fake_pip_config_path / 'pip.conf').write_text(
+            '[global]\nindex-url = https://x/simple\ntimeout = 20\nretries = 4\n', encoding='utf-8')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'unset', '--user', '--tune'])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 0
+        cfg = configparser.ConfigParser()
+        cfg.read(str(fake_pip_config_path / 'pip.conf'), encoding='utf-8')
+        assert dict(cfg['global']) == {'index-url': 'https://x/simple'}
@@ -1,7 +1,10 @@
 """测试 uv 配置文件的读写操作（不依赖 uv 命令）。"""
+import sys
 import pytest
 
-from cnpip.cnpip import update_uv_config, unset_uv_config, get_uv_index_url
+import cnpip.cnpip as module
+from cnpip.cnpip import update_uv_config, unset_uv_config, get_uv_index_url, parse_heavy_spec
+from cnpip.mirrors import MIRRORS
 
 MIRROR_URL = 'https://pypi.tuna.tsinghua.edu.cn/simple'
 ALT_URL = 'https://mirrors.aliyun.com/pypi/simple'
@@ -131,3 +134,55 @@ class TestUnsetUvConfig:
         assert success
         content = fake_uv_config_path.read_text(encoding='utf-8')
         assert '[[index]]' not in content
+
+
+class TestRouteIndexes:
+    def test_parse_heavy_spec(self):
+        assert parse_heavy_spec('heavy=torch, tensorflow,nvidia-*') == ('heavy', ['torch', 'tensorflow', 'nvidia-*'])
+
+    @pytest.mark.parametrize('value', ['heavy', 'heavy=', '=torch', 'bad name=torch'])
+    def test_parse_heavy_spec_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_heavy_spec(value)
+
+    def test_writes_explicit_named_index(self, fake_uv_config_path):
+        success, msg = update_uv_config(MIRROR_URL, explicit_indexes=[('heavy', ALT_URL)])
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert content == (f'[[index]]\nurl = "{MIRROR_URL}"\ndefault = true\n\n'
+                           f'[[index]]\nname = "heavy"\nurl = "{ALT_URL}"\nexplicit = true\n')
+        assert get_uv_index_url() == MIRROR_URL
+
+    def test_unset_removes_named_index(self, fake_uv_config_path):
+        update_uv_config(MIRROR_URL, explicit_indexes=[('heavy', ALT_URL)])
+        unset_uv_config()
+        assert ALT_URL not in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_cli_heavy_uses_latency_and_throughput(self, monkeypatch, fake_uv_config_path, capsys):
+        monkeypatch.setattr(module, 'list_mirrors', lambda mirrors=None: [
+            ('tuna', 10.0, MIRRORS['tuna'], None), ('aliyun', 50.0, MIRRORS['aliyun'], None)])
+        monkeypatch.setattr(module, 'probe_concurrency_scaling', lambda mirrors, concurrency: [])
+        monkeypatch.setattr(module, 'rank_by_throughput', lambda scalings, concurrency: [
+            ('aliyun', 9e6, MIRRORS['aliyun'], None), ('tuna', 1e6, MIRRORS['tuna'], None)])
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--live', '--heavy', 'heavy=torch,nvidia-*'])
+        module.main()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert f'url = "{MIRRORS["tuna"]}"\ndefault = true' in content
+        assert f'name = "heavy"\nurl = "{MIRRORS["aliyun"]}"\nexplicit = true' in content
+        out = capsys.readouterr().out
+        assert 'torch = { index = "heavy" }' in out
+        assert 'nvidia-*' in out
+
+    def test_cli_heavy_requires_uv(self, monkeypatch):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--heavy', 'heavy=torch'])
+        with pytest.raises(SystemExit):
+            module.main()
+
+    @pytest.mark.parametrize('target', [['--all-tools'], ['--all-venvs', '.']])
+    def test_cli_heavy_rejected_for_bulk_targets(self, monkeypatch, target):
+        monkeypatch.setattr(module, 'apply_mirror', lambda *a: pytest.fail('不应写入配置'))
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'tuna', '--heavy', 'heavy=torch'] + target)
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 1
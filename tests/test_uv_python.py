@@ -0,0 +1,108 @@
+"""测试 uv Python 安装镜像（list/set/unset --uv-python），使用本地静态文件服务作为替身镜像。"""
+import json
+import subprocess
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (PYTHON_PROBE_ASSET, detect_python_probe_asset, measure_python_mirror, set_uv_python_mirror,
+                         unset_uv_python_mirror, update_uv_config)
+from cnpip.mirrors import MIRRORS
+
+
+@pytest.fixture
+def python_mirrors(static_server, monkeypatch):
+    """一个发布了测速文件的替身镜像，以及一个没有该文件的镜像。"""
+    asset = static_server.root / 'pbs' / PYTHON_PROBE_ASSET
+    asset.parent.mkdir(parents=True)
+    asset.write_bytes(b'p' * 200000)
+    (static_server.root / 'empty').mkdir()
+    mirrors = {'local': static_server.url + '/pbs', 'empty': static_server.url + '/empty'}
+    monkeypatch.setattr(module, 'PYTHON_INSTALL_MIRRORS', mirrors)
+    monkeypatch.setattr(module, 'PYTHON_PROBE_BYTES', 64 * 1024)
+    monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+    monkeypatch.setattr(module, 'detect_python_probe_asset', lambda: PYTHON_PROBE_ASSET)
+    return mirrors
+
+
+def fake_uv_python_list(monkeypatch, entries):
+    def _run(command, **kwargs):
+        assert command[1:3] == ['python', 'list']
+        return subprocess.CompletedProcess(command, 0, stdout=json.dumps(entries), stderr='')
+
+    monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+    monkeypatch.setattr(module.subprocess, 'run', _run)
+
+
+class TestDetectPythonProbeAsset:
+    def test_latest_cpython_download(self, monkeypatch):
+        fake_uv_python_list(monkeypatch, [
+            {'key': 'pypy-3.11.11-linux-x86_64-gnu', 'implementation': 'pypy',
+             'url': 'https://downloads.python.org/pypy/pypy3.11-v7.3.19-linux64.tar.bz2'},
+            {'key': 'cpython-3.14.0+freethreaded-linux-x86_64-gnu', 'implementation': 'cpython',
+             'variant': 'freethreaded',
+             'url': 'https://github.com/astral-sh/python-build-standalone/releases/download/20251014/'
+                    'cpython-3.14.0%2B20251014-x86_64-unknown-linux-gnu-freethreaded%2Bpgo%2Blto-full.tar.zst'},
+            {'key': 'cpython-3.14.0-linux-x86_64-gnu', 'implementation': 'cpython', 'variant': 'default',
+             'url': 'https://github.com/astral-sh/python-build-standalone/releases/download/20251014/'
+                    'cpython-3.14.0%2B20251014-x86_64-unknown-linux-gnu-install_only_stripped.tar.gz'},
+        ])
+        assert detect_python_probe_asset() == \
+            '20251014/cpython-3.14.0+20251014-x86_64-unknown-linux-gnu-install_only_stripped.tar.gz'
+
+    def test_without_uv(self, monkeypatch):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: None)
+        assert detect_python_probe_asset() == PYTHON_PROBE_ASSET
+
+    def test_unparsable_output(self, monkeypatch):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(module.subprocess, 'run', lambda command, **kwargs: subprocess.CompletedProcess(
+            command, 0, stdout='not json', stderr=''))
+        assert detect_python_probe_asset() == PYTHON_PROBE_ASSET
+
+
+class TestMeasurePythonMirror:
+    def test_reads_asset_prefix(self, python_mirrors):
+        result = measure_python_mirror('local', python_mirrors['local'])
+        assert result['error'] is None
+        assert 64 * 1024 <= result['bytes'] < 200000
+        assert result['throughput'] > 0
+
+    def test_missing_asset(self, python_mirrors):
+        result = measure_python_mirror('empty', python_mirrors['empty'])
+        assert result['error']
+
+
+class TestSetUvPythonMirror:
+    def test_auto_select_writes_top_level_key(self, python_mirrors, fake_uv_config_path):
+        update_uv_config(MIRRORS['tuna'])
+        assert set_uv_python_mirror()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert content.startswith(f'python-install-mirror = "{python_mirrors["local"]}"\n')
+        assert MIRRORS['tuna'] in content
+
+    def test_requires_uv(self, python_mirrors, monkeypatch, fake_uv_config_path):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: None)
+        assert not set_uv_python_mirror('local')
+        assert not fake_uv_config_path.exists()
+
+    def test_unknown_mirror(self, python_mirrors, fake_uv_config_path):
+        assert not set_uv_python_mirror('nope')
+        assert not fake_uv_config_path.exists()
+
+    def test_unset_keeps_index(self, python_mirrors, fake_uv_config_path):
+        update_uv_config(MIRRORS['tuna'])
+        set_uv_python_mirror('local')
+        success, msg = unset_uv_python_mirror()
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'python-install-mirror' not in content
+        assert MIRRORS['tuna'] in content
+
+    def test_cli_set_named(self, python_mirrors, monkeypatch, fake_uv_config_path):
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', 'empty', '--uv-python'])
+        module.main()
+        assert python_mirrors['empty'] in fake_uv_config_path.read_text(encoding='utf-8')
+
+    def test_packaged_registry(self):
+        assert module.PYTHON_INSTALL_MIRRORS['github'].startswith('https://github.com/')
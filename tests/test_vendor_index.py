@@ -0,0 +1,154 @@
+"""测试厂商 wheel 索引镜像（list/set --pytorch），使用本地静态文件服务作为替身镜像。"""
+import sys
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import (find_vendor_wheel_url, get_uv_index_url, measure_vendor_mirror, set_vendor_index,
+                         unset_vendor_index, update_uv_config, update_uv_vendor_index, vendor_index_url,
+                         _is_vendor_index_url)
+from cnpip.mirrors import MIRRORS
+
+WHEEL = 'torch-2.1.0+cu121-cp311-cp311-linux_x86_64.whl'
+QUOTED_WHEEL = WHEEL.replace('+', '%2B')
+
+
+@pytest.fixture
+def vendor_mirrors(static_server, monkeypatch):
+    """simple 格式与 flat 格式各一个替身镜像，另有一个无法连接的镜像。"""
+    root = static_server.root
+    (root / 'files').mkdir()
+    (root / 'files' / WHEEL).write_bytes(b'w' * 200000)
+    (root / 'whl' / 'cu121' / 'torch').mkdir(parents=True)
+    (root / 'whl' / 'cu121' / 'torch' / 'index.html').write_text(
+        f'<a href="/files/{QUOTED_WHEEL}#sha256=00">{WHEEL}</a>\n', encoding='utf-8')
+    (root / 'flat' / 'cu121').mkdir(parents=True)
+    (root / 'flat' / 'cu121' / 'index.html').write_text(
+        f'<a href="torchvision-0.16.0.tar.gz">x</a>\n<a href="/files/{QUOTED_WHEEL}">{WHEEL}</a>\n', encoding='utf-8')
+    registry = {'pytorch': {'probe_project': 'torch', 'packages': ['torch', 'torchvision'], 'mirrors': {
+        'simple': {'url': static_server.url + '/whl/{variant}', 'format': 'simple'},
+        'flat': {'url': static_server.url + '/flat/{variant}/', 'format': 'flat'},
+        'down': {'url': 'http://127.0.0.1:9/whl/{variant}', 'format': 'simple'},
+    }}}
+    monkeypatch.setattr(module, 'VENDOR_INDEX_MIRRORS', registry)
+    monkeypatch.setattr(module, 'VENDOR_PROBE_BYTES', 64 * 1024)
+    static_server.registry = registry['pytorch']['mirrors']
+    return static_server
+
+
+class TestVendorRegistry:
+    def test_url_template(self, vendor_mirrors):
+        entry = vendor_mirrors.registry['simple']
+        assert vendor_index_url(entry, 'cu121') == vendor_mirrors.url + '/whl/cu121'
+        assert _is_vendor_index_url('pytorch', vendor_mirrors.url + '/whl/cpu/')
+        assert not _is_vendor_index_url('pytorch', MIRRORS['tuna'])
+
+    def test_packaged_registry_has_official_index(self):
+        official = module.VENDOR_INDEX_MIRRORS['pytorch']['mirrors']['official']
+        assert vendor_index_url(official, 'cu121') == 'https://download.pytorch.org/whl/cu121'
+
+
+class TestMeasureVendorMirror:
+    @pytest.mark.parametrize('name', ['simple', 'flat'])
+    def test_finds_real_wheel(self, vendor_mirrors, name):
+        entry = vendor_mirrors.registry[name]
+        url = find_vendor_wheel_url(vendor_index_url(entry, 'cu121'), entry['format'], 'torch')
+        assert url == f'{vendor_mirrors.url}/files/{QUOTED_WHEEL}'
+
+    def test_range_probe(self, vendor_mirrors):
+        result = measure_vendor_mirror('simple', vendor_mirrors.registry['simple'], 'cu121', 'torch')
+        assert result['error'] is None
+        assert 64 * 1024 <= result['bytes'] < 200000
+        assert result['throughput'] > 0
+
+    def test_missing_variant(self, vendor_mirrors):
+        result = measure_vendor_mirror('simple', vendor_mirrors.registry['simple'], 'cu999', 'torch')
+        assert result['error']
+
+
+class TestUvVendorIndex:
+    def test_written_as_explicit_and_kept_by_set(self, fake_uv_config_path):
+        update_uv_config(MIRRORS['tuna'])
+        success, msg = update_uv_vendor_index('pytorch', 'https://mirrors.aliyun.com/pytorch-wheels/cu121/', 'flat')
+        assert success, msg
+        update_uv_config(MIRRORS['ustc'])
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'name = "pytorch"\nurl = "https://mirrors.aliyun.com/pytorch-wheels/cu121/"\nexplicit = true\n' \
+               'format = "flat"' in content
+        assert MIRRORS['tuna'] not in content
+        assert get_uv_index_url() == MIRRORS['ustc']
+
+    def test_replaces_previous_vendor_index(self, fake_uv_config_path):
+        update_uv_vendor_index('pytorch', 'https://download.pytorch.org/whl/cu118', 'simple')
+        update_uv_vendor_index('pytorch', 'https://download.pytorch.org/whl/cu121', 'simple')
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert content.count('[[index]]') == 1
+        assert 'cu121' in content
+
+
+class TestSetVendorIndex:
+    def test_pip_picks_fastest_and_replaces_old_entry(self, vendor_mirrors, monkeypatch, fake_pip_config_path):
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        fake_pip_config_path.mkdir(parents=True)
+        (fake_pip_config_path / 'pip.conf').write_text(
+            f'[global]\nextra-index-url = https://private.example/simple {vendor_mirrors.url}/whl/cu118\n',
+            encoding='utf-8')
+        assert set_vendor_index('pytorch', 'cu121', 'simple', 'pip', ['--user'])
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert f'extra-index-url = https://private.example/simple {vendor_mirrors.url}/whl/cu121' in content
+
+    def test_flat_mirror_uses_find_links(self, vendor_mirrors, monkeypatch, fake_pip_config_path):
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        monkeypatch.setattr(module, 'read_pip_config_values', lambda: pytest.fail('不应读取合并后的配置'))
+        assert set_vendor_index('pytorch', 'cu121', 'flat', 'pip', ['--user'])
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert f'find-links = {vendor_mirrors.url}/flat/cu121/' in content
+
+    def test_invalid_variant(self, vendor_mirrors):
+        assert not set_vendor_index('pytorch', 'cu121; rm', 'simple')
+
+    def test_cli_uv_auto_select(self, vendor_mirrors, monkeypatch, fake_uv_config_path, capsys):
+        monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--pytorch', 'cu121'])
+        module.main()
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'name = "pytorch"' in content and 'explicit = true' in content
+        out = capsys.readouterr().out
+        assert 'torch = { index = "pytorch" }' in out
+
+
+class TestUnsetVendorIndex:
+    def test_pip_removes_only_vendor_urls(self, vendor_mirrors, monkeypatch, fake_pip_config_path):
+        monkeypatch.setattr(module, 'is_pip_installed', lambda: False)
+        fake_pip_config_path.mkdir(parents=True)
+        (fake_pip_config_path / 'pip.conf').write_text(
+            f'[global]\nindex-url = {MIRRORS["tuna"]}\n'
+            f'extra-index-url = https://private.example/simple {vendor_mirrors.url}/whl/cu121\n'
+            f'find-links = {vendor_mirrors.url}/flat/cu121/\n', encoding='utf-8')
+        monkeypatch.setattr(sys, 'argv', ['cnpip', 'unset', '--user', '--pytorch', 'cu121'])
+        with pytest.raises(SystemExit) as exc:
+            module.main()
+        assert exc.value.code == 0
+        content = (fake_pip_config_path / 'pip.conf').read_text(encoding='utf-8')
+        assert f'index-url = {MIRRORS["tuna"]}' in content
+        assert 'extra-index-url = https://private.example/simple\n' in content
+        assert 'find-links' not in content
+
+    def test_plain_unset_keeps_vendor_index(self, fake_uv_config_path):
+        update_uv_config(MIRRORS['tuna'])
+        update_uv_vendor_index('pytorch', 'https://download.pytorch.org/whl/cu121', 'simple')
+        success, msg = module.unset_uv_config()
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'https://download.pytorch.org/whl/cu121' in content
+        assert get_uv_index_url() is None
+        success, msg = module.unset_uv_config()
+        assert success and '无需操作' in msg
+
+    def test_uv_removes_only_vendor_index(self, fake_uv_config_path):
+        update_uv_config(MIRRORS['tuna'])
+        update_uv_vendor_index('pytorch', 'https://download.pytorch.org/whl/cu121', 'simple')
+        success, msg = unset_vendor_index('pytorch', 'uv')
+        assert success, msg
+        content = fake_uv_config_path.read_text(encoding='utf-8')
+        assert 'pytorch' not in content
+        assert get_uv_index_url() == MIRRORS['tuna']
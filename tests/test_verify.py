@@ -0,0 +1,137 @@
+"""测试端到端安装对比（cnpip verify），使用本地静态文件服务作为替身索引。"""
+import base64
+import hashlib
+import io
+import subprocess
+import sys
+import zipfile
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import build_verify_command, parse_verify_mirrors, verify_mirror, verify_mirrors
+from cnpip.mirrors import MIRRORS
+
+
+def build_wheel(name, version):
+    """生成最小的合法 wheel（仅包含 dist-info），返回 (文件名, 内容)。"""
+    dist_info = f'{name}-{version}.dist-info'
+    files = {
+        f'{dist_info}/METADATA': f'Metadata-Version: 2.1\nName: {name}\nVersion: {version}\n',
+        f'{dist_info}/WHEEL': 'Wheel-Version: 1.0\nGenerator: cnpip-test\nRoot-Is-Purelib: true\nTag: py3-none-any\n',
+    }
+    record_lines = []
+    for path, content in files.items():
+        digest = base64.urlsafe_b64encode(hashlib.sha256(content.encode()).digest()).rstrip(b'=').decode()
+        record_lines.append(f'{path},sha256={digest},{len(content)}')
+    files[f'{dist_info}/RECORD'] = '\n'.join(record_lines + [f'{dist_info}/RECORD,,']) + '\n'
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for path, content in files.items():
+            archive.writestr(path, content)
+    return f'{name}-{version}-py3-none-any.whl', buffer.getvalue()
+
+
+@pytest.fixture
+def local_index(static_server, tmp_path):
+    """提供 demo 项目的 PEP 503 索引，返回 (索引地址, requirements 文件)。"""
+    file_name, content = build_wheel('demo', '1.0')
+    (static_server.root / 'files').mkdir()
+    (static_server.root / 'files' / file_name).write_bytes(content)
+    (static_server.root / 'simple' / 'demo').mkdir(parents=True)
+    (static_server.root / 'simple' / 'demo' / 'index.html').write_text(
+        f'<a href="../../files/{file_name}">{file_name}</a>\n', encoding='utf-8')
+    requirements = tmp_path / 'requirements.txt'
+    requirements.write_text('demo==1.0\n', encoding='utf-8')
+    return static_server.url + '/simple', requirements, len(content)
+
+
+def pip_available():
+    return subprocess.run([sys.executable, '-m', 'pip', '--version'], capture_output=True).returncode == 0
+
+
+class TestBuildVerifyCommand:
+    def test_pip_is_isolated_and_uncached(self, tmp_path):
+        command, _ = build_verify_command('pip', 'req.txt', MIRRORS['tuna'], str(tmp_path))
+        assert command[1:4] == ['-m', 'pip', 'download']
+        for flag in ('--isolated', '--no-cache-dir'):
+            assert flag in command
+        assert command[command.index('--index-url') + 1] == MIRRORS['tuna']
+
+    def test_uv_ignores_config_and_index_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('UV_EXTRA_INDEX_URL', 'https://private.example/simple')
+        command, env = build_verify_command('uv', 'req.txt', MIRRORS['tuna'], str(tmp_path))
+        assert command[1:3] == ['pip', 'compile']
+        assert '--no-config' in command and '--no-cache' in command
+        assert 'UV_EXTRA_INDEX_URL' not in env
+
+
+class TestParseVerifyMirrors:
+    def test_names_and_urls(self):
+        mirrors, error = parse_verify_mirrors('tuna, http://127.0.0.1:8000/simple')
+        assert error is None
+        assert mirrors == {'tuna': MIRRORS['tuna'], '127.0.0.1:8000': 'http://127.0.0.1:8000/simple'}
+
+    def test_same_host_different_paths(self):
+        mirrors, error = parse_verify_mirrors('http://127.0.0.1:8000/a/simple, http://127.0.0.1:8000/b/simple,'
+                                              'http://127.0.0.1:8000/a/simple')
+        assert error is None
+        assert mirrors == {'127.0.0.1:8000': 'http://127.0.0.1:8000/a/simple',
+                           '127.0.0.1:8000#2': 'http://127.0.0.1:8000/b/simple'}
+
+    def test_unknown_name(self):
+        mirrors, error = parse_verify_mirrors('nope')
+        assert mirrors is None and 'nope' in error
+
+    def test_default_candidates(self):
+        assert parse_verify_mirrors(None, {'tuna': MIRRORS['tuna']})[0] == {'tuna': MIRRORS['tuna']}
+        assert parse_verify_mirrors(None)[0] == MIRRORS
+
+
+@pytest.mark.skipif(not pip_available(), reason="需要 pip")
+class TestVerifyWithLocalIndex:
+    def test_successful_download(self, local_index):
+        url, requirements, wheel_size = local_index
+        result = verify_mirror('local', url, requirements)
+        assert result['error'] is None, result['error']
+        assert result['bytes'] == wheel_size
+        assert result['ms'] > 0
+
+    def test_missing_project_fails(self, local_index, tmp_path):
+        url, _, _ = local_index
+        requirements = tmp_path / 'missing.txt'
+        requirements.write_text('not-on-this-index==1.0\n', encoding='utf-8')
+        result = verify_mirror('local', url, requirements)
+        assert result['error']
+
+    def test_parallel_report(self, local_index, monkeypatch, capsys):
+        url, requirements, _ = local_index
+        monkeypatch.setattr(module, 'get_pip_config', lambda: (url, None))
+        results = verify_mirrors({'good': url, 'dead': 'http://127.0.0.1:9/simple'}, requirements, workers=2)
+        assert [r['name'] for r in results] == ['good', 'dead']
+        out = capsys.readouterr().out
+        assert '* good' in out
+
+
+def test_verify_command_requires_requirements(monkeypatch, tmp_path):
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'verify', '-r', str(tmp_path / 'missing.txt')])
+    with pytest.raises(SystemExit) as exc:
+        module.main()
+    assert exc.value.code == 1
+
+
+def test_verify_command_exit_code(monkeypatch, tmp_path):
+    requirements = tmp_path / 'requirements.txt'
+    requirements.write_text('demo\n', encoding='utf-8')
+    calls = []
+
+    def _fake_verify(mirrors, req, tool, workers):
+        calls.append((list(mirrors), tool, workers))
+        return [{'name': 'tuna', 'url': MIRRORS['tuna'], 'ms': 1.0, 'bytes': 1, 'error': None}]
+
+    monkeypatch.setattr(module, 'verify_mirrors', _fake_verify)
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'verify', '-r', str(requirements), '--mirrors', 'tuna,ustc',
+                                      '--workers', '2'])
+    with pytest.raises(SystemExit) as exc:
+        module.main()
+    assert exc.value.code == 0
+    assert calls == [(['tuna', 'ustc'], 'pip', 2)]
@@ -0,0 +1,144 @@
+"""测试连接池测速（list --warm / set --rank-by warm）。"""
+import sys
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import cnpip.cnpip as module
+from cnpip.cnpip import ProbeConnectionPool, measure_warm_latency, rank_by_warm
+from cnpip.mirrors import MIRRORS
+
+
+def start_server(keep_alive, status=200):
+    """统计新建连接数的本地服务；keep_alive=False 时每个响应后关闭连接。"""
+    state = {'connections': 0, 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1' if keep_alive else 'HTTP/1.0'
+
+        def setup(self):
+            super().setup()
+            state['connections'] += 1
+
+        def do_HEAD(self):
+            state['requests'] += 1
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def do_GET(self):
+            body = b'hello'
+            state['requests'] += 1
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/simple/'
+    server.state = state
+    return server
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def _start(keep_alive=True, status=200):
+        server = start_server(keep_alive, status)
+        started.append(server)
+        return server
+
+    yield _start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+class TestProbeConnectionPool:
+    def test_reuses_keep_alive_connection(self, servers):
+        server = servers(keep_alive=True)
+        pool = ProbeConnectionPool()
+        try:
+            first = pool.request('GET', server.url)
+            second = pool.request('GET', server.url)
+        finally:
+            pool.close()
+        assert not first['reused'] and second['reused']
+        assert second['bytes'] == 5
+        assert server.state['connections'] == 1
+        assert first['tls_resumed'] is None
+
+    def test_reconnects_when_server_closes(self, servers):
+        server = servers(keep_alive=False)
+        pool = ProbeConnectionPool()
+        try:
+            responses = [pool.request('HEAD', server.url) for _ in range(3)]
+        finally:
+            pool.close()
+        assert not any(r['reused'] for r in responses)
+        assert server.state['connections'] == 3
+
+
+class TestMeasureWarmLatency:
+    def test_keep_alive_mirror(self, servers):
+        server = servers(keep_alive=True)
+        result = measure_warm_latency('local', server.url)
+        assert result['error'] is None
+        assert result['reused']
+        assert result['cold_ms'] is not None and result['warm_ms'] is not None
+        # 测完热连接后主动重连一次
+        assert result['reconnect_ms'] is not None
+        assert server.state['connections'] == 2
+        assert server.state['requests'] == module.WARM_SAMPLES + 1
+        assert result['tls_resumed'] is None
+
+    def test_no_keep_alive(self, servers):
+        server = servers(keep_alive=False)
+        result = measure_warm_latency('local', server.url)
+        assert result['error'] is None
+        assert not result['reused']
+        assert result['warm_ms'] is not None
+
+    def test_error_status(self, servers):
+        server = servers(status=404)
+        result = measure_warm_latency('local', server.url)
+        assert result['error'] == 'Status 404'
+
+    def test_unreachable(self):
+        result = measure_warm_latency('dead', 'http://127.0.0.1:9/simple/')
+        assert result['error']
+
+
+def test_rank_by_warm():
+    results = [
+        {'name': 'tuna', 'url': MIRRORS['tuna'], 'cold_ms': 50, 'warm_ms': 40, 'error': None},
+        {'name': 'ustc', 'url': MIRRORS['ustc'], 'cold_ms': 300, 'warm_ms': 10, 'error': None},
+        {'name': 'huawei', 'url': MIRRORS['huawei'], 'cold_ms': None, 'warm_ms': None, 'error': 'Timeout'},
+    ]
+    assert [r[0] for r in rank_by_warm(results)] == ['ustc', 'tuna', 'huawei']
+
+
+def test_list_warm(monkeypatch, capsys, servers):
+    server = servers(keep_alive=True)
+    monkeypatch.setattr(module, 'MIRRORS', {'local': server.url})
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'list', '--warm'])
+    module.main()
+    out = capsys.readouterr().out
+    assert '热连接' in out and 'local' in out
+
+
+def test_set_rank_by_warm(monkeypatch, fake_uv_config_path):
+    monkeypatch.setattr(module, 'probe_warm_latency', lambda mirrors: [
+        {'name': 'tuna', 'url': MIRRORS['tuna'], 'cold_ms': 20, 'warm_ms': 15, 'error': None},
+        {'name': 'ustc', 'url': MIRRORS['ustc'], 'cold_ms': 200, 'warm_ms': 5, 'error': None},
+    ])
+    monkeypatch.setattr(module, 'detect_uv_binary', lambda: '/usr/bin/uv')
+    monkeypatch.setattr(sys, 'argv', ['cnpip', 'set', '--uv', '--rank-by', 'warm'])
+    module.main()
+    assert MIRRORS['ustc'] in fake_uv_config_path.read_text(encoding='utf-8')